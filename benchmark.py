@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+匹配性能与准确率基准测试
+用 assets/ 中的图标合成截图（随机缩放、位置、JPEG 压缩、噪声和背景杂物），
+测量各引擎/参数组合下 match / match_best 的延迟分位数、吞吐量、内存峰值和 top-1 准确率，
+结果写入 JSON 报告，并可与保存的基线报告对比
+图标复制到临时目录后再加载，编译出的模板库文件不会写进 assets/
+
+用法:
+    python benchmark.py --sizes crop 720p 1080p --samples 20 -o report.json
+    python benchmark.py --baseline baseline.json -o report.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from src.matcher import IconMatcher, configure_cv_threads
+
+# 截图尺寸 (宽, 高)，crop 表示紧贴图标的小截图
+SIZES = {
+    "crop": None,
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+    "1440p": (2560, 1440),
+    "4k": (3840, 2160),
+}
+
+# 参与对比的匹配器参数组合（结果缓存一律关闭）
+CONFIGS = {
+    "opencv": {},
+    "sliding": {"classify": False},
+    "fft": {"engine": "fft"},
+    "coarse": {"coarse_to_fine": True},
+    "shortlist": {"shortlist_k": 5},
+    "parallel": {"max_workers": None},
+    "gray": {"mode": "gray"},
+    "edge": {"mode": "edge"},
+    "mask": {"use_mask": True},
+    "auto_scale": {"auto_scale": True},
+}
+
+
+def synthesize(templates: dict[str, np.ndarray], size, rng: np.random.Generator) -> tuple[np.ndarray, str]:
+    """
+    合成一张含单个图标的截图，返回 (图像, 图标英文名)
+    背景为渐变 + 随机色块，图标随机缩放到 0.8~1.2 倍，最后加噪声并做 JPEG 压缩
+    """
+    names = sorted(templates)
+    ename = names[rng.integers(len(names))]
+    scale = rng.uniform(0.8, 1.2)
+    icon = cv2.resize(templates[ename], None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    ih, iw = icon.shape[:2]
+
+    if size is None:
+        margin = int(rng.integers(2, 12))
+        w, h = iw + 2 * margin, ih + 2 * margin
+    else:
+        w, h = size
+
+    # 渐变背景
+    base = rng.integers(20, 200, 3)
+    gx = np.linspace(0, 1, w, dtype=np.float32)[None, :, None]
+    gy = np.linspace(0, 1, h, dtype=np.float32)[:, None, None]
+    img = (base + 40 * gx - 30 * gy).clip(0, 255).astype(np.uint8)
+
+    # 背景杂物：随机矩形和圆
+    for _ in range(int(w * h / 20000) + 2):
+        color = tuple(int(c) for c in rng.integers(0, 256, 3))
+        x, y = int(rng.integers(w)), int(rng.integers(h))
+        r = int(rng.integers(3, max(4, min(w, h) // 8)))
+        if rng.random() < 0.5:
+            cv2.rectangle(img, (x, y), (x + r, y + r // 2), color, -1)
+        else:
+            cv2.circle(img, (x, y), r // 2, color, -1)
+
+    x = int(rng.integers(0, w - iw + 1))
+    y = int(rng.integers(0, h - ih + 1))
+    img[y:y + ih, x:x + iw] = icon
+
+    noise = rng.normal(0, rng.uniform(0, 6), img.shape)
+    img = (img + noise).clip(0, 255).astype(np.uint8)
+    quality = int(rng.integers(60, 96))
+    ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return cv2.imdecode(buf, cv2.IMREAD_COLOR), ename
+
+
+def percentiles(values_ms: list[float]) -> dict[str, float]:
+    p50, p95, p99 = np.percentile(values_ms, [50, 95, 99])
+    return {"p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3),
+            "p99_ms": round(float(p99), 3)}
+
+
+def current_rss() -> Optional[int]:
+    """
+    当前进程的常驻内存（字节），包含 OpenCV 等原生库的分配
+    Windows 取工作集，Linux 读 /proc/self/statm，其他平台返回 None
+    """
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class Counters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = Counters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return None
+        return counters.WorkingSetSize
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss(run: Callable[[], None], interval: float = 0.002) -> Optional[int]:
+    """运行 run() 期间进程常驻内存的峰值（字节），由后台线程定时采样；无法获取时返回 None"""
+    peak = current_rss()
+    if peak is None:
+        return None
+    done = threading.Event()
+
+    def sample():
+        nonlocal peak
+        while not done.is_set():
+            peak = max(peak, current_rss() or 0)
+            done.wait(interval)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    try:
+        run()
+    finally:
+        done.set()
+        sampler.join()
+    return max(peak, current_rss() or 0)
+
+
+def bench_config(matcher: IconMatcher, samples: list[tuple[np.ndarray, str]]) -> dict:
+    """
+    对一组样本分别测量 match 与 match_best
+    延迟在不做任何内存统计的一轮中测量；内存另跑一轮，记录进程常驻内存（RSS/工作集）的峰值，
+    包含 OpenCV 等原生库的分配
+    """
+    result = {}
+    for method in ("match", "match_best"):
+        fn = getattr(matcher, method)
+        fn(samples[0][0])  # 预热
+        latencies = []
+        correct = 0
+        start = time.perf_counter()
+        for img, ename in samples:
+            t0 = time.perf_counter()
+            out = fn(img, threshold=0.5)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            top = out[0] if method == "match" and out else out
+            if top and top[0] == matcher.name_map.get(ename, ename):
+                correct += 1
+        elapsed = time.perf_counter() - start
+
+        peak = peak_rss(lambda: [fn(img, threshold=0.5) for img, _ in samples])
+        result[method] = {
+            **percentiles(latencies),
+            "throughput": round(len(samples) / elapsed, 3),
+            "top1_accuracy": round(correct / len(samples), 4),
+            "peak_rss_mb": round(peak / 1024 / 1024, 2) if peak is not None else None,
+        }
+    return result
+
+
+def copy_assets(assets_dir: Path, target: Path) -> Path:
+    """复制图标和名称映射（不含已编译的模板库），基准测试在副本上编译模板库"""
+    target.mkdir(parents=True, exist_ok=True)
+    for path in assets_dir.glob("*.png"):
+        shutil.copy2(path, target / path.name)
+    map_path = assets_dir / "name_map.json"
+    if map_path.exists():
+        shutil.copy2(map_path, target / map_path.name)
+    return target
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """与基线对比，返回退化项说明（延迟变慢或准确率下降超过容差）"""
+    regressions = []
+    for key, entry in report["results"].items():
+        base = baseline.get("results", {}).get(key)
+        if not base:
+            continue
+        for method in ("match", "match_best"):
+            metrics, old = entry.get(method), base.get(method)
+            if not metrics or not old:
+                continue
+            if metrics["p50_ms"] > old["p50_ms"] * (1 + tolerance):
+                regressions.append(f"{key} {method} p50 {old['p50_ms']} -> {metrics['p50_ms']} ms")
+            if metrics["top1_accuracy"] < old["top1_accuracy"] - tolerance:
+                regressions.append(f"{key} {method} 准确率 {old['top1_accuracy']} -> "
+                                   f"{metrics['top1_accuracy']}")
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="匹配性能与准确率基准测试")
+    parser.add_argument("--assets", "-a", type=str, default=str(Path(__file__).parent / "assets"),
+                        help="图标目录，默认为 assets/")
+    parser.add_argument("--sizes", nargs="+", default=["crop", "720p", "1080p"],
+                        choices=list(SIZES), help="截图尺寸，默认 crop 720p 1080p")
+    parser.add_argument("--configs", nargs="+", default=list(CONFIGS),
+                        choices=list(CONFIGS), help="参与测试的参数组合，默认全部")
+    parser.add_argument("--samples", "-n", type=int, default=20, help="每种尺寸的样本数")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--output", "-o", type=str, default=None, help="JSON 报告输出路径")
+    parser.add_argument("--baseline", "-b", type=str, default=None, help="对比的基线报告")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="判定退化的容差（延迟相对比例 / 准确率绝对值），默认 0.1")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    with tempfile.TemporaryDirectory(prefix="bench-assets-") as tmp:
+        run(args, copy_assets(Path(args.assets), Path(tmp) / "assets"))
+
+
+def run(args, assets_dir: Path):
+    templates = {ename: img for ename, img in
+                 IconMatcher(assets_dir, cache_size=0).template_cache.items()}
+    rng = np.random.default_rng(args.seed)
+    datasets = {size: [synthesize(templates, SIZES[size], rng) for _ in range(args.samples)]
+                for size in args.sizes}
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "platform": platform.platform(),
+            "templates": len(templates),
+            "samples": args.samples,
+            "seed": args.seed,
+        },
+        "results": {},
+    }
+
+    for config in args.configs:
+        params = CONFIGS[config]
+        # OpenCV 线程数是进程级设置，只在测试线程池并行的组合期间调整
+        cv_threads = configure_cv_threads(params["max_workers"]) if "max_workers" in params else None
+        t0 = time.perf_counter()
+        matcher = IconMatcher(assets_dir, cache_size=0, **params)
+        load_ms = (time.perf_counter() - t0) * 1000
+        for size in args.sizes:
+            key = f"{config}/{size}"
+            entry = bench_config(matcher, datasets[size])
+            entry["load_ms"] = round(load_ms, 2)
+            report["results"][key] = entry
+            m, b = entry["match"], entry["match_best"]
+            print(f"{key:<20} match p50 {m['p50_ms']:>9.2f} ms  acc {m['top1_accuracy']:.2%}  |  "
+                  f"match_best p50 {b['p50_ms']:>9.2f} ms  acc {b['top1_accuracy']:.2%}")
+        matcher.close()
+        if cv_threads is not None:
+            cv2.setNumThreads(cv_threads)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"\n报告已写入: {args.output}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print("\n⚠️ 相对基线退化:")
+            for line in regressions:
+                print(f"   {line}")
+            sys.exit(1)
+        print("\n✅ 未发现相对基线的退化")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,101 +1,40 @@
 #!/usr/bin/env python3
 """
 剑网三心法图标下载器
-下载所有心法图标到 assets/ 目录（英文文件名，兼容 Windows/Linux）
-同时生成 name_map.json 英中名称映射文件
+按图标清单（src/manifest.py）同步所有心法图标到 assets/ 目录（英文文件名，兼容 Windows/Linux）
+同时生成 manifest.json 清单和 name_map.json 英中名称映射文件
+用法: python download_assets.py [--refresh]
 """
-import urllib.request
-import json
-import os
+import sys
 from pathlib import Path
 
-# 心法数据：ID -> (英文名, 中文名)
-MANTRAS = {
-    10026: ("aoxue", "傲血战意"),
-    10062: ("tielao", "铁牢律"),
-    10021: ("huajian", "花间游"),
-    10028: ("lijing", "离经易道"),
-    10014: ("zixia", "紫霞功"),
-    10015: ("taixu", "太虚剑意"),
-    10081: ("bingxin", "冰心诀"),
-    10080: ("yunshang", "云裳心经"),
-    10003: ("yijin", "易筋经"),
-    10002: ("xisui", "洗髓经"),
-    10144: ("wenshui", "问水诀"),
-    10145: ("shanju", "山居剑意"),
-    10268: ("xiaochen", "笑尘诀"),
-    10242: ("fenying", "焚影圣诀"),
-    10243: ("mingzun", "明尊琉璃体"),
-    10175: ("dujing", "毒经"),
-    10176: ("butian", "补天诀"),
-    10224: ("jingyu", "惊羽诀"),
-    10225: ("tianluo", "天罗诡道"),
-    10389: ("tiegu", "铁骨衣"),
-    10390: ("fenshan", "分山劲"),
-    10447: ("mowen", "莫问"),
-    10448: ("xiangzhi", "相知"),
-    10464: ("beiao", "北傲诀"),
-    10533: ("linghai", "凌海诀"),
-    10585: ("yinlong", "隐龙诀"),
-    10615: ("taixuan", "太玄经"),
-    10626: ("lingsu", "灵素"),
-    10627: ("wufang", "无方"),
-    10698: ("gufeng", "孤锋诀"),
-    10756: ("shanhai", "山海心诀"),
-    10786: ("zhoutian", "周天功"),
-    10821: ("youluo", "幽罗引"),
-}
+from src.fetcher import SYNC_FAILED, SYNC_UPDATED, IconFetcher
 
-ICON_CDN = "https://icon.jx3box.com/icon"
 
-
-def download():
+def download(refresh: bool = False):
     assets = Path("assets")
-    assets.mkdir(exist_ok=True)
-
-    headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"}
-    success = 0
-    name_map = {}  # 英文名 -> 中文名
-
-    for icon_id, (ename, cname) in MANTRAS.items():
-        filename = f"{ename}.png"
-        filepath = assets / filename
-
-        if filepath.exists() and filepath.stat().st_size > 100:
-            print(f"  [跳过] {cname} ({ename}) 已存在")
-            name_map[ename] = cname
-            success += 1
-            continue
+    fetcher = IconFetcher(assets)
+    entries = fetcher.manifest.entries
 
-        url = f"{ICON_CDN}/{icon_id}.png"
-        print(f"  下载: {cname} ({ename})...", end=" ", flush=True)
+    def progress(current, total, ename):
+        print(f"  [{current}/{total}] {entries[ename]['cname']} ({ename})")
 
-        try:
-            req = urllib.request.Request(url, headers=headers)
-            with urllib.request.urlopen(req, timeout=15) as resp:
-                data = resp.read()
-                if len(data) > 100:
-                    filepath.write_bytes(data)
-                    print("✓")
-                    name_map[ename] = cname
-                    success += 1
-                else:
-                    print("✗ (文件太小)")
-        except Exception as e:
-            print(f"✗ ({e})")
+    # 按清单增量同步；refresh 时对已有图标发送条件请求，未变化的不重新传输
+    results = fetcher.sync(progress_callback=progress, refresh=refresh)
 
-    # 保存名称映射文件
-    map_path = assets / "name_map.json"
-    with open(map_path, "w", encoding="utf-8") as f:
-        json.dump(name_map, f, ensure_ascii=False, indent=2)
+    for ename, status in results.items():
+        if status == SYNC_FAILED:
+            print(f"  ✗ 下载失败: {entries[ename]['cname']} ({ename})")
+    updated = sum(1 for status in results.values() if status == SYNC_UPDATED)
+    success = sum(1 for status in results.values() if status != SYNC_FAILED)
 
-    print(f"\n完成! 成功: {success}/{len(MANTRAS)}")
+    print(f"\n完成! 成功: {success}/{len(results)}，更新: {updated}")
     print(f"图标目录: {assets.resolve()}")
-    print(f"名称映射: {map_path.resolve()}")
+    print(f"图标清单: {fetcher.manifest.path.resolve()}")
 
 
 if __name__ == "__main__":
     print("=" * 50)
     print("剑网三心法图标下载器")
     print("=" * 50)
-    download()
+    download(refresh="--refresh" in sys.argv)
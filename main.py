@@ -6,106 +6,357 @@
 1. 启动时自动下载/更新门派图标
 2. 监听全局快捷键 F9，检测剪贴板图片并自动识别
 3. 提供图形界面，支持手动选择图片识别
+4. 无界面模式（--no-gui）：批量识别文件/目录/通配符中的截图，输出 JSONL
+5. 服务模式（--serve）：常驻进程通过本地 HTTP 接口提供识别
 """
+import time
+
+STARTED_AT = time.perf_counter()  # 启动耗时的计时起点
+
+import os
 import sys
 import argparse
+import multiprocessing
+import threading
 from pathlib import Path
 
 # 添加 src 目录到路径
 sys.path.insert(0, str(Path(__file__).parent))
 
-from src.fetcher import IconFetcher
-from src.gui import JX3DetectorGUI
-from src.hotkey import HotkeyListener
-from src.matcher import IconMatcher
-import threading
+# OpenCV / requests 等较重的模块在各模式内部按需导入，界面模式下窗口可以先显示
+from src.banks import BANKS, DEFAULT_BANK, DEFAULT_MEMORY_BUDGET_MB, bank_dir
+from src.metrics import metrics
 
 
 def parse_args():
     parser = argparse.ArgumentParser(description="剑网三门派识别工具")
     parser.add_argument("--assets", "-a", type=str, default=None,
                        help="图标目录路径，默认为程序所在目录下的 assets/")
+    parser.add_argument("--bank", choices=list(BANKS), default=DEFAULT_BANK,
+                       help="使用的图标库：" + "、".join(f"{name}（{spec.title}）" for name, spec in BANKS.items())
+                            + f"，默认 {DEFAULT_BANK}；服务模式下为未指定 bank 参数时的默认库")
+    parser.add_argument("--memory-budget", type=float, default=DEFAULT_MEMORY_BUDGET_MB,
+                       help=f"服务模式已加载图标库的内存预算（MB），超出时淘汰最久未用的库，默认 {DEFAULT_MEMORY_BUDGET_MB}")
     parser.add_argument("--hotkey", "-k", type=str, default="f9",
                        help="全局快捷键，默认为 F9")
     parser.add_argument("--no-gui", action="store_true",
-                       help="无界面模式（预留）")
+                       help="无界面批量识别模式，识别 inputs 中的截图")
+    parser.add_argument("inputs", nargs="*",
+                       help="无界面模式下要识别的图片文件、目录或通配符")
+    parser.add_argument("--output", "-o", type=str, default="-",
+                       help="无界面模式的 JSONL 结果文件，默认输出到标准输出")
+    parser.add_argument("--workers", "-j", type=int, default=os.cpu_count() or 1,
+                       help="无界面模式的识别进程数，默认为 CPU 核心数")
+    parser.add_argument("--threshold", "-t", type=float, default=0.5,
+                       help="匹配置信度阈值，默认 0.5")
+    parser.add_argument("--top-k", type=int, default=5,
+                       help="无界面模式每张图输出的结果数，默认 5")
+    parser.add_argument("--engine", choices=["opencv", "fft"], default="opencv",
+                       help="匹配引擎，默认 opencv")
+    parser.add_argument("--mode", choices=["color", "gray", "edge"], default="color",
+                       help="匹配前的预处理：彩色、灰度或梯度，默认 color")
+    parser.add_argument("--mask", action="store_true",
+                       help="以图标的透明通道作为匹配掩码，透明边框不参与匹配（仅 opencv 引擎）")
+    parser.add_argument("--auto-scale", action="store_true",
+                       help="自动估计界面缩放比例（0.7~1.5），只按估计的比例匹配，代替固定的五级缩放")
+    parser.add_argument("--coarse-to-fine", action="store_true",
+                       help="大截图先在缩小的截图上粗匹配，只在候选位置附近做全分辨率匹配；界面、连续帧和服务模式有效")
+    parser.add_argument("--match-workers", type=int, default=1,
+                       help="单次识别内并行匹配的线程数，1 为串行，0 为 CPU 核心数；界面、连续帧和服务模式有效，默认 1")
+    parser.add_argument("--best-only", action="store_true",
+                       help="界面只显示最匹配的门派，识别改用找到确定结果即停止的 match_best（更快）")
+    parser.add_argument("--track", action="store_true",
+                       help="记住上次命中的图标和位置，下次先在附近查找（反复识别同一面板时更快）；界面、连续帧和服务模式有效")
+    parser.add_argument("--detect", action="store_true",
+                       help="无界面模式输出截图中全部图标实例的位置（如团队面板），而不只是最匹配的门派")
+    parser.add_argument("--stream", type=str, default=None, metavar="SOURCE",
+                       help="连续帧识别：视频文件、图片目录、screen 或 screen:x,y,宽,高，结果以 JSONL 输出")
+    parser.add_argument("--roi", type=str, default=None,
+                       help="连续帧识别的关注区域 x,y,宽,高，只在该区域内检测变化和识别")
+    parser.add_argument("--fps", type=float, default=None,
+                       help="连续帧识别的取帧帧率（屏幕默认 10，视频按文件帧率）")
+    parser.add_argument("--diff-threshold", type=float, default=12.0,
+                       help="连续帧识别的画面变化阈值（32x32 灰度缩略图单格差值，0~255），默认 12")
+    parser.add_argument("--sync", action="store_true",
+                       help="启动后在后台检查图标更新，有变化的图标会被热更新")
+    parser.add_argument("--serve", action="store_true",
+                       help="以常驻服务方式运行，通过 HTTP POST /match 提供识别")
+    parser.add_argument("--host", type=str, default="127.0.0.1",
+                       help="服务模式监听地址，默认 127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765,
+                       help="服务模式监听端口，默认 8765")
+    parser.add_argument("--trace", type=str, default=None,
+                       help="开启耗时统计，每次识别的分段耗时以 JSON 行追加到该文件")
+    parser.add_argument("--metrics", type=str, default=None,
+                       help="开启耗时统计，汇总直方图以 Prometheus 文本格式写入该文件")
+    parser.add_argument("--startup-check", action="store_true",
+                       help="界面模式下识别就绪后立即退出，用于测量启动耗时")
     return parser.parse_args()
 
 
-def main():
-    args = parse_args()
-    
-    # 确定 assets 目录
-    if args.assets:
-        assets_dir = Path(args.assets)
-    else:
-        assets_dir = Path(__file__).parent / "assets"
+def ensure_assets(assets_dir: Path, log=sys.stdout, bank: str = DEFAULT_BANK):
+    """确保图标库就绪，缺失时自动下载（没有图标列表的库只使用目录中已有的图标）"""
+    from src.fetcher import IconFetcher
     
-    print("=" * 50)
-    print("🎮 剑网三门派识别工具")
-    print("=" * 50)
-    
-    # Step 1: 确保图标库就绪
-    print(f"\n📦 图标库目录: {assets_dir}")
-    fetcher = IconFetcher(assets_dir)
+    print(f"\n📦 图标库目录: {assets_dir}", file=log)
+    catalogue = BANKS[bank].catalogue
+    if catalogue is None:
+        count = len(list(assets_dir.glob("*.png"))) if assets_dir.exists() else 0
+        print(f"   {BANKS[bank].title}: 已有 {count} 个图标（该库不自动下载）", file=log)
+        return
+    fetcher = IconFetcher(assets_dir, catalogue=catalogue)
     
     local_count = fetcher.get_local_count()
-    print(f"   已有的图标: {local_count} 个")
+    print(f"   已有的图标: {local_count} 个", file=log)
     
     if not fetcher.is_complete():
-        print("\n⏬ 正在下载门派图标（首次运行）...")
-        print("   (如下载失败，可手动将图标放入 assets/ 目录)\n")
+        print("\n⏬ 正在下载门派图标（首次运行）...", file=log)
+        print("   (如下载失败，可手动将图标放入 assets/ 目录)\n", file=log)
         
         def progress(current, total, name):
-            print(f"\r   [{current}/{total}] 正在下载: {name}...", end="", flush=True)
+            print(f"\r   [{current}/{total}] 正在下载: {name}...", end="", flush=True, file=log)
         
         results = fetcher.download_all(progress_callback=progress)
-        print("\n\n   下载完成!")
+        print("\n\n   下载完成!", file=log)
         
         success_count = sum(1 for v in results.values() if v)
-        print(f"   成功: {success_count}/{len(results)}")
+        print(f"   成功: {success_count}/{len(results)}", file=log)
         
         if success_count < len(results) * 0.5:
-            print("\n⚠️ 警告: 下载成功率较低，请检查网络后重试")
-            print("   或手动从网络获取图标放入 assets/ 目录")
+            print("\n⚠️ 警告: 下载成功率较低，请检查网络后重试", file=log)
+            print("   或手动从网络获取图标放入 assets/ 目录", file=log)
     else:
-        print("✅ 图标库已就绪")
+        print("✅ 图标库已就绪", file=log)
+
+
+def matcher_options(args) -> dict:
+    """
+    界面、连续帧和服务模式创建匹配器时共用的参数
+    调用前应已按 --match-workers 调用过一次 configure_cv_threads（OpenCV 内部线程数是进程级设置）
+    """
+    return dict(engine=args.engine, mode=args.mode, use_mask=args.mask, auto_scale=args.auto_scale,
+                track=args.track, coarse_to_fine=args.coarse_to_fine, max_workers=args.match_workers or None)
+
+
+def run_headless(args, assets_dir: Path) -> int:
+    """无界面批量识别，返回进程退出码"""
+    from src.batch import run_batch
+
+    if not args.inputs:
+        print("❌ 无界面模式需要指定要识别的图片、目录或通配符", file=sys.stderr)
+        return 2
+
+    ensure_assets(assets_dir, log=sys.stderr, bank=args.bank)
+
+    if args.output == "-":
+        summary = run_batch(args.inputs, assets_dir, sys.stdout, max(1, args.workers),
+                            args.threshold, args.top_k, args.engine, args.mode, args.mask,
+                            args.detect, args.auto_scale)
+    else:
+        with open(args.output, "w", encoding="utf-8") as out:
+            summary = run_batch(args.inputs, assets_dir, out, max(1, args.workers),
+                                args.threshold, args.top_k, args.engine, args.mode, args.mask,
+                                args.detect, args.auto_scale)
+    return 1 if summary["errors"] else 0
+
+
+def run_stream_mode(args, assets_dir: Path) -> int:
+    """连续帧识别，返回进程退出码"""
+    from src.matcher import IconMatcher, configure_cv_threads
+    from src.stream import open_source, parse_region, run_stream
+
+    try:
+        roi = parse_region(args.roi) if args.roi else None
+        source = open_source(args.stream, args.fps)
+    except (ValueError, ImportError) as e:
+        print(f"❌ 无法打开帧来源: {e}", file=sys.stderr)
+        return 2
+
+    ensure_assets(assets_dir, log=sys.stderr, bank=args.bank)
+    configure_cv_threads(args.match_workers or None)
+    matcher = IconMatcher(assets_dir, **matcher_options(args))
+    kwargs = dict(threshold=args.threshold, roi=roi, diff_threshold=args.diff_threshold,
+                  detect=args.detect, top_k=args.top_k)
+    try:
+        if args.output == "-":
+            run_stream(matcher, source, sys.stdout, **kwargs)
+        else:
+            with open(args.output, "w", encoding="utf-8") as out:
+                run_stream(matcher, source, out, **kwargs)
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+    finally:
+        matcher.close()
+        metrics.flush()
+    return 0
+
+
+def background_sync(assets_dir: Path, bank: str = DEFAULT_BANK):
+    """后台按清单检查图标更新（条件请求），变化的图标由 AssetWatcher 热更新"""
+    from src.fetcher import SYNC_UPDATED, IconFetcher
     
-    # Step 2: 验证 matcher
+    catalogue = BANKS[bank].catalogue
+    if catalogue is None:
+        return
     try:
-        matcher = IconMatcher(assets_dir)
-        print(f"✅ 成功加载 {len(matcher.template_cache)} 个门派模板")
+        results = IconFetcher(assets_dir, catalogue=catalogue).sync(refresh=True)
+    except Exception as e:
+        print(f"⚠️ 图标更新检查失败: {e}")
+        return
+    updated = [name for name, status in results.items() if status == SYNC_UPDATED]
+    if updated:
+        print(f"🔄 已更新 {len(updated)} 个图标: {', '.join(updated)}")
+
+
+def run_server(args, assets_root: Path) -> int:
+    """常驻识别服务，返回进程退出码；默认图标库启动时加载，其余图标库在第一次被请求时加载"""
+    from src.banks import MatcherPool
+    from src.matcher import IconMatcher, configure_cv_threads
+    from src.server import serve
+
+    ensure_assets(bank_dir(assets_root, args.bank), bank=args.bank)
+    configure_cv_threads(args.match_workers or None)
+
+    def factory(assets_dir: Path) -> IconMatcher:
+        return IconMatcher(assets_dir, **matcher_options(args))
+
+    pool = MatcherPool(assets_root, factory, args.memory_budget, args.bank)
+    try:
+        matcher = pool.get()
     except Exception as e:
         print(f"\n❌ 图标加载失败: {e}")
-        print("   请确保 assets/ 目录包含 .png 图标文件")
-        sys.exit(1)
+        return 1
+    print(f"✅ 成功加载 {len(matcher.template_cache)} 个模板（{BANKS[args.bank].title}）")
+    serve(pool, args.host, args.port)
+    pool.close()
+    return 0
+
+
+def main():
+    args = parse_args()
     
-    # Step 3: 启动 GUI
-    print("\n🖥️ 启动图形界面...")
-    print("   按 F9 从剪贴板获取图片并自动识别")
-    print("   按 Ctrl+C 退出\n")
+    # 确定 assets 目录，以及所选图标库在其中的目录
+    if args.assets:
+        assets_root = Path(args.assets)
+    else:
+        assets_root = Path(__file__).parent / "assets"
+    assets_dir = bank_dir(assets_root, args.bank)
     
-    gui = JX3DetectorGUI(assets_dir)
+    # 耗时统计默认关闭；批量模式的识别在子进程中进行，不在统计范围内
+    if args.trace or args.metrics:
+        metrics.enable(trace_path=args.trace, prom_path=args.metrics)
     
-    # 绑定全局快捷键
-    hotkey = HotkeyListener(callback=gui.set_screenshot)
+    if args.serve:
+        sys.exit(run_server(args, assets_root))
+    if args.stream:
+        sys.exit(run_stream_mode(args, assets_dir))
+    if args.no_gui:
+        sys.exit(run_headless(args, assets_dir))
+    
+    run_gui(args, assets_dir)
+
+
+def elapsed_ms() -> float:
+    """距程序启动的毫秒数"""
+    return (time.perf_counter() - STARTED_AT) * 1000
+
+
+def load_matcher(gui, assets_dir: Path, args, on_ready):
+    """
+    后台线程：确保图标库就绪 -> 加载模板 -> OpenCV 预热 -> 注入界面
+    识别所需的全部重模块都在这里首次导入；任何一步失败都在状态栏显示，窗口不会停在加载中
+    """
+    stage = "图标库检查"
+    try:
+        from src.matcher import IconMatcher, configure_cv_threads
+        
+        gui.set_status("状态: 正在检查图标库...")
+        ensure_assets(assets_dir, bank=args.bank)
+        
+        stage = "图标加载"
+        gui.set_status("状态: 正在加载门派图标...")
+        configure_cv_threads(args.match_workers or None)
+        matcher = IconMatcher(assets_dir, **matcher_options(args))
+        print(f"✅ 成功加载 {len(matcher.template_cache)} 个门派模板")
+        
+        stage = "识别器初始化"
+        matcher.warm_up()
+        gui.attach_matcher(matcher)
+        ready_ms = elapsed_ms()
+        print(f"⏱️ 识别就绪: {ready_ms:.0f} ms")
+        if metrics.enabled:
+            metrics.observe("startup.ready", ready_ms / 1000)
+        on_ready(matcher)
+    except Exception as e:
+        print(f"\n❌ {stage}失败: {e}")
+        if stage == "图标加载":
+            print("   请确保 assets/ 目录包含 .png 图标文件")
+        gui.set_status(f"状态: {stage}失败 - {e}")
+
+
+def run_gui(args, assets_dir: Path):
+    """界面模式：先显示窗口，图标检查/下载、模板加载和预热在后台进行"""
+    print("=" * 50)
+    print("🎮 剑网三门派识别工具")
+    print("=" * 50)
+    
+    # 界面相关模块依赖 Tk / pynput / pywin32，仅在界面模式下导入
+    from src.gui import JX3DetectorGUI
+    from src.hotkey import HotkeyListener
+    
+    gui = JX3DetectorGUI(assets_dir, best_only=args.best_only)
+    
+    def on_shown():
+        shown_ms = elapsed_ms()
+        print(f"⏱️ 窗口显示: {shown_ms:.0f} ms")
+        if metrics.enabled:
+            metrics.observe("startup.window", shown_ms / 1000)
+    
+    gui.root.after_idle(on_shown)
+    
+    # 绑定全局快捷键（截图经队列交给界面线程，识别器就绪后自动识别）
+    hotkey = HotkeyListener(callback=gui.submit_screenshot)
     hotkey.start()
     print("✅ F9 全局快捷键已启用（剪贴板图片自动识别）")
+    print("   按 Ctrl+C 退出\n")
+    
+    watcher = None
+    
+    def on_ready(matcher):
+        nonlocal watcher
+        if args.startup_check:
+            gui.call_in_ui(on_close)
+            return
+        # 监视图标目录，图标更新后只热更新变化的模板
+        from src.watcher import AssetWatcher
+        
+        watcher = AssetWatcher(matcher)
+        watcher.start()
+        if args.sync:
+            threading.Thread(target=background_sync, args=(assets_dir, args.bank), daemon=True).start()
     
     # 界面关闭时退出
     def on_close():
         hotkey.stop()
-        gui.root.destroy()
+        if watcher is not None:
+            watcher.stop()
+        metrics.flush()
+        gui.close()
     
     gui.root.protocol("WM_DELETE_WINDOW", on_close)
+    threading.Thread(target=load_matcher, args=(gui, assets_dir, args, on_ready),
+                     name="matcher-loader", daemon=True).start()
     
     try:
         gui.root.mainloop()
     except KeyboardInterrupt:
         print("\n\n👋 退出")
-        hotkey.stop()
+        on_close()
         sys.exit(0)
 
 
 if __name__ == "__main__":
+    # 批量模式使用进程池；PyInstaller 打包的 exe 以 spawn 启动子进程，需要在这里把子进程交给 multiprocessing
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,102 @@
+"""
+共享内存模板库模块
+把编译好的模板库（格式与 templates.bank 文件相同：头部索引 + 按 64 字节对齐的连续数据区）
+放进一块 multiprocessing.shared_memory，工作进程按名称挂载后直接以 NumPy 视图使用，不复制也不解码，
+进程数和图标数量增加时模板数据始终只有一份
+"""
+from multiprocessing import shared_memory
+from typing import Optional
+
+import numpy as np
+
+from .bank import TemplateBank, bank_from_buffer, bank_size, read_header, write_bank
+
+
+class TemplateArena:
+    """
+    共享内存中的模板库
+    - publish(bank): 创建者进程写入，初始引用计数为 1
+    - attach(name): 其他进程按名称挂载（只读视图），release() 只解除本进程的映射
+    创建者的引用计数降到 0 时解除映射并删除共享内存；已挂载的进程可以继续使用到各自 release
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self._shm = shm
+        self._owner = owner
+        self._refs = 1
+        self._bank: Optional[TemplateBank] = None
+
+    @classmethod
+    def publish(cls, bank: TemplateBank) -> "TemplateArena":
+        """把模板库写入新建的共享内存"""
+        size = bank_size(bank)
+        shm = shared_memory.SharedMemory(create=True, size=max(1, size))
+        try:
+            write_bank(np.ndarray((size,), dtype=np.uint8, buffer=shm.buf), bank)
+        except BaseException:
+            shm.close()
+            shm.unlink()
+            raise
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> "TemplateArena":
+        """按名称挂载已发布的共享内存模板库"""
+        return cls(shared_memory.SharedMemory(name=name), owner=False)
+
+    @property
+    def name(self) -> str:
+        """共享内存名称，传给工作进程用于 attach"""
+        return self._shm.name
+
+    @property
+    def size(self) -> int:
+        return self._shm.size
+
+    def bank(self) -> TemplateBank:
+        """以共享内存上的只读视图组装模板库，多次调用返回同一个对象"""
+        if self._bank is None:
+            if self._refs <= 0:
+                raise ValueError("共享模板库已释放")
+            buf = np.ndarray((self._shm.size,), dtype=np.uint8, buffer=self._shm.buf)
+            buf.flags.writeable = False
+            parsed = read_header(self._shm.buf)
+            if parsed is None:
+                raise ValueError(f"共享内存 {self.name} 不是模板库")
+            self._bank = bank_from_buffer(buf, *parsed)
+        return self._bank
+
+    def acquire(self) -> "TemplateArena":
+        """增加一个引用（同一进程中多个使用者共用时）"""
+        if self._refs <= 0:
+            raise ValueError("共享模板库已释放")
+        self._refs += 1
+        return self
+
+    def release(self):
+        """
+        减少一个引用，降到 0 时解除映射；创建者还会删除共享内存
+        本进程中仍有数组引用映射区时，映射留到这些数组被回收后再由解释器关闭
+        """
+        if self._refs <= 0:
+            return
+        self._refs -= 1
+        if self._refs > 0:
+            return
+        self._bank = None
+        try:
+            self._shm.close()
+        except BufferError:
+            pass
+        if self._owner:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self) -> "TemplateArena":
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
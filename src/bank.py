@@ -0,0 +1,250 @@
+"""
+模板库编译模块
+将解码、预处理后的模板及其缩放图像打包为单个可内存映射的文件，
+启动时直接映射读取，省去逐个 PNG 解码的开销
+"""
+import hashlib
+import json
+import os
+import struct
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+BANK_FILENAME = "templates.bank"
+BANK_MAGIC = b"JX3BANK1"
+BANK_ALIGN = 64  # 数据区按 64 字节对齐
+
+
+class TemplateBank:
+    """已编译的模板库（内存中的表示）"""
+
+    def __init__(self, templates: dict[str, np.ndarray],
+                 pyramid: dict[str, list[tuple[float, np.ndarray]]],
+                 name_map: dict[str, str], config: dict,
+                 sources: dict[str, list], key: str,
+                 masks: Optional[dict[str, list[tuple[float, np.ndarray]]]] = None):
+        self.templates = templates  # 英文名 -> 原始图像
+        self.pyramid = pyramid  # 英文名 -> [(缩放比例, 缩放并预处理后的图像), ...]
+        self.masks = masks or {}  # 英文名 -> [(缩放比例, 模板掩码), ...]，只含有透明区域的级别
+        self.name_map = name_map
+        self.config = config  # 生成模板库时的参数（缩放比例等）
+        self.sources = sources  # 源文件名 -> [mtime_ns, 大小, sha1]
+        self.key = key  # 源文件内容 + 参数的校验值
+        # 模板数组所在的缓冲区（内存映射文件或共享内存），None 表示各数组独立持有内存
+        self.buffer: Optional[np.ndarray] = None
+
+
+def file_digest(path: Path) -> str:
+    """计算文件内容的 sha1"""
+    return hashlib.sha1(Path(path).read_bytes()).hexdigest()
+
+
+def _source_files(assets_dir: Path) -> list[Path]:
+    """参与校验的源文件：全部 PNG 图标及名称映射"""
+    files = sorted(assets_dir.glob("*.png"))
+    map_path = assets_dir / "name_map.json"
+    if map_path.exists():
+        files.append(map_path)
+    return files
+
+
+def scan_sources(assets_dir: Path) -> dict[str, list]:
+    """扫描源文件，返回 {文件名: [mtime_ns, 大小, sha1]}"""
+    sources = {}
+    for path in _source_files(Path(assets_dir)):
+        st = path.stat()
+        sources[path.name] = [st.st_mtime_ns, st.st_size, file_digest(path)]
+    return sources
+
+
+def make_key(sources: dict[str, list], config: dict) -> str:
+    """由源文件哈希与生成参数计算模板库校验值"""
+    h = hashlib.sha1()
+    for name in sorted(sources):
+        h.update(name.encode("utf-8"))
+        h.update(sources[name][2].encode("ascii"))
+    h.update(json.dumps(config, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()
+
+
+def is_fresh(sources: dict[str, list], assets_dir: Path) -> bool:
+    """
+    检查源文件是否与模板库记录一致
+    mtime 与大小相同则直接认为未变化，否则再比对内容哈希
+    """
+    assets_dir = Path(assets_dir)
+    current = {p.name: p for p in _source_files(assets_dir)}
+    if set(current) != set(sources):
+        return False
+
+    for name, path in current.items():
+        mtime_ns, size, digest = sources[name]
+        st = path.stat()
+        if st.st_size != size:
+            return False
+        if st.st_mtime_ns != mtime_ns and file_digest(path) != digest:
+            return False
+    return True
+
+
+def _align(n: int) -> int:
+    return (n + BANK_ALIGN - 1) // BANK_ALIGN * BANK_ALIGN
+
+
+def _layout(bank: TemplateBank) -> tuple[bytes, list[tuple[int, np.ndarray]], int]:
+    """
+    计算模板库的字节布局
+    格式: [魔数][头部长度 uint32][头部 JSON][填充][数据区]，数据区内每个数组按 64 字节对齐
+
+    Returns:
+        (魔数与头部, [(数组在整个模板库中的偏移, 数组), ...], 总字节数)
+    """
+    entries = []
+    blobs: list[tuple[int, np.ndarray]] = []
+    offsets: dict[int, int] = {}  # id(数组) -> 偏移，同一数组只存一次
+    offset = 0
+
+    def add(arr: np.ndarray) -> int:
+        nonlocal offset
+        if id(arr) in offsets:
+            return offsets[id(arr)]
+        start = _align(offset)
+        blobs.append((start, np.ascontiguousarray(arr, dtype=np.uint8)))
+        offset = start + arr.nbytes
+        offsets[id(arr)] = start
+        return start
+
+    for ename, template in bank.templates.items():
+        entries.append({"name": ename, "scale": None, "offset": add(template),
+                        "shape": list(template.shape)})
+        for scale, img in bank.pyramid.get(ename, []):
+            entries.append({"name": ename, "scale": scale, "offset": add(img),
+                            "shape": list(img.shape)})
+        for scale, mask in bank.masks.get(ename, []):
+            entries.append({"name": ename, "scale": scale, "offset": add(mask),
+                            "shape": list(mask.shape), "kind": "mask"})
+
+    header = json.dumps({
+        "key": bank.key,
+        "config": bank.config,
+        "sources": bank.sources,
+        "name_map": bank.name_map,
+        "entries": entries,
+    }, ensure_ascii=False).encode("utf-8")
+
+    prefix = BANK_MAGIC + struct.pack("<I", len(header)) + header
+    data_start = _align(len(prefix))
+    return prefix, [(data_start + start, arr) for start, arr in blobs], data_start + offset
+
+
+def bank_size(bank: TemplateBank) -> int:
+    """模板库序列化后的字节数"""
+    return _layout(bank)[2]
+
+
+def write_bank(buf: np.ndarray, bank: TemplateBank) -> int:
+    """将模板库写入预先分配的 uint8 缓冲区（如共享内存），返回写入的字节数"""
+    prefix, blobs, size = _layout(bank)
+    if len(buf) < size:
+        raise ValueError(f"缓冲区过小: 需要 {size} 字节，实际 {len(buf)} 字节")
+    buf[:len(prefix)] = np.frombuffer(prefix, dtype=np.uint8)
+    for start, arr in blobs:
+        buf[start:start + arr.nbytes] = arr.reshape(-1)
+    return size
+
+
+def save_bank(path: Path, bank: TemplateBank):
+    """
+    写入模板库文件，先写临时文件再替换，避免读到写了一半的文件
+    Windows 上仍被内存映射的文件无法替换，调用方需先释放对旧文件的映射；替换失败时删除临时文件
+    """
+    path = Path(path)
+    prefix, blobs, _ = _layout(bank)
+
+    tmp_path = path.with_name(path.name + ".tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(prefix)
+            pos = len(prefix)
+            for start, arr in blobs:
+                f.write(b"\0" * (start - pos))
+                f.write(arr.tobytes())
+                pos = start + arr.nbytes
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            tmp_path.unlink()
+        except OSError:
+            pass
+        raise
+
+
+def read_header(head: bytes) -> Optional[tuple[dict, int]]:
+    """
+    解析模板库开头的魔数与头部，返回 (头部, 数据区起始偏移)
+    head 至少要包含完整的头部；格式不符时返回 None
+    """
+    if head[:len(BANK_MAGIC)] != BANK_MAGIC:
+        return None
+    try:
+        (header_len,) = struct.unpack_from("<I", head, len(BANK_MAGIC))
+        start = len(BANK_MAGIC) + 4
+        header = json.loads(bytes(head[start:start + header_len]).decode("utf-8"))
+    except (ValueError, struct.error):
+        return None
+    return header, _align(start + header_len)
+
+
+def bank_from_buffer(buf: np.ndarray, header: dict, data_start: int) -> TemplateBank:
+    """以 buf（内存映射或共享内存上的 uint8 数组）上的视图组装模板库，不复制数据"""
+    templates: dict[str, np.ndarray] = {}
+    pyramid: dict[str, list[tuple[float, np.ndarray]]] = {}
+    masks: dict[str, list[tuple[float, np.ndarray]]] = {}
+    for entry in header["entries"]:
+        shape = tuple(entry["shape"])
+        start = data_start + entry["offset"]
+        arr = buf[start:start + int(np.prod(shape))].reshape(shape)
+        if entry["scale"] is None:
+            templates[entry["name"]] = arr
+        elif entry.get("kind") == "mask":
+            masks.setdefault(entry["name"], []).append((entry["scale"], arr))
+        else:
+            pyramid.setdefault(entry["name"], []).append((entry["scale"], arr))
+
+    bank = TemplateBank(templates, pyramid, header["name_map"], header["config"],
+                        header["sources"], header["key"], masks)
+    bank.buffer = buf
+    return bank
+
+
+def load_bank(path: Path, assets_dir: Path, config: dict) -> Optional[TemplateBank]:
+    """
+    以内存映射方式读取模板库，模板数组直接引用映射区，不做拷贝
+    文件不存在、格式不符、参数不同或源文件已变化时返回 None
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+
+    try:
+        with open(path, "rb") as f:
+            head = f.read(len(BANK_MAGIC) + 4)
+            if len(head) == len(BANK_MAGIC) + 4 and head.startswith(BANK_MAGIC):
+                (header_len,) = struct.unpack_from("<I", head, len(BANK_MAGIC))
+                head += f.read(header_len)
+    except OSError:
+        return None
+    parsed = read_header(head)
+    if parsed is None:
+        return None
+    header, data_start = parsed
+
+    if header.get("config") != config:
+        return None
+    if not is_fresh(header["sources"], assets_dir):
+        return None
+
+    buf = np.memmap(path, dtype=np.uint8, mode="r")
+    return bank_from_buffer(buf, header, data_start)
@@ -0,0 +1,160 @@
+"""
+多图标库模块
+不同用途的图标分成若干命名的图标库（正式服心法、怀旧服心法、技能图标……），
+每个库是 assets 下的一个目录，有各自的名称映射（name_map.json）和编译后的模板库文件；
+只有带 catalogue 的库（std）有图标清单（manifest.json）并可自动下载，其余库只使用目录中已有的图标 PNG：
+- 图标库在第一次被查询时才加载，启动耗时与图标总数无关；加载不占用池的锁，其他已加载的库照常使用
+- 已加载的库按最近使用顺序排列，总内存超出预算时淘汰最久未用的库
+"""
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Optional
+
+from .manifest import ICON_CATALOGUE
+
+if TYPE_CHECKING:
+    import numpy as np
+
+    from .matcher import Detection, IconMatcher
+
+DEFAULT_BANK = "std"
+DEFAULT_MEMORY_BUDGET_MB = 256
+
+
+class BankSpec:
+    def __init__(self, name: str, directory: str, title: str,
+                 catalogue: Optional[list[tuple[int, str, str]]] = None):
+        self.name = name
+        self.directory = directory  # 相对 assets 的目录，空字符串为 assets 本身
+        self.title = title
+        # (图标ID, 英文名, 中文名) 列表，可自动下载；为 None 时只使用目录中已有的图标
+        self.catalogue = catalogue
+
+
+# 正式服心法沿用 assets 根目录，与只有一个图标库时的布局兼容
+BANKS: dict[str, BankSpec] = {
+    "std": BankSpec("std", "", "正式服心法", ICON_CATALOGUE),
+    "classic": BankSpec("classic", "classic", "怀旧服心法"),
+    "skill": BankSpec("skill", "skills", "技能图标"),
+}
+
+
+def bank_dir(assets_root: Path, name: str) -> Path:
+    """图标库所在目录，未知的库名抛出 KeyError"""
+    if name not in BANKS:
+        raise KeyError(f"未知的图标库: {name}，可选: {', '.join(BANKS)}")
+    return Path(assets_root) / BANKS[name].directory
+
+
+class MatcherPool:
+    """
+    按名称延迟加载的图标库集合，接口与 IconMatcher 的 match / match_best / detect 相同，
+    另有 bank 参数选择图标库（默认 default_bank）
+
+    Args:
+        assets_root: assets 目录
+        factory: 由图标库目录创建匹配器的函数，默认 IconMatcher(目录)
+        memory_budget_mb: 已加载图标库的内存预算（MB），刚加载的库即使单独超出预算也会保留
+        default_bank: 未指定 bank 时使用的图标库
+    """
+
+    def __init__(self, assets_root: Path, factory: Optional[Callable[[Path], "IconMatcher"]] = None,
+                 memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB, default_bank: str = DEFAULT_BANK):
+        bank_dir(assets_root, default_bank)
+        if factory is None:
+            from .matcher import IconMatcher
+
+            factory = IconMatcher
+        self.assets_root = Path(assets_root)
+        self.factory = factory
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self.default_bank = default_bank
+        self._matchers: OrderedDict[str, "IconMatcher"] = OrderedDict()  # 最近使用的在末尾
+        self._sizes: dict[str, int] = {}
+        self._loading: dict[str, Future] = {}  # 正在加载的库 -> 加载结果
+        self._lock = threading.Lock()  # 只保护上面三个字典，加载和关闭匹配器都在锁外进行
+
+    def get(self, bank: Optional[str] = None) -> "IconMatcher":
+        """
+        取出图标库的匹配器，未加载时加载，并按预算淘汰最久未用的库
+        加载在锁外进行：同一个库同时只加载一次，其他线程等待同一结果；加载失败时异常抛给所有等待者，下次调用重新加载
+        """
+        name = bank or self.default_bank
+        directory = bank_dir(self.assets_root, name)
+        with self._lock:
+            matcher = self._matchers.get(name)
+            if matcher is not None:
+                self._matchers.move_to_end(name)
+                return matcher
+            pending = self._loading.get(name)
+            if pending is None:
+                pending = self._loading[name] = Future()
+                loader = True
+            else:
+                loader = False
+        if not loader:
+            return pending.result()
+
+        try:
+            matcher = self.factory(directory)
+            size = matcher.memory_bytes()
+        except BaseException as e:
+            with self._lock:
+                del self._loading[name]
+            pending.set_exception(e)
+            raise
+        with self._lock:
+            del self._loading[name]
+            self._matchers[name] = matcher
+            self._sizes[name] = size
+            victims = self._evict(keep=name)
+        pending.set_result(matcher)
+        for victim in victims:
+            victim.close()  # 会等待该库上正在进行的识别结束
+        return matcher
+
+    def _evict(self, keep: str) -> list["IconMatcher"]:
+        """在锁内移出超出预算的最久未用的库，返回这些匹配器，由调用方在锁外关闭"""
+        victims = []
+        while sum(self._sizes.values()) > self.memory_budget and len(self._matchers) > 1:
+            name = next(iter(self._matchers))
+            if name == keep:
+                break
+            victims.append(self._matchers.pop(name))
+            self._sizes.pop(name)
+        return victims
+
+    def memory_bytes(self) -> int:
+        """已加载图标库的内存占用估计（字节）"""
+        with self._lock:
+            return sum(self._sizes.values())
+
+    def loaded(self) -> list[str]:
+        """已加载的图标库，按最近使用从旧到新"""
+        with self._lock:
+            return list(self._matchers)
+
+    def match(self, screenshot: "np.ndarray", threshold: float = 0.6,
+              should_cancel: Optional[Callable[[], bool]] = None,
+              bank: Optional[str] = None) -> list[tuple[str, float]]:
+        return self.get(bank).match(screenshot, threshold, should_cancel)
+
+    def match_best(self, screenshot: "np.ndarray", threshold: float = 0.6,
+                   should_cancel: Optional[Callable[[], bool]] = None,
+                   bank: Optional[str] = None) -> Optional[tuple[str, float]]:
+        return self.get(bank).match_best(screenshot, threshold, should_cancel)
+
+    def detect(self, screenshot: "np.ndarray", threshold: float = 0.8, iou_threshold: float = 0.3,
+               bank: Optional[str] = None) -> list["Detection"]:
+        return self.get(bank).detect(screenshot, threshold, iou_threshold)
+
+    def close(self):
+        with self._lock:
+            matchers = list(self._matchers.values())
+            self._matchers.clear()
+            self._sizes.clear()
+        # 在锁外关闭，等待识别结束时不阻塞其他库
+        for matcher in matchers:
+            matcher.close()
@@ -0,0 +1,152 @@
+"""
+无界面批量识别模块
+将文件、目录或通配符展开为截图路径流，在进程池中解码并匹配，
+结果按完成顺序逐行写出为 JSONL，最后汇总吞吐量与延迟分位数
+模板由主进程发布到共享内存，各工作进程直接挂载，不各自加载
+"""
+import glob
+import json
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, TextIO
+
+import cv2
+import numpy as np
+
+from .matcher import IconMatcher
+
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".bmp"}
+
+# 工作进程内的匹配器，由 _init_worker 创建
+_worker_matcher: Optional[IconMatcher] = None
+
+
+def iter_image_paths(inputs: Iterable[str]) -> Iterator[Path]:
+    """将文件、目录（递归）和通配符展开为图片路径，逐个产出"""
+    for item in inputs:
+        if any(ch in item for ch in "*?["):
+            candidates = (Path(p) for p in sorted(glob.glob(item, recursive=True)))
+        elif Path(item).is_dir():
+            candidates = (p for p in sorted(Path(item).rglob("*")) if p.is_file())
+        else:
+            yield Path(item)
+            continue
+        for path in candidates:
+            if path.suffix.lower() in IMAGE_SUFFIXES:
+                yield path
+
+
+def _init_worker(assets_dir: str, engine: str, mode: str, use_mask: bool, auto_scale: bool,
+                 arena: Optional[str] = None):
+    """
+    工作进程初始化：给出 arena 时挂载主进程发布的共享内存模板库，
+    否则从已编译的模板库文件（内存映射，进程间共享页缓存）创建匹配器
+    """
+    global _worker_matcher
+    cv2.setNumThreads(1)  # 并行由进程池负责
+    _worker_matcher = IconMatcher(Path(assets_dir), engine=engine, mode=mode, use_mask=use_mask,
+                                  auto_scale=auto_scale, arena=arena)
+
+
+def _recognize(path: str, threshold: float, top_k: int, detect: bool = False) -> dict:
+    """在工作进程中解码并识别一张截图，detect 为 True 时输出截图中全部图标实例的位置"""
+    start = time.perf_counter()
+    record = {"path": path}
+    try:
+        # 用 imdecode 读取，兼容 Windows 下的中文路径
+        img = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+        decoded = time.perf_counter()
+        if img is None:
+            raise ValueError("无法解码图片")
+        if detect:
+            detections = _worker_matcher.detect(img, threshold=threshold)
+            record["detections"] = [[name, score, x, y, scale] for name, score, x, y, scale in detections]
+        else:
+            results = _worker_matcher.match(img, threshold=threshold)
+            record["results"] = [[name, score] for name, score in results[:top_k]]
+        matched = time.perf_counter()
+        record["decode_ms"] = round((decoded - start) * 1000, 2)
+        record["match_ms"] = round((matched - decoded) * 1000, 2)
+    except Exception as e:
+        record["error"] = str(e)
+    record["total_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return record
+
+
+def iter_results(paths: Iterable[Path], assets_dir: Path, workers: int, threshold: float = 0.5,
+                 top_k: int = 5, engine: str = "opencv", mode: str = "color",
+                 use_mask: bool = False, detect: bool = False,
+                 auto_scale: bool = False, arena: Optional[str] = None) -> Iterator[dict]:
+    """
+    在进程池中识别截图，按完成顺序产出结果
+    同时在途的任务数有上限，路径流不会被一次性读完
+    """
+    max_pending = workers * 4
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(str(assets_dir), engine, mode, use_mask, auto_scale, arena)) as pool:
+        pending = set()
+        for path in paths:
+            pending.add(pool.submit(_recognize, str(path), threshold, top_k, detect))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def summarize(latencies_ms: list[float], errors: int, elapsed: float) -> dict:
+    """汇总吞吐量与延迟分位数"""
+    count = len(latencies_ms)
+    summary = {
+        "count": count,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput": round(count / elapsed, 2) if elapsed > 0 else 0.0,
+    }
+    if latencies_ms:
+        p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+        summary.update(p50_ms=round(float(p50), 2), p95_ms=round(float(p95), 2),
+                       p99_ms=round(float(p99), 2))
+    return summary
+
+
+def run_batch(inputs: list[str], assets_dir: Path, out: TextIO, workers: int,
+              threshold: float = 0.5, top_k: int = 5, engine: str = "opencv",
+              mode: str = "color", use_mask: bool = False, detect: bool = False,
+              auto_scale: bool = False, log: TextIO = sys.stderr) -> dict:
+    """
+    批量识别入口：结果逐行写入 out，汇总信息写入 log
+
+    Returns:
+        汇总信息（数量、失败数、吞吐量、延迟分位数）
+    """
+    # 先在主进程加载模板并发布到共享内存，工作进程只需挂载
+    matcher = IconMatcher(assets_dir, engine=engine, mode=mode, use_mask=use_mask, auto_scale=auto_scale)
+    arena = matcher.publish_arena()
+    matcher.close()
+
+    start = time.perf_counter()
+    latencies = []
+    errors = 0
+    with arena:
+        for record in iter_results(iter_image_paths(inputs), assets_dir, workers,
+                                   threshold, top_k, engine, mode, use_mask, detect, auto_scale,
+                                   arena.name):
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            latencies.append(record["total_ms"])
+            if "error" in record:
+                errors += 1
+
+    summary = summarize(latencies, errors, time.perf_counter() - start)
+    print(f"\n处理 {summary['count']} 张，失败 {errors} 张，"
+          f"用时 {summary['elapsed_s']}s，吞吐 {summary['throughput']} 张/秒", file=log)
+    if latencies:
+        print(f"延迟 p50/p95/p99: {summary['p50_ms']} / {summary['p95_ms']} / "
+              f"{summary['p99_ms']} ms", file=log)
+    return summary
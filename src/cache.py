@@ -0,0 +1,71 @@
+"""
+识别结果缓存模块
+以截图内容指纹 + 匹配参数为键的 LRU 缓存，剪贴板未变化时重复识别直接返回
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+import numpy as np
+
+_MISSING = object()
+
+
+def fingerprint(img: np.ndarray) -> str:
+    """计算图像内容指纹（形状、类型 + 像素数据的 blake2b 摘要）"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{img.shape}{img.dtype}".encode("ascii"))
+    h.update(memoryview(np.ascontiguousarray(img)).cast("B"))
+    return h.hexdigest()
+
+
+class ResultCache:
+    """线程安全的 LRU 缓存，可选过期时间"""
+
+    def __init__(self, max_size: int = 32, ttl: Optional[float] = None):
+        """
+        Args:
+            max_size: 最多缓存的条目数，0 表示不缓存
+            ttl: 条目有效期（秒），None 表示不过期
+        """
+        self.max_size = max(0, max_size)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """取出缓存值，不存在或已过期时返回 default"""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                stored_at, value = entry
+                if self.ttl is None or time.monotonic() - stored_at <= self.ttl:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any):
+        if self.max_size == 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def info(self) -> dict[str, int]:
+        """返回命中/未命中次数及当前条目数"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "size": len(self._data), "max_size": self.max_size}
@@ -0,0 +1,66 @@
+"""
+多目标检测辅助模块
+从模板匹配的响应图中提取全部局部峰值，并在所有模板、所有缩放级别的候选框之间做非极大值抑制，
+用于在团队/团队面板截图中找出每一个门派图标的位置
+"""
+import cv2
+import numpy as np
+
+
+def find_peaks(res: np.ndarray, threshold: float, w: int, h: int,
+               limit: int = 256) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    提取响应图中不低于 threshold 的局部最大值
+    局部范围为模板尺寸的一半，用一次矩形膨胀比较得到，不逐个抹除邻域
+
+    Returns:
+        (xs, ys, scores)，最多 limit 个，按分数降序
+    """
+    empty = (np.empty(0, np.int32), np.empty(0, np.int32), np.empty(0, np.float32))
+    _, max_val, _, _ = cv2.minMaxLoc(res)
+    if max_val < threshold:
+        return empty
+
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(1, w // 2) | 1, max(1, h // 2) | 1))
+    local_max = cv2.dilate(res, kernel)
+    ys, xs = np.nonzero((res >= threshold) & (res >= local_max))
+    scores = res[ys, xs]
+    if len(scores) > limit:
+        top = np.argpartition(-scores, limit)[:limit]
+        xs, ys, scores = xs[top], ys[top], scores[top]
+    order = np.argsort(-scores, kind="stable")
+    return xs[order].astype(np.int32), ys[order].astype(np.int32), scores[order]
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float) -> list[int]:
+    """
+    贪心非极大值抑制
+
+    Args:
+        boxes: (N, 4) 的 [x, y, 宽, 高]
+        scores: (N,) 分数
+        iou_threshold: 与已保留框的 IoU 超过该值的候选被抑制
+
+    Returns:
+        保留下来的下标，按分数降序
+    """
+    if len(boxes) == 0:
+        return []
+    x1 = boxes[:, 0].astype(np.float32)
+    y1 = boxes[:, 1].astype(np.float32)
+    x2 = x1 + boxes[:, 2]
+    y2 = y1 + boxes[:, 3]
+    areas = (x2 - x1) * (y2 - y1)
+
+    order = np.argsort(-scores, kind="stable")
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(int(i))
+        rest = order[1:]
+        iw = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        ih = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = iw * ih
+        iou = inter / (areas[i] + areas[rest] - inter)
+        order = rest[iou <= iou_threshold]
+    return keep
@@ -0,0 +1,209 @@
+"""
+DIB 解码模块
+将剪贴板 CF_DIB / CF_DIBV5 数据（无 BITMAPFILEHEADER 的 BMP）解码为 BGR 图像，不依赖 Windows API
+
+支持:
+- BITMAPCOREHEADER(12) / BITMAPINFOHEADER(40) / V2(52) / V3(56) / V4(108) / V5(124)
+- 1/4/8 位调色板，16/24/32 位直接色，BI_BITFIELDS / BI_ALPHABITFIELDS 掩码，BI_JPEG / BI_PNG
+- 自下而上和自上而下的行序
+
+像素数据通过带步长的 NumPy 视图读取，行序翻转和去掉填充字节都不复制数据，
+只在生成最终的连续 BGR 数组时复制一次
+"""
+import struct
+from typing import Optional
+
+import numpy as np
+
+BI_RGB = 0
+BI_RLE8 = 1
+BI_RLE4 = 2
+BI_BITFIELDS = 3
+BI_JPEG = 4
+BI_PNG = 5
+BI_ALPHABITFIELDS = 6
+
+CORE_HEADER_SIZE = 12
+INFO_HEADER_SIZE = 40
+HEADER_SIZES = (12, 40, 52, 56, 64, 108, 124)
+
+# 未给出掩码时 16 位为 X1R5G5B5
+_DEFAULT_MASKS_16 = (0x7C00, 0x03E0, 0x001F)
+
+
+class DIBHeader:
+    def __init__(self, header_size: int, width: int, height: int, bit_count: int,
+                 compression: int = BI_RGB, image_size: int = 0, colors_used: int = 0):
+        self.header_size = header_size
+        self.width = width
+        self.height = abs(height)
+        self.top_down = height < 0
+        self.bit_count = bit_count
+        self.compression = compression
+        self.image_size = image_size
+        self.colors_used = colors_used
+        # (红, 绿, 蓝) 掩码，仅 BI_BITFIELDS / BI_ALPHABITFIELDS 时有值
+        self.masks: Optional[tuple[int, int, int]] = None
+
+    @property
+    def stride(self) -> int:
+        """每行字节数（按 4 字节对齐）"""
+        return ((self.width * self.bit_count + 31) // 32) * 4
+
+
+def parse_header(data: bytes) -> tuple[DIBHeader, int, Optional[np.ndarray]]:
+    """
+    解析信息头、颜色掩码和调色板
+    返回 (信息头, 像素数据偏移, 调色板)，调色板为 (N, 3) 的 BGR 视图，无调色板时为 None
+    """
+    if len(data) < 4:
+        raise ValueError("DIB 数据过短")
+    (header_size,) = struct.unpack_from("<I", data, 0)
+    if header_size not in HEADER_SIZES or len(data) < header_size:
+        raise ValueError(f"不支持的 DIB 信息头长度: {header_size}")
+
+    if header_size == CORE_HEADER_SIZE:
+        width, height, _, bit_count = struct.unpack_from("<HHHH", data, 4)
+        header = DIBHeader(header_size, width, height, bit_count)
+        entry_size = 3  # RGBTRIPLE
+    else:
+        (width, height, _, bit_count, compression, image_size,
+         _, _, colors_used) = struct.unpack_from("<iiHHIIiiI", data, 4)
+        header = DIBHeader(header_size, width, height, bit_count, compression, image_size, colors_used)
+        entry_size = 4  # RGBQUAD
+
+    if header.width <= 0 or header.height == 0:
+        raise ValueError(f"无效的图像尺寸: {header.width}x{header.height}")
+
+    offset = header_size
+    if header.compression in (BI_BITFIELDS, BI_ALPHABITFIELDS):
+        if header_size == INFO_HEADER_SIZE:
+            # 40 字节信息头的掩码紧跟在信息头之后
+            count = 4 if header.compression == BI_ALPHABITFIELDS else 3
+            if len(data) < offset + 4 * count:
+                raise ValueError("DIB 颜色掩码不完整")
+            header.masks = struct.unpack_from("<III", data, offset)
+            offset += 4 * count
+        else:
+            header.masks = struct.unpack_from("<III", data, INFO_HEADER_SIZE)
+
+    palette = None
+    if header.bit_count in (1, 4, 8) and header.compression not in (BI_JPEG, BI_PNG):
+        count = header.colors_used or (1 << header.bit_count)
+        end = offset + count * entry_size
+        if len(data) < end:
+            raise ValueError("DIB 调色板不完整")
+        table = np.frombuffer(data, dtype=np.uint8, count=count * entry_size, offset=offset)
+        palette = table.reshape(count, entry_size)[:, :3]
+        offset = end
+    elif header.colors_used and header.header_size > CORE_HEADER_SIZE:
+        offset += header.colors_used * entry_size  # 直接色图像也可能带有（可忽略的）调色板
+
+    # 部分程序生成的 V4/V5 位域 DIB 在信息头之后仍重复写了一份掩码
+    if (header.masks is not None and header_size > INFO_HEADER_SIZE
+            and header.compression == BI_BITFIELDS
+            and len(data) == offset + 12 + header.stride * header.height):
+        offset += 12
+    return header, offset, palette
+
+
+def _pixel_view(data: bytes, header: DIBHeader, offset: int, dtype, channels: int) -> np.ndarray:
+    """
+    返回按显示顺序（自上而下）排列、不含行填充的像素视图，不复制数据
+    形状为 (高, 宽) 或 (高, 宽, 通道)
+    """
+    stride = header.stride
+    itemsize = np.dtype(dtype).itemsize
+    needed = stride * header.height
+    if len(data) < offset + needed:
+        raise ValueError(f"DIB 像素数据不完整: 需要 {needed} 字节，实际 {len(data) - offset} 字节")
+
+    # 行长度总是 4 的倍数，可以直接按像素类型读取
+    buf = np.frombuffer(data, dtype=dtype, count=needed // itemsize, offset=offset)
+    if channels == 1:
+        shape, strides = (header.height, header.width), (stride, itemsize)
+    else:
+        shape, strides = (header.height, header.width, channels), (stride, channels, 1)
+    view = np.lib.stride_tricks.as_strided(buf, shape=shape, strides=strides, writeable=False)
+    return view if header.top_down else view[::-1]
+
+
+def _unpack_indices(data: bytes, header: DIBHeader, offset: int) -> np.ndarray:
+    """1/4 位调色板索引展开为 (高, 宽) 的索引数组"""
+    stride = header.stride
+    rows = np.frombuffer(data, dtype=np.uint8, count=stride * header.height,
+                         offset=offset).reshape(header.height, stride)
+    if not header.top_down:
+        rows = rows[::-1]
+    if header.bit_count == 1:
+        return np.unpackbits(rows, axis=1)[:, :header.width]
+    if header.bit_count == 4:
+        nibbles = np.stack((rows >> 4, rows & 0x0F), axis=-1).reshape(header.height, -1)
+        return nibbles[:, :header.width]
+    raise ValueError(f"不支持的调色板位深: {header.bit_count}")
+
+
+def _channel(pixels: np.ndarray, mask: int) -> np.ndarray:
+    """按位域掩码取出一个颜色通道并扩展到 0~255"""
+    if mask == 0:
+        return np.zeros(pixels.shape, dtype=np.uint8)
+    shift = (mask & -mask).bit_length() - 1
+    bits = bin(mask).count("1")
+    value = (pixels & mask) >> shift
+    if bits == 8:
+        return value.astype(np.uint8)
+    max_value = (1 << bits) - 1
+    return ((value.astype(np.uint32) * 255 + max_value // 2) // max_value).astype(np.uint8)
+
+
+def _decode_bitfields(data: bytes, header: DIBHeader, offset: int,
+                      masks: tuple[int, int, int]) -> np.ndarray:
+    r_mask, g_mask, b_mask = masks
+    if header.bit_count == 32 and (b_mask, g_mask, r_mask) in ((0xFF, 0xFF00, 0xFF0000),
+                                                               (0xFF0000, 0xFF00, 0xFF)):
+        # 字节对齐的掩码直接按字节通道取视图
+        view = _pixel_view(data, header, offset, np.uint8, 4)
+        bgr = view[..., :3] if b_mask == 0xFF else view[..., 2::-1]
+        return np.ascontiguousarray(bgr)
+
+    dtype = np.uint16 if header.bit_count == 16 else np.uint32
+    pixels = _pixel_view(data, header, offset, dtype, 1)
+    return np.dstack((_channel(pixels, b_mask), _channel(pixels, g_mask), _channel(pixels, r_mask)))
+
+
+def decode_dib(data: bytes) -> np.ndarray:
+    """
+    解码 DIB 数据为连续的 BGR uint8 图像 (高, 宽, 3)
+    数据不完整或格式不支持时抛出 ValueError
+    """
+    header, offset, palette = parse_header(data)
+
+    if header.compression in (BI_JPEG, BI_PNG):
+        import cv2
+
+        img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8, offset=offset), cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError("DIB 内嵌的 JPEG/PNG 数据无法解码")
+        return img
+    if header.compression in (BI_RLE8, BI_RLE4):
+        raise ValueError("不支持 RLE 压缩的 DIB")
+
+    if palette is not None:
+        if header.bit_count == 8:
+            indices = _pixel_view(data, header, offset, np.uint8, 1)
+        else:
+            indices = _unpack_indices(data, header, offset)
+        if int(indices.max(initial=0)) >= len(palette):
+            raise ValueError("调色板索引越界")
+        return palette[indices]  # 花式索引直接生成连续的 BGR 数组
+
+    if header.bit_count == 24:
+        return np.ascontiguousarray(_pixel_view(data, header, offset, np.uint8, 3))
+    if header.bit_count == 32:
+        if header.masks is None:
+            # BI_RGB: 内存顺序为 B G R X
+            return np.ascontiguousarray(_pixel_view(data, header, offset, np.uint8, 4)[..., :3])
+        return _decode_bitfields(data, header, offset, header.masks)
+    if header.bit_count == 16:
+        return _decode_bitfields(data, header, offset, header.masks or _DEFAULT_MASKS_16)
+    raise ValueError(f"不支持的位深: {header.bit_count}")
@@ -3,113 +3,210 @@
 自动从网络下载剑网三所有心法图标
 数据来源: https://github.com/JX3BOX/jx3box-data
 图标CDN: https://icon.jx3box.com/icon/{id}.png
+
+按图标清单（src/manifest.py）增量同步：并发下载（连接复用 + 令牌桶限速 + 抖动退避重试），
+已有图标通过 ETag / Last-Modified 条件请求刷新，只下载、校验有变化的图标
 """
-import urllib.request
-from pathlib import Path
+import random
+import threading
 import time
-import json
-import urllib.parse
-
-# 剑网三全部心法列表（IconID -> 中文名）
-# 数据来源: https://github.com/JX3BOX/jx3box-data/blob/master/data/xf/xf.json
-# 仅保留正式服(std)心法，排除通用和怀旧服专属
-JIX3_MANTRAS = {
-    10026: "傲血战意",
-    10062: "铁牢律",
-    10021: "花间游",
-    10028: "离经易道",
-    10014: "紫霞功",
-    10015: "太虚剑意",
-    10081: "冰心诀",
-    10080: "云裳心经",
-    10003: "易筋经",
-    10002: "洗髓经",
-    10144: "问水诀",
-    10145: "山居剑意",
-    10268: "笑尘诀",
-    10242: "焚影圣诀",
-    10243: "明尊琉璃体",
-    10175: "毒经",
-    10176: "补天诀",
-    10224: "惊羽诀",
-    10225: "天罗诡道",
-    10389: "铁骨衣",
-    10390: "分山劲",
-    10447: "莫问",
-    10448: "相知",
-    10464: "北傲诀",
-    10533: "凌海诀",
-    10585: "隐龙诀",
-    10615: "太玄经",
-    10626: "灵素",
-    10627: "无方",
-    10698: "孤锋诀",
-    10756: "山海心诀",
-    10786: "周天功",
-    10821: "幽罗引",
-}
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Optional
+
+import cv2
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+from .manifest import Manifest, content_hash
 
 # 图标CDN地址
 ICON_CDN = "https://icon.jx3box.com/icon"
 
+# 同步结果状态
+SYNC_UNCHANGED = "unchanged"
+SYNC_UPDATED = "updated"
+SYNC_FAILED = "failed"
+
+
+class TokenBucket:
+    """令牌桶限速：平均每秒 rate 个请求，允许 capacity 个突发"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取一个令牌，不足时等待"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
 
 class IconFetcher:
-    def __init__(self, assets_dir: Path):
+    def __init__(self, assets_dir: Path, max_workers: int = 4, rate: float = 10.0,
+                 retries: int = 3, backoff: float = 0.5, timeout: float = 10,
+                 base_url: str = ICON_CDN, catalogue: Optional[list[tuple[int, str, str]]] = None):
+        """
+        Args:
+            assets_dir: 图标保存目录
+            max_workers: 同时进行的下载数
+            rate: 每秒最多发起的请求数（令牌桶）
+            retries: 失败后的重试次数
+            backoff: 重试退避的基准秒数（指数增长并带随机抖动）
+            timeout: 单次请求超时（秒）
+            base_url: 图标地址前缀，测试时可指向本地服务
+            catalogue: 图标列表 (图标ID, 英文名, 中文名)，默认为正式服心法
+        """
         self.assets_dir = Path(assets_dir)
         self.assets_dir.mkdir(parents=True, exist_ok=True)
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
         }
+        self.max_workers = max(1, max_workers)
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.base_url = base_url.rstrip("/")
+        self.bucket = TokenBucket(rate)
+
+        # 共享会话，连接池大小与并发数一致，复用 keep-alive 连接
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.manifest = Manifest(self.assets_dir, catalogue)
+        self._manifest_lock = threading.Lock()
 
-    def download_all(self, progress_callback=None) -> dict[str, bool]:
+    def sync(self, progress_callback: Optional[Callable[[int, int, str], None]] = None,
+             refresh: bool = False) -> dict[str, str]:
         """
-        下载所有心法图标
-        返回：{心法名: 是否成功}
+        按清单增量同步图标
+        - 缺失、被改动或从未下载的图标：直接下载
+        - 本地有效的图标：refresh 为 True 时发送条件请求，服务器有更新才下载
+        下载内容需能解码为图片才会写入，写入后更新清单中的哈希
+
+        返回：{英文名: "unchanged" / "updated" / "failed"}
         """
+        self.manifest.adopt_local_files()
+        stale = set(self.manifest.stale_entries())
         results = {}
-        items = list(JIX3_MANTRAS.items())
-        
-        for i, (icon_id, cname) in enumerate(items):
-            local_path = self.assets_dir / f"{cname}.png"
-            
-            if local_path.exists() and local_path.stat().st_size > 100:
-                results[cname] = True
+        total = len(self.manifest.entries)
+        done = 0
+        pending = []
+
+        for ename in self.manifest.entries:
+            if ename in stale or refresh:
+                pending.append(ename)
+            else:
+                results[ename] = SYNC_UNCHANGED
+                done += 1
                 if progress_callback:
-                    progress_callback(i + 1, len(items), cname)
-                continue
-            
-            success = self._download_single(icon_id, cname)
-            results[cname] = success
-            
-            if progress_callback:
-                progress_callback(i + 1, len(items), cname)
-            
-            time.sleep(0.2)  # 避免请求过快
-        
-        return results
+                    progress_callback(done, total, ename)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="fetcher") as pool:
+            futures = {pool.submit(self._download_single, ename, ename not in stale): ename
+                       for ename in pending}
+            for future in as_completed(futures):
+                ename = futures[future]
+                results[ename] = future.result()
+                done += 1
+                if progress_callback:
+                    progress_callback(done, total, ename)
 
-    def _download_single(self, icon_id: int, cname: str) -> bool:
-        """从 icon.jx3box.com 下载单个图标"""
-        local_path = self.assets_dir / f"{cname}.png"
-        url = f"{ICON_CDN}/{icon_id}.png"
-        
         try:
-            req = urllib.request.Request(url, headers=self.headers)
-            with urllib.request.urlopen(req, timeout=10) as resp:
-                data = resp.read()
-                if len(data) > 100:
-                    local_path.write_bytes(data)
-                    return True
-        except Exception:
+            self.manifest.save()
+        except OSError:
             pass
-        return False
+        return results
+
+    def download_all(self, progress_callback=None, refresh: bool = False) -> dict[str, bool]:
+        """
+        下载所有心法图标（见 sync）
+        返回：{英文名: 是否成功}
+        """
+        results = self.sync(progress_callback, refresh)
+        return {ename: status != SYNC_FAILED for ename, status in results.items()}
+
+    def _download_single(self, ename: str, conditional: bool) -> str:
+        """
+        下载单个图标，网络错误、429 和 5xx 时带抖动退避重试
+        conditional 为 True 时带上清单中的 ETag / Last-Modified，未变化（304）时不传输内容
+        """
+        entry = self.manifest.entries[ename]
+        local_path = self.manifest.icon_path(ename)
+        url = f"{self.base_url}/{entry['id']}.png"
+
+        headers = {}
+        if conditional:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.backoff * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5))
+            self.bucket.acquire()
+            try:
+                resp = self.session.get(url, headers=headers, timeout=self.timeout)
+            except requests.RequestException:
+                continue
+
+            if resp.status_code == 304:
+                return SYNC_UNCHANGED
+            if resp.status_code == 429 or resp.status_code >= 500:
+                continue
+            if resp.status_code != 200 or not self._verify(resp.content):
+                return SYNC_FAILED
+
+            unchanged = conditional and local_path.exists() and \
+                entry["sha1"] == content_hash(resp.content)
+            with self._manifest_lock:
+                self.manifest.record(ename, resp.content, resp.headers.get("ETag"),
+                                     resp.headers.get("Last-Modified"))
+            if unchanged:
+                # 服务器不支持条件请求但内容相同，不改动本地文件
+                return SYNC_UNCHANGED
+
+            tmp_path = local_path.with_name(local_path.name + ".tmp")
+            tmp_path.write_bytes(resp.content)
+            tmp_path.replace(local_path)
+            return SYNC_UPDATED
+        return SYNC_FAILED
+
+    @staticmethod
+    def _verify(data: bytes) -> bool:
+        """校验下载内容是可解码的图片"""
+        if len(data) <= 100:
+            return False
+        img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+        return img is not None
 
     def get_local_count(self) -> int:
-        """返回本地已有图标数量"""
-        return len(list(self.assets_dir.glob("*.png")))
+        """返回本地已就绪的图标数量"""
+        return len(self.manifest.entries) - len(self.manifest.stale_entries())
 
     def is_complete(self) -> bool:
-        """检查是否已下载所有图标"""
-        count = self.get_local_count()
-        # 允许少量误差（可能有重名或缺失）
-        return count >= len(JIX3_MANTRAS) * 0.9
+        """检查清单中的图标是否已下载且内容完整"""
+        if self.manifest.adopt_local_files():
+            try:
+                self.manifest.save()
+            except OSError:
+                pass
+        total = len(self.manifest.entries)
+        # 允许少量缺失（CDN 上个别图标可能暂时不可用）
+        return total - len(self.manifest.stale_entries()) >= total * 0.9
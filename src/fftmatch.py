@@ -0,0 +1,165 @@
+"""
+频域模板匹配模块
+截图只做一次 FFT，所有模板（含各缩放级别）的频谱批量与之相乘，
+计算与 cv2.TM_CCOEFF_NORMED 等价的归一化互相关
+模板频谱随截图尺寸增长（每个模板每个通道 高×(宽/2+1) 个复数），只在全部频谱能放进缓存的截图上使用，
+更大的截图由调用方改用 matchTemplate
+"""
+from collections import OrderedDict
+from typing import Optional
+
+import cv2
+import numpy as np
+
+# 频谱统一以 complex64 保存（numpy 1.x 的 rfft2 返回 complex128，numpy 2.x 对 float32 输入返回 complex64）
+_COMPLEX_BYTES = np.dtype(np.complex64).itemsize
+# rfft2 / irfft2 中间结果的实际字节数，估算每批内存时使用
+_NATIVE_COMPLEX_BYTES = np.fft.rfft2(np.zeros((2, 2), np.float32)).itemsize
+_NATIVE_REAL_BYTES = np.fft.irfft2(np.zeros((2, 2), np.complex64)).itemsize
+
+
+def _as_channels(img: np.ndarray) -> np.ndarray:
+    """转为 (通道, 高, 宽) 的 float32 数组"""
+    arr = img.astype(np.float32)
+    if arr.ndim == 2:
+        return arr[None]
+    return np.moveaxis(arr, -1, 0)
+
+
+def _window_energy(shot: np.ndarray, th: int, tw: int) -> np.ndarray:
+    """
+    计算每个窗口（th×tw）去均值后的能量 Σ(I - mean)²，各通道求和
+    利用积分图，复杂度与窗口大小无关
+    """
+    n = th * tw
+    energy = None
+    for channel in shot:
+        s1, s2 = cv2.integral2(channel.astype(np.float64), sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+        win1 = s1[th:, tw:] - s1[:-th, tw:] - s1[th:, :-tw] + s1[:-th, :-tw]
+        win2 = s2[th:, tw:] - s2[:-th, tw:] - s2[th:, :-tw] + s2[:-th, :-tw]
+        e = win2 - win1 * win1 / n
+        energy = e if energy is None else energy + e
+    return np.maximum(energy, 0)
+
+
+class FFTCorrelator:
+    """
+    批量频域互相关
+    模板频谱按 FFT 尺寸缓存，同尺寸截图重复识别时直接复用；
+    全部频谱超出 cache_bytes 的截图不做频域匹配（见 fits），每批的工作内存不超过 batch_bytes
+    """
+
+    def __init__(self, templates: list[np.ndarray], batch_bytes: int = 64 * 1024 * 1024,
+                 cache_bytes: int = 256 * 1024 * 1024):
+        """
+        Args:
+            templates: 所有待匹配的模板图像（不同大小、不同缩放级别平铺在一起）
+            batch_bytes: 每批相乘/逆变换的工作内存上限，每批至少一个模板
+            cache_bytes: 模板频谱缓存的内存上限
+        """
+        self.batch_bytes = batch_bytes
+        self.cache_bytes = cache_bytes
+        self.shapes = [t.shape[:2] for t in templates]
+        self.channels = [1 if t.ndim == 2 else t.shape[2] for t in templates]
+
+        # 预先去均值，并记录模板能量 Σ(T - mean)²
+        self._zero_mean: list[np.ndarray] = []
+        self._norms: list[float] = []
+        for t in templates:
+            arr = _as_channels(t)
+            arr = arr - arr.mean(axis=(1, 2), keepdims=True)
+            self._zero_mean.append(arr)
+            self._norms.append(float(np.sqrt(np.sum(arr.astype(np.float64) ** 2))))
+
+        # FFT 尺寸 -> 各模板频谱，总字节数超出 cache_bytes 时淘汰最久未用的尺寸
+        self._spectra: OrderedDict[tuple[int, int], list[np.ndarray]] = OrderedDict()
+
+    def _fft_shape(self, h: int, w: int) -> tuple[int, int]:
+        """FFT 尺寸：不小于截图的最优 DFT 长度（先对齐到 32，便于不同截图复用缓存）"""
+        return (cv2.getOptimalDFTSize((h + 31) // 32 * 32),
+                cv2.getOptimalDFTSize((w + 31) // 32 * 32))
+
+    def _template_spectrum(self, i: int, fft_shape: tuple[int, int]) -> np.ndarray:
+        return np.fft.rfft2(self._zero_mean[i], s=fft_shape).astype(np.complex64, copy=False)
+
+    def spectra_bytes(self, h: int, w: int) -> int:
+        """h×w 截图所需的全部模板频谱字节数"""
+        fh, fw = self._fft_shape(h, w)
+        return sum(self.channels) * fh * (fw // 2 + 1) * _COMPLEX_BYTES
+
+    def fits(self, h: int, w: int) -> bool:
+        """h×w 截图的模板频谱能否放进缓存；放不下时频域匹配既不省时也不省内存，应改用 matchTemplate"""
+        return self.spectra_bytes(h, w) <= self.cache_bytes
+
+    def _batch_size(self, fft_shape: tuple[int, int]) -> int:
+        """
+        按工作内存上限计算每批模板数，每个模板占用：
+        各通道乘积之和（complex64）、逆变换内部的复数副本和逆变换输出（均为 numpy 实际使用的 dtype）
+        """
+        bins = fft_shape[0] * (fft_shape[1] // 2 + 1)
+        per_template = (bins * (_COMPLEX_BYTES + _NATIVE_COMPLEX_BYTES)
+                        + fft_shape[0] * fft_shape[1] * _NATIVE_REAL_BYTES)
+        return max(1, self.batch_bytes // per_template)
+
+    def _spectra_for(self, fft_shape: tuple[int, int]) -> list[np.ndarray]:
+        """取出（必要时计算并缓存）该 FFT 尺寸下的全部模板频谱"""
+        if fft_shape in self._spectra:
+            self._spectra.move_to_end(fft_shape)
+            return self._spectra[fft_shape]
+
+        spectra = [self._template_spectrum(i, fft_shape) for i in range(len(self.shapes))]
+        self._spectra[fft_shape] = spectra
+        while len(self._spectra) > 1 and self._cached_bytes() > self.cache_bytes:
+            self._spectra.popitem(last=False)
+        return spectra
+
+    def _cached_bytes(self) -> int:
+        return sum(s.nbytes for spectra in self._spectra.values() for s in spectra)
+
+    def max_scores(self, screenshot: np.ndarray,
+                   indices: list[int]) -> dict[int, Optional[tuple[float, tuple[int, int]]]]:
+        """
+        计算指定模板在截图上的最高归一化相关系数及其位置 (分数, (x, y))
+        模板比截图大或通道数不符时，对应值为 None；截图必须满足 fits，否则抛出 ValueError
+        """
+        shot = _as_channels(screenshot)
+        c, h, w = shot.shape
+        if not self.fits(h, w):
+            raise ValueError(f"{w}x{h} 的截图所需模板频谱超出缓存上限，应改用 matchTemplate")
+        fft_shape = self._fft_shape(h, w)
+        # 截图频谱只算一次，供所有模板、所有缩放级别使用
+        shot_spec = np.fft.rfft2(shot, s=fft_shape).astype(np.complex64, copy=False)
+        cached = self._spectra_for(fft_shape)
+
+        scores: dict[int, Optional[tuple[float, tuple[int, int]]]] = {}
+        valid = []
+        for i in indices:
+            th, tw = self.shapes[i]
+            if th > h or tw > w or self.channels[i] != c:
+                scores[i] = None
+            else:
+                valid.append(i)
+
+        energies: dict[tuple[int, int], np.ndarray] = {}
+        batch_size = self._batch_size(fft_shape)
+        for start in range(0, len(valid), batch_size):
+            batch = valid[start:start + batch_size]
+            # 各通道的互相关在频域相加后只需一次逆变换；逐通道累加，不堆叠整批频谱
+            product = np.empty((len(batch),) + shot_spec.shape[1:], np.complex64)
+            for j, i in enumerate(batch):
+                np.multiply(shot_spec[0], np.conj(cached[i][0]), out=product[j])
+                for k in range(1, c):
+                    product[j] += shot_spec[k] * np.conj(cached[i][k])
+            cross = np.fft.irfft2(product, s=fft_shape)
+
+            for j, i in enumerate(batch):
+                th, tw = self.shapes[i]
+                numerator = cross[j, :h - th + 1, :w - tw + 1]
+                if (th, tw) not in energies:
+                    energies[(th, tw)] = _window_energy(shot, th, tw)
+                denom = np.sqrt(energies[(th, tw)]) * self._norms[i]
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    res = np.where(denom > 1e-6, numerator / denom, 0.0)
+                y, x = np.unravel_index(int(res.argmax()), res.shape)
+                scores[i] = float(np.clip(res[y, x], -1.0, 1.0)), (int(x), int(y))
+        return scores
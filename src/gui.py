@@ -1,22 +1,38 @@
 """
 图形界面模块
 使用 Tkinter 构建简单易用的界面
+OpenCV / PIL / 匹配器在首次使用时才导入，窗口可以先于图标库加载显示出来
 """
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 from pathlib import Path
-from PIL import Image, ImageTk
-import cv2
-import numpy as np
-from typing import Optional
+import queue
+import time
+from typing import TYPE_CHECKING, Callable, Optional
 
-from .matcher import IconMatcher
+from .metrics import metrics
+
+if TYPE_CHECKING:
+    import numpy as np
+    from .matcher import IconMatcher
+    from .worker import RecognitionResult, RecognitionWorker
+
+# 界面线程检查新截图和识别结果的间隔（毫秒）
+POLL_INTERVAL_MS = 30
 
 
 class JX3DetectorGUI:
-    def __init__(self, assets_dir: Path):
+    def __init__(self, assets_dir: Path, matcher: Optional["IconMatcher"] = None, best_only: bool = False):
+        """
+        Args:
+            assets_dir: 图标目录
+            matcher: 共享的匹配器；为 None 时窗口先显示，之后由其他线程调用 attach_matcher() 注入
+            best_only: 只显示最匹配的一个门派，识别改用提前结束的 match_best
+        """
         self.assets_dir = Path(assets_dir)
-        self.matcher = IconMatcher(assets_dir)
+        self.best_only = best_only
+        self.matcher: Optional["IconMatcher"] = None
+        self.worker: Optional["RecognitionWorker"] = None
         
         self.root = tk.Tk()
         self.root.title("剑网三门派识别工具")
@@ -24,8 +40,19 @@ class JX3DetectorGUI:
         self.root.resizable(False, False)
         
         self._setup_ui()
-        self.current_screenshot: Optional[np.ndarray] = None
+        self.current_screenshot: Optional["np.ndarray"] = None
         self.result_labels: list = []
+        
+        # 其他线程（快捷键）送来的截图，由界面线程取出，Tk 只在界面线程中操作
+        self._inbox: queue.Queue["np.ndarray"] = queue.Queue()
+        # 其他线程请求在界面线程中执行的调用
+        self._calls: queue.Queue[tuple[Callable, tuple]] = queue.Queue()
+        self._recognize_started = 0.0
+        self._recognize_when_ready = False
+        self._closed = False
+        if matcher is not None:
+            self._attach(matcher)
+        self.root.after(POLL_INTERVAL_MS, self._poll)
 
     def _setup_ui(self):
         """构建界面"""
@@ -103,20 +130,85 @@ class JX3DetectorGUI:
         self.status_label.pack(fill="x", padx=20, pady=(0, 5))
         
         self.info_label = tk.Label(
-            self.root, text=f"已加载 {self.matcher.template_cache.__len__()} 个门派图标",
+            self.root, text="正在加载门派图标...",
             font=("微软雅黑", 9), bd=1, anchor="w"
         )
         self.info_label.pack(fill="x", padx=20, pady=(0, 10))
 
-    def set_screenshot(self, img_array: np.ndarray):
-        """设置截图并显示"""
+    def call_in_ui(self, fn: Callable, *args):
+        """请求在界面线程中执行 fn(*args)，可在任意线程调用"""
+        self._calls.put((fn, args))
+
+    def attach_matcher(self, matcher: "IconMatcher"):
+        """注入加载完成的匹配器，可在任意线程调用"""
+        self.call_in_ui(self._attach, matcher)
+
+    def set_status(self, text: str):
+        """更新状态栏，可在任意线程调用"""
+        self.call_in_ui(lambda: self.status_label.configure(text=text))
+
+    def _attach(self, matcher: "IconMatcher"):
+        from .worker import RecognitionWorker
+        
+        self.matcher = matcher
+        self.worker = RecognitionWorker(matcher, threshold=0.5, best_only=self.best_only)
+        self.worker.start()
+        self.info_label.configure(text=f"已加载 {len(matcher.template_cache)} 个门派图标")
+        if self._recognize_when_ready and self.current_screenshot is not None:
+            self.do_recognize()
+        else:
+            self.status_label.configure(text="状态: 就绪  |  按 F9 监听剪贴板截图")
+
+    def submit_screenshot(self, img_array: "np.ndarray"):
+        """提交截图并自动识别，可在任意线程调用"""
+        self._inbox.put(img_array)
+
+    def _poll(self):
+        """
+        界面线程定时执行其他线程的请求，取出最新截图和识别结果
+        单次处理出错只在状态栏提示，下一次轮询照常进行，快捷键和结果显示不会因此失效
+        """
+        try:
+            while True:
+                try:
+                    fn, args = self._calls.get_nowait()
+                except queue.Empty:
+                    break
+                fn(*args)
+            if self._closed:
+                return
+            
+            latest = None
+            while True:
+                try:
+                    latest = self._inbox.get_nowait()  # 连续按键时只处理最新一张
+                except queue.Empty:
+                    break
+            if latest is not None:
+                self.set_screenshot(latest)
+                self.do_recognize()
+            
+            result = self.worker.poll() if self.worker is not None else None
+            if result is not None:
+                self._on_result(result)
+        except Exception as e:
+            self.status_label.configure(text=f"状态: 处理出错: {e}")
+        finally:
+            if not self._closed:
+                self.root.after(POLL_INTERVAL_MS, self._poll)
+
+    def set_screenshot(self, img_array: "np.ndarray"):
+        """设置截图并显示（仅在界面线程调用）"""
+        import cv2
+        from PIL import Image, ImageTk
+        
         self.current_screenshot = img_array
         
         # 转换并缩放显示
         display = cv2.cvtColor(img_array, cv2.COLOR_BGR2RGB)
         h, w = display.shape[:2]
         scale = min(220/w, 280/h)
-        display = cv2.resize(display, (int(w*scale), int(h*scale)))
+        display = cv2.resize(display, (max(1, int(w*scale)), max(1, int(h*scale))))
         
         img_pil = Image.fromarray(display)
         img_tk = ImageTk.PhotoImage(img_pil)
@@ -132,35 +224,55 @@ class JX3DetectorGUI:
             filetypes=[("图片文件", "*.png;*.jpg;*.jpeg;*.bmp"), ("所有文件", "*.*")]
         )
         if path:
+            import cv2
+            
             img = cv2.imread(path)
             if img is not None:
-                self.set_screenshot(img)
+                self.submit_screenshot(img)
             else:
                 messagebox.showerror("错误", "无法读取图片文件")
 
     def do_recognize(self):
-        """执行识别"""
+        """提交当前截图到后台识别，正在进行的旧识别会被取消"""
         if self.current_screenshot is None:
             messagebox.showwarning("提示", "请先加载图片")
             return
         
+        self._recognize_started = time.perf_counter()
+        if self.worker is None:
+            # 图标库仍在加载，加载完成后自动识别
+            self._recognize_when_ready = True
+            self.status_label.configure(text="状态: 图标库加载中，加载完成后自动识别...")
+            return
+        self._recognize_when_ready = False
+        self.worker.submit(self.current_screenshot)
         self.status_label.configure(text="状态: 识别中...")
-        self.root.update()
-        
-        try:
-            results = self.matcher.match(self.current_screenshot, threshold=0.5)
-            self.display_results(results)
-            
-            if results:
-                self.status_label.configure(text=f"状态: 识别完成，匹配到 {len(results)} 个可能结果")
-            else:
-                self.status_label.configure(text="状态: 未匹配到任何门派")
-        except Exception as e:
-            messagebox.showerror("识别错误", str(e))
+
+    def _on_result(self, result: "RecognitionResult"):
+        """在界面线程中显示后台识别的结果"""
+        if result.error is not None:
+            messagebox.showerror("识别错误", result.error)
             self.status_label.configure(text="状态: 识别失败")
+            return
+        
+        render_started = time.perf_counter()
+        self.display_results(result.results)
+        render_ms = (time.perf_counter() - render_started) * 1000
+        total_ms = (time.perf_counter() - self._recognize_started) * 1000
+        elapsed = (f"耗时 {total_ms:.0f} ms（排队 {result.queue_ms:.0f} ms，"
+                   f"匹配 {result.match_ms:.0f} ms，显示 {render_ms:.0f} ms）")
+        
+        if result.results:
+            self.status_label.configure(text=f"状态: 识别完成，匹配到 {len(result.results)} 个可能结果  |  {elapsed}")
+        else:
+            self.status_label.configure(text=f"状态: 未匹配到任何门派  |  {elapsed}")
 
     def display_results(self, results: list[tuple[str, float]]):
         """显示识别结果"""
+        with metrics.span("gui.render", results=len(results)):
+            self._render_results(results)
+
+    def _render_results(self, results: list[tuple[str, float]]):
         # 清除旧结果
         for widget in self.result_inner.winfo_children():
             widget.destroy()
@@ -203,6 +315,9 @@ class JX3DetectorGUI:
 
     def clear(self):
         """清除内容"""
+        self._recognize_when_ready = False
+        if self.worker is not None:
+            self.worker.cancel()
         self.current_screenshot = None
         self.img_label.configure(image="", text="未加载图片\n\n请按 F9 截图\n或点击下方按钮选择")
         self.img_label.image = None
@@ -210,6 +325,13 @@ class JX3DetectorGUI:
             widget.destroy()
         self.status_label.configure(text="状态: 就绪  |  按 F9 监听剪贴板截图")
 
+    def close(self):
+        """停止后台识别并关闭窗口"""
+        self._closed = True
+        if self.worker is not None:
+            self.worker.stop()
+        self.root.destroy()
+
     def run(self):
         """启动界面主循环"""
         self.root.mainloop()
@@ -1,75 +1,49 @@
 """
 全局快捷键监听模块
 使用 pynput 监听全局键盘事件，检测 F9 按键后自动获取剪贴板图片
+pynput / pywin32 / NumPy 在启动监听和读取剪贴板时才导入，不拖慢程序启动
 """
-import io
 import threading
-from pynput import keyboard
-from PIL import Image
-import numpy as np
-import cv2
-import win32clipboard
-from typing import Callable, Optional
+from typing import TYPE_CHECKING, Any, Callable, Optional
+
+from .metrics import metrics
+
+if TYPE_CHECKING:
+    import numpy as np
 
 
 class HotkeyListener:
-    def __init__(self, hotkey: int = keyboard.Key.f9, callback: Optional[Callable[[np.ndarray], None]] = None):
+    def __init__(self, hotkey: Any = None, callback: Optional[Callable[["np.ndarray"], None]] = None):
+        """
+        Args:
+            hotkey: pynput 按键，默认为 F9
+            callback: 读取到剪贴板图片后的回调（在后台线程中调用）
+        """
         self.hotkey = hotkey
         self.callback = callback
         self.running = False
-        self.listener: Optional[keyboard.Listener] = None
+        self.listener = None
         
         # 用于线程安全
         self._lock = threading.Lock()
+        # 正在读取剪贴板时再次按键直接忽略，避免连续按键堆积线程
+        self._busy = threading.Lock()
 
-    def _get_clipboard_image(self) -> Optional[np.ndarray]:
+    def _get_clipboard_image(self) -> Optional["np.ndarray"]:
         """从剪贴板获取图片"""
+        import win32clipboard
+        from .dib import decode_dib
+        
         try:
-            win32clipboard.OpenClipboard()
-            
-            # 尝试获取 PNG 格式
-            if win32clipboard.IsClipboardFormatAvailable(win32clipboard.CF_DIB):
-                data = win32clipboard.GetClipboardData(win32clipboard.CF_DIB)
+            with metrics.span("clipboard.read"):
+                win32clipboard.OpenClipboard()
+                data = None
+                # CF_DIB 不可用时尝试 CF_DIBV5（带颜色掩码的格式）
+                for fmt in (win32clipboard.CF_DIB, win32clipboard.CF_DIBV5):
+                    if win32clipboard.IsClipboardFormatAvailable(fmt):
+                        data = win32clipboard.GetClipboardData(fmt)
+                        break
                 win32clipboard.CloseClipboard()
-                
-                # 解析 BMP DIB 数据 (DIB格式没有文件头)
-                # DIB: [BITMAPINFOHEADER] + [pixel array]
-                # 前40字节是BITMAPINFOHEADER
-                import struct
-                
-                bih = data[:40]
-                biSize, biWidth, biHeight, biPlanes, biBitCount = struct.unpack('<IiiHH', bih[0:20])
-                
-                # 处理BMP行序（倒序）和颜色通道
-                # 通常 biHeight > 0 表示从上到下，< 0 表示从下到上
-                rows = abs(biHeight)
-                cols = biWidth
-                
-                if biBitCount == 32:
-                    # BGRA 格式
-                    pixel_data = data[40:]
-                    img = np.frombuffer(pixel_data, dtype=np.uint8)
-                    img = img.reshape((rows, cols, 4))
-                    # 转为 BGR 并处理行序
-                    if biHeight > 0:
-                        img = img[::-1]
-                    img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
-                    return img
-                elif biBitCount == 24:
-                    # BGR 格式
-                    row_size = (cols * 3 + 3) & ~3
-                    pixel_data = data[40:]
-                    img = np.frombuffer(pixel_data, dtype=np.uint8)
-                    img = img.reshape((rows, row_size))[:, :cols*3]
-                    img = img.reshape((rows, cols, 3))
-                    if biHeight > 0:
-                        img = img[::-1]
-                    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-                    return cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
-            
-            win32clipboard.CloseClipboard()
-            return None
-            
         except Exception:
             try:
                 win32clipboard.CloseClipboard()
@@ -77,17 +51,30 @@ class HotkeyListener:
                 pass
             return None
 
+        if data is None:
+            return None
+        try:
+            with metrics.span("clipboard.decode", bytes=len(data)):
+                return decode_dib(data)
+        except ValueError as e:
+            print(f"剪贴板图片解析失败: {e}")
+            return None
+
     def _on_press(self, key):
         """按键回调"""
         if key == self.hotkey:
             with self._lock:
-                if self.running and self.callback:
+                if self.running and self.callback and self._busy.acquire(blocking=False):
                     # 在新线程中处理，避免阻塞监听线程
                     threading.Thread(target=self._process_clipboard, daemon=True).start()
 
     def _process_clipboard(self):
         """处理剪贴板图片"""
-        img_array = self._get_clipboard_image()
+        try:
+            with metrics.trace("clipboard"):
+                img_array = self._get_clipboard_image()
+        finally:
+            self._busy.release()
         if img_array is not None and self.callback:
             try:
                 self.callback(img_array)
@@ -100,6 +87,10 @@ class HotkeyListener:
         """启动监听"""
         with self._lock:
             if not self.running:
+                from pynput import keyboard
+                
+                if self.hotkey is None:
+                    self.hotkey = keyboard.Key.f9
                 self.running = True
                 self.listener = keyboard.Listener(on_press=self._on_press)
                 self.listener.daemon = True
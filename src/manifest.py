@@ -0,0 +1,164 @@
+"""
+图标清单模块
+全部心法图标的唯一来源：图标ID、英文名（文件名）、中文名，
+以及本地文件的内容哈希和 ETag / Last-Modified，用于增量同步
+"""
+import hashlib
+import json
+from pathlib import Path
+from typing import Optional
+
+MANIFEST_FILENAME = "manifest.json"
+
+# 剑网三全部心法列表 (IconID, 英文名, 中文名)
+# 数据来源: https://github.com/JX3BOX/jx3box-data/blob/master/data/xf/xf.json
+# 仅保留正式服(std)心法，排除通用和怀旧服专属
+ICON_CATALOGUE = [
+    (10026, "aoxue", "傲血战意"),
+    (10062, "tielao", "铁牢律"),
+    (10021, "huajian", "花间游"),
+    (10028, "lijing", "离经易道"),
+    (10014, "zixia", "紫霞功"),
+    (10015, "taixu", "太虚剑意"),
+    (10081, "bingxin", "冰心诀"),
+    (10080, "yunshang", "云裳心经"),
+    (10003, "yijin", "易筋经"),
+    (10002, "xisui", "洗髓经"),
+    (10144, "wenshui", "问水诀"),
+    (10145, "shanju", "山居剑意"),
+    (10268, "xiaochen", "笑尘诀"),
+    (10242, "fenying", "焚影圣诀"),
+    (10243, "mingzun", "明尊琉璃体"),
+    (10175, "dujing", "毒经"),
+    (10176, "butian", "补天诀"),
+    (10224, "jingyu", "惊羽诀"),
+    (10225, "tianluo", "天罗诡道"),
+    (10389, "tiegu", "铁骨衣"),
+    (10390, "fenshan", "分山劲"),
+    (10447, "mowen", "莫问"),
+    (10448, "xiangzhi", "相知"),
+    (10464, "beiao", "北傲诀"),
+    (10533, "linghai", "凌海诀"),
+    (10585, "yinlong", "隐龙诀"),
+    (10615, "taixuan", "太玄经"),
+    (10626, "lingsu", "灵素"),
+    (10627, "wufang", "无方"),
+    (10698, "gufeng", "孤锋诀"),
+    (10756, "shanhai", "山海心诀"),
+    (10786, "zhoutian", "周天功"),
+    (10821, "youluo", "幽罗引"),
+]
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+class Manifest:
+    """
+    本地图标清单（assets/manifest.json）
+    每个条目: {"id", "ename", "cname", "sha1", "etag", "last_modified"}
+    """
+
+    def __init__(self, assets_dir: Path, catalogue: Optional[list[tuple[int, str, str]]] = None):
+        self.assets_dir = Path(assets_dir)
+        self.path = self.assets_dir / MANIFEST_FILENAME
+        self.catalogue = catalogue if catalogue is not None else ICON_CATALOGUE
+        self.entries: dict[str, dict] = {}
+        self.load()
+
+    def load(self):
+        """读取本地清单，并与图标列表对齐（新增的图标补空条目，已移除的丢弃）"""
+        stored = {}
+        if self.path.exists():
+            try:
+                stored = json.loads(self.path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                stored = {}
+
+        self.entries = {}
+        for icon_id, ename, cname in self.catalogue:
+            entry = stored.get(ename, {})
+            if entry.get("id") != icon_id:
+                entry = {}  # 图标ID变化，原有哈希和缓存信息作废
+            self.entries[ename] = {
+                "id": icon_id, "ename": ename, "cname": cname,
+                "sha1": entry.get("sha1"),
+                "etag": entry.get("etag"),
+                "last_modified": entry.get("last_modified"),
+            }
+
+    def save(self):
+        """
+        写入清单，并把已就绪图标的名称合并进 name_map.json 供匹配器使用
+        name_map.json 中的其他条目（手工添加或修改的名称）原样保留，已损坏无法解析的文件重新生成；
+        内容未变化时两个文件都不改动，避免触发模板重新加载
+        """
+        text = json.dumps(self.entries, ensure_ascii=False, indent=2)
+        try:
+            unchanged = self.path.read_text(encoding="utf-8") == text
+        except OSError:
+            unchanged = False
+        if not unchanged:
+            tmp_path = self.path.with_name(self.path.name + ".tmp")
+            tmp_path.write_text(text, encoding="utf-8")
+            tmp_path.replace(self.path)
+
+        map_path = self.assets_dir / "name_map.json"
+        try:
+            current = json.loads(map_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            current = None
+        name_map = {**(current if isinstance(current, dict) else {}), **self.name_map()}
+        if name_map != (current if current is not None else {}):
+            tmp_path = map_path.with_name(map_path.name + ".tmp")
+            tmp_path.write_text(json.dumps(name_map, ensure_ascii=False, indent=2), encoding="utf-8")
+            tmp_path.replace(map_path)
+
+    def icon_path(self, ename: str) -> Path:
+        return self.assets_dir / f"{ename}.png"
+
+    def is_valid(self, ename: str) -> bool:
+        """本地文件存在且内容与清单记录的哈希一致"""
+        entry = self.entries[ename]
+        path = self.icon_path(ename)
+        if not entry["sha1"] or not path.exists():
+            return False
+        return content_hash(path.read_bytes()) == entry["sha1"]
+
+    def stale_entries(self) -> list[str]:
+        """缺失、被改动或从未下载过的图标"""
+        return [ename for ename in self.entries if not self.is_valid(ename)]
+
+    def record(self, ename: str, data: bytes, etag: Optional[str], last_modified: Optional[str]):
+        """记录新下载图标的哈希与缓存校验信息"""
+        entry = self.entries[ename]
+        entry["sha1"] = content_hash(data)
+        entry["etag"] = etag
+        entry["last_modified"] = last_modified
+
+    def name_map(self) -> dict[str, str]:
+        """已就绪图标的 英文名 -> 中文名 映射"""
+        return {ename: e["cname"] for ename, e in self.entries.items()
+                if e["sha1"] and self.icon_path(ename).exists()}
+
+    def adopt_local_files(self) -> list[str]:
+        """
+        接管清单建立之前下载的图标：
+        旧版下载器以中文名保存，改名为英文名，避免同一图标被加载两次；
+        没有哈希记录的现有文件，以当前内容作为哈希
+        返回被接管的英文名列表
+        """
+        adopted = []
+        for ename, entry in self.entries.items():
+            legacy = self.assets_dir / f"{entry['cname']}.png"
+            target = self.icon_path(ename)
+            if legacy.exists():
+                if target.exists():
+                    legacy.unlink()
+                else:
+                    legacy.replace(target)
+            if entry["sha1"] is None and target.exists() and target.stat().st_size > 100:
+                entry["sha1"] = content_hash(target.read_bytes())
+                adopted.append(ename)
+        return adopted
@@ -5,83 +5,1291 @@
 import cv2
 import numpy as np
 import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Iterable, Optional, Sequence
+
+from .arena import TemplateArena
+from .cache import ResultCache, fingerprint
+from .bank import BANK_FILENAME, TemplateBank, load_bank, make_key, save_bank, scan_sources
+from .detection import find_peaks, nms
+from .fftmatch import FFTCorrelator
+from .metrics import metrics
+
+# 默认缩放比例（截图与图标库之间的尺寸差异）
+DEFAULT_SCALES = (0.8, 0.9, 1.0, 1.1, 1.2)
+
+# 由粗到精搜索：截图短边小于该值时直接全分辨率匹配
+COARSE_MIN_SIDE = 256
+# 粗匹配模板的最小边长，过小时该缩放级别退回全分辨率匹配
+COARSE_MIN_TEMPLATE = 6
+
+# 可选的匹配引擎：opencv 逐个调用 matchTemplate，fft 在频域批量计算
+ENGINES = ("opencv", "fft")
+
+# 颜色直方图描述子的分箱数（HSV 色调 × 饱和度）
+HIST_BINS = (16, 4)
+
+# 匹配前的预处理：color 三通道原图，gray 灰度（相关计算量约为 1/3），edge 灰度梯度幅值
+MODES = ("color", "gray", "edge")
+# PNG 透明度不低于该值的像素计入模板掩码
+MASK_ALPHA = 128
+
+# 自动估计界面缩放：粗搜范围与步长、参与粗搜的模板数、黄金分割细化次数，
+# 以及估计结果可以在同一分辨率的后续截图中沿用所需的最低匹配分；
+# 沿用估计时最高分低于该最低分、或比估计时的匹配分低 AUTO_SCALE_DROP 以上，说明缩放已变，当场重新估计
+AUTO_SCALE_RANGE = (0.7, 1.5)
+AUTO_SCALE_STEP = 0.1
+AUTO_SCALE_PROBES = 3
+AUTO_SCALE_GRID_FACTOR = 0.5  # 粗搜在缩小后的截图上进行
+AUTO_SCALE_REFINE = 6
+AUTO_SCALE_MIN_SCORE = 0.5
+AUTO_SCALE_DROP = 0.15
+_GOLDEN = (5 ** 0.5 - 1) / 2
+
+# 整图分类快速路径：截图与图标大小相近（紧贴图标的截图）时，统一缩放到 CLASSIFY_SIZE 见方，
+# 与全部模板一次矩阵乘法算出归一化相关；截图边长不超过模板的 CLASSIFY_MAX_RATIO 倍才尝试，
+# 第一名不低于 CLASSIFY_MIN_SCORE 才采用结果，否则退回滑动窗口匹配。
+# 矩阵相关只用于排序和筛选，候选用 TM_CCOEFF_NORMED 在原图上重新打分，返回的分数与滑动窗口匹配一致：
+# 只要第一名时重新打分前 CLASSIFY_RESCORE 名；要完整列表时，矩阵相关不低于 threshold - CLASSIFY_SCORE_GAP 的模板都可能达到阈值
+# （合成图标上测得非第一名的矩阵相关比真实分数最多低约 0.6），这样的模板不超过 CLASSIFY_RESCORE 个才重新打分，否则退回滑动窗口匹配
+CLASSIFY_SIZE = 32
+CLASSIFY_MAX_RATIO = 1.6
+CLASSIFY_MIN_SCORE = 0.85
+CLASSIFY_RESCORE = 3
+CLASSIFY_SCORE_GAP = 0.65
+# 整图不够贴合时，假设截图四周多出这些比例的边框，按 CLASSIFY_STRIDE 步长取出所有子区域一并打分；
+# 只尝试与截图大小相符的边框比例，截图宽高比与模板相差超过 CLASSIFY_MAX_ASPECT 倍时不尝试
+CLASSIFY_INSETS = (0.08, 0.16, 0.24, 0.32)
+CLASSIFY_STRIDE = 2
+CLASSIFY_MAX_ASPECT = 1.25
+
+# 多目标检测：粗匹配候选的分数放宽量，以及每个缩放级别最多保留的峰值数
+DETECT_COARSE_SLACK = 0.15
+DETECT_MAX_PEAKS = 256
+
+
+def _color_histogram(img: np.ndarray) -> np.ndarray:
+    """计算 HSV 色调/饱和度直方图（像素计数，未归一化），展平为一维"""
+    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+    hist = cv2.calcHist([hsv], [0, 1], None, list(HIST_BINS), [0, 180, 0, 256])
+    return hist.ravel()
+
+
+# 单个模板的最佳匹配：(分数, 缩放级别下标, 左上角坐标 (x, y))
+Hit = tuple[float, int, tuple[int, int]]
+# 检测结果：(门派中文名, 置信度, 左上角 x, 左上角 y, 缩放比例)
+Detection = tuple[str, float, int, int, float]
+
+
+def preprocess(img: np.ndarray, mode: str) -> np.ndarray:
+    """将 BGR 图像转换为匹配使用的表示"""
+    if mode == "color":
+        return img
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    if mode == "gray":
+        return gray
+    dx = cv2.convertScaleAbs(cv2.Sobel(gray, cv2.CV_16S, 1, 0))
+    dy = cv2.convertScaleAbs(cv2.Sobel(gray, cv2.CV_16S, 0, 1))
+    return cv2.addWeighted(dx, 0.5, dy, 0.5, 0)
+
+
+def read_icon(path: Path) -> Optional[tuple[np.ndarray, Optional[np.ndarray]]]:
+    """读取图标，返回 (BGR 图像, 透明通道)，无透明通道时后者为 None，无法读取时返回 None"""
+    img = cv2.imread(str(path), cv2.IMREAD_UNCHANGED)
+    if img is None:
+        return None
+    if img.ndim == 2:
+        return cv2.cvtColor(img, cv2.COLOR_GRAY2BGR), None
+    if img.dtype != np.uint8:
+        img = cv2.convertScaleAbs(img, alpha=255.0 / np.iinfo(img.dtype).max)
+    if img.shape[2] == 4:
+        return np.ascontiguousarray(img[:, :, :3]), np.ascontiguousarray(img[:, :, 3])
+    return img, None
+
+
+def _response(image: np.ndarray, template: np.ndarray,
+              mask: Optional[np.ndarray] = None) -> np.ndarray:
+    """TM_CCOEFF_NORMED 响应图；带掩码时平坦区域产生的 nan/inf 置为 -1"""
+    if mask is None:
+        return cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED)
+    res = cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED, mask=mask)
+    res[~np.isfinite(res)] = -1.0
+    return res
+
+
+def _correlate(image: np.ndarray, template: np.ndarray,
+               mask: Optional[np.ndarray] = None) -> tuple[float, tuple[int, int]]:
+    """模板匹配，返回最高分及位置"""
+    _, max_val, _, max_loc = cv2.minMaxLoc(_response(image, template, mask))
+    return max_val, max_loc
+
+
+def _best_hit(level_results: list[tuple[float, tuple[int, int]]]) -> Hit:
+    """从各缩放级别的 (分数, 位置) 中取分数最高者，分数下限为 0"""
+    best: Hit = (0, 0, (0, 0))
+    for i, (score, loc) in enumerate(level_results):
+        if score > best[0]:
+            best = (score, i, tuple(loc))
+    return best
+
+
+def _top_peaks(res: np.ndarray, k: int, w: int, h: int) -> list[tuple[int, int]]:
+    """从响应图中取出前 k 个峰值位置，每取一个就抹掉其邻域（会修改 res）"""
+    peaks = []
+    for _ in range(k):
+        _, max_val, _, loc = cv2.minMaxLoc(res)
+        if max_val <= -1:
+            break
+        peaks.append(loc)
+        x, y = loc
+        res[max(0, y - h // 2):y + h // 2 + 1, max(0, x - w // 2):x + w // 2 + 1] = -1
+    return peaks
+
+
+def configure_cv_threads(match_workers: Optional[int]) -> int:
+    """
+    按匹配线程池的大小设置 OpenCV 内部线程数，两层并行合计不超过 CPU 核心数，返回原来的线程数
+    cv2.setNumThreads 对整个进程生效，应在进程启动时按进程内的并行方式调用一次，而不是随每个匹配器设置
+    """
+    previous = cv2.getNumThreads()
+    cores = os.cpu_count() or 1
+    workers = cores if match_workers is None else max(1, match_workers)
+    cv2.setNumThreads(max(1, cores // workers))
+    return previous
+
+
+class MatchCancelled(Exception):
+    """识别过程中 should_cancel 返回 True，本次识别被放弃"""
 
 
 class IconMatcher:
-    def __init__(self, assets_dir: Path):
+    def __init__(self, assets_dir: Path, scales: Sequence[float] = DEFAULT_SCALES,
+                 use_bank: bool = True, coarse_to_fine: bool = False,
+                 coarse_factor: float = 0.25, coarse_peaks: int = 3,
+                 shortlist_k: Optional[int] = None, shortlist_margin: float = 0.1,
+                 engine: str = "opencv", max_workers: Optional[int] = 1,
+                 certain_score: float = 0.9, certain_margin: float = 0.1,
+                 bound_slack: float = 0.25, track: bool = False,
+                 track_radius: int = 16, track_min_score: float = 0.85,
+                 cache_size: int = 32, cache_ttl: Optional[float] = None,
+                 mode: str = "color", use_mask: bool = False, auto_scale: bool = False,
+                 classify: bool = True, arena: Optional[str] = None):
+        """
+        Args:
+            assets_dir: 图标目录
+            scales: 预先生成的模板缩放比例
+            use_bank: 是否使用编译后的模板库文件（assets/templates.bank）加速启动
+            coarse_to_fine: 大截图先在缩小图上粗匹配，再只在峰值附近全分辨率精匹配
+            coarse_factor: 粗匹配时截图和模板的缩小比例
+            coarse_peaks: 每个模板每个缩放级别保留的粗匹配峰值数量
+            shortlist_k: 先按颜色直方图筛出前 k 个候选模板再做模板匹配，None 表示不筛选
+            shortlist_margin: 候选中的最高分低于 threshold + margin 时，补匹配其余模板
+            engine: 匹配引擎，"opencv" 或 "fft"（fft 引擎始终全分辨率匹配，不使用 coarse_to_fine；
+                截图大到模板频谱超出缓存上限时改用 matchTemplate）
+            max_workers: opencv 引擎并行匹配的线程数，1 为串行，None 为 CPU 核心数；
+                OpenCV 内部线程数是进程级设置，不随匹配器改变，需要时在进程启动时调用 configure_cv_threads
+            certain_score: match_best 中最高分达到该值且领先第二名 certain_margin 时立即返回
+            certain_margin: 见 certain_score
+            bound_slack: match_best 中单个模板换缩放级别最多还能提升的分数，
+                已测级别最高分加上该值仍追不上当前第一时跳过其余级别
+            track: 记住上次的命中模板、缩放级别和位置，下次先在该位置附近查找
+            track_radius: 位置跟踪时在上次位置四周搜索的像素范围
+            track_min_score: 位置跟踪命中所需的最低分，低于该值时做完整搜索
+            cache_size: 识别结果缓存条目数（按截图内容指纹），0 表示不缓存
+            cache_ttl: 识别结果缓存有效期（秒），None 表示不过期
+            mode: 匹配前的预处理，"color"、"gray" 或 "edge"；模板在加载时处理，截图每次识别处理一次
+            use_mask: 以 PNG 透明通道作为模板掩码，透明边框不参与相关计算（仅 opencv 引擎）
+            auto_scale: 不再逐个尝试 scales，而是先估计截图的界面缩放比例，把截图缩放到图标原始大小后
+                只匹配一个级别；估计结果按截图分辨率缓存，忽略 scales 参数
+            classify: 截图与图标大小相近时先走整图分类快速路径（见 CLASSIFY_SIZE）
+            arena: 已发布的共享内存模板库名称（见 publish_arena），给出时直接挂载，不读取图标和模板库文件
+        """
+        if not 0 < coarse_factor < 1:
+            raise ValueError("coarse_factor 必须在 (0, 1) 之间")
+        if engine not in ENGINES:
+            raise ValueError(f"未知的匹配引擎: {engine}，可选: {', '.join(ENGINES)}")
+        if mode not in MODES:
+            raise ValueError(f"未知的预处理方式: {mode}，可选: {', '.join(MODES)}")
+        if use_mask and engine != "opencv":
+            raise ValueError("use_mask 仅支持 opencv 引擎")
+        self.engine = engine
+        self.mode = mode
+        self.use_mask = use_mask
         self.assets_dir = Path(assets_dir)
+        self.coarse_to_fine = coarse_to_fine
+        self.coarse_factor = coarse_factor
+        self.coarse_peaks = max(1, coarse_peaks)
+        self.shortlist_k = shortlist_k
+        self.shortlist_margin = shortlist_margin
+        self.certain_score = certain_score
+        self.certain_margin = certain_margin
+        self.bound_slack = bound_slack
+        self.track = track
+        self.track_radius = track_radius
+        self.track_min_score = track_min_score
+        # 上次命中：(英文名, 缩放级别下标, 左上角坐标)
+        self._last_hit: Optional[tuple[str, int, tuple[int, int]]] = None
+        # 识别结果缓存，重新加载模板时自动清空
+        self.result_cache = ResultCache(cache_size, cache_ttl)
+        self.use_bank = use_bank
+        self.bank_path = self.assets_dir / BANK_FILENAME
+        self.bank_key: Optional[str] = None  # 当前模板集合的校验值
+        self._bank_buffer: Optional[np.ndarray] = None  # 模板数组引用的模板库文件映射
+        self._arena_name = arena
+        self._arena: Optional[TemplateArena] = None  # 挂载的共享内存模板库
+        self.auto_scale = auto_scale
+        # 自动缩放只需要原始大小这一个级别
+        self.scales: tuple[float, ...] = (1.0,) if auto_scale else tuple(scales)
+        self.classify = classify
+        # 整图分类：模板名、(N, D) 的归一化模板矩阵与掩码矩阵、每行掩码像素数、模板参考边长
+        self._classify_names: list[str] = []
+        self._classify_templates: Optional[np.ndarray] = None
+        self._classify_masks: Optional[np.ndarray] = None
+        self._classify_counts: Optional[np.ndarray] = None
+        self._classify_side = 0.0
+        self._classify_aspect = 1.0
+        # 最近一次可信的缩放估计：(截图高宽, 缩放比例, 估计时的匹配分)
+        self._scale_estimate: Optional[tuple[tuple[int, int], float, float]] = None
+        if not self.scales:
+            raise ValueError("scales 不能为空")
         self.template_cache: dict[str, np.ndarray] = {}  # 英文名 -> 图像
+        # 英文名 -> [(缩放比例, 缩放并预处理后的图像), ...]，加载时预先计算
+        self.template_pyramid: dict[str, list[tuple[float, np.ndarray]]] = {}
+        # 英文名 -> 与 template_pyramid 一一对应的掩码（use_mask 且图标有透明区域时才有）
+        self.mask_pyramid: dict[str, list[Optional[np.ndarray]]] = {}
+        # 英文名 -> PNG 透明通道，仅在解码后生成缩放级别时使用
+        self._alpha: dict[str, np.ndarray] = {}
+        # 英文名 -> 与 template_pyramid 一一对应的粗匹配模板（过小则为 None）
+        self.coarse_pyramid: dict[str, list[Optional[np.ndarray]]] = {}
+        # 颜色直方图索引：descriptor_names[i] 对应 descriptor_index[i]
+        self.descriptor_names: list[str] = []
+        self.descriptor_index: Optional[np.ndarray] = None
+        # fft 引擎：所有缩放级别平铺后的批量相关器，及每个模板对应的下标
+        self._fft: Optional[FFTCorrelator] = None
+        self._fft_levels: dict[str, list[int]] = {}
         self.name_map: dict[str, str] = {}  # 英文名 -> 中文名
+        # 识别与模板热更新互斥
+        self._lock = threading.RLock()
+        # 当前识别的取消检查函数，仅在持有 _lock 时设置
+        self._should_cancel: Optional[Callable[[], bool]] = None
         self._load_templates()
 
+        # (模板, 缩放级别) 任务线程池；matchTemplate 会释放 GIL
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self.max_workers = (os.cpu_count() or 1) if max_workers is None else max(1, max_workers)
+        if self.max_workers > 1:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers,
+                                            thread_name_prefix="matcher")
+
+    def close(self):
+        """等待正在进行的识别结束，然后关闭线程池，并释放挂载的共享模板库"""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
+            if self._arena is not None:
+                self._arena.release()
+                self._arena = None
+
+    def _bank_config(self) -> dict:
+        """影响模板库内容的参数，变化时需重新编译"""
+        return {"scales": list(self.scales), "mode": self.mode, "mask": self.use_mask}
+
     def _load_templates(self):
-        """加载所有参考图标到内存"""
+        """加载所有参考图标到内存，优先使用已编译的模板库"""
+        if self._arena_name is not None and self._arena is None:
+            self._arena = TemplateArena.attach(self._arena_name)
+            bank = self._arena.bank()
+            if bank.config != self._bank_config():
+                self._arena.release()
+                self._arena = None
+                raise ValueError(f"共享模板库的参数 {bank.config} 与匹配器不一致: {self._bank_config()}")
+            self._apply_bank(bank)
+            return
+
         if not self.assets_dir.exists():
             raise FileNotFoundError(f"assets目录不存在: {self.assets_dir}")
 
+        if self.use_bank:
+            bank = load_bank(self.bank_path, self.assets_dir, self._bank_config())
+            if bank is not None and bank.templates:
+                self._apply_bank(bank)
+                return
+
+        self._decode_templates()
+        self._build_pyramid()
+
+        if self.use_bank:
+            self._save_bank()
+        self._prepare_templates()
+
+    def _apply_bank(self, bank: TemplateBank):
+        """使用已编译的模板库（内存映射文件或共享内存上的视图）"""
+        self.template_cache = bank.templates
+        self.template_pyramid = bank.pyramid
+        self.mask_pyramid = self._expand_masks(bank.masks)
+        self.name_map = bank.name_map
+        self.bank_key = bank.key
+        # 共享内存由 TemplateArena 管理，这里只记录模板库文件的映射
+        self._bank_buffer = bank.buffer if self._arena is None else None
+        self._prepare_templates()
+
+    def _to_bank(self) -> TemplateBank:
+        """将当前模板打包为模板库"""
+        config = self._bank_config()
+        sources = scan_sources(self.assets_dir)
+        return TemplateBank(self.template_cache, self.template_pyramid, self.name_map,
+                            config, sources, make_key(sources, config), masks=self._pack_masks())
+
+    def publish_arena(self) -> TemplateArena:
+        """
+        把当前模板发布到共享内存，供其他进程以 IconMatcher(..., arena=名称) 挂载
+        调用方负责在工作进程结束后 release()（或用 with）
+        """
+        with self._lock:
+            return TemplateArena.publish(self._to_bank())
+
+    def reload_templates(self):
+        """重新加载图标库（assets 变化后调用），同时清空结果缓存和位置跟踪"""
+        with self._lock:
+            self._load_templates()
+
+    def reload_entries(self, names: Iterable[str]):
+        """
+        只重新加载指定的模板（文件被更新、新增或删除），其余模板保持不变
+        PNG 解码与缩放在加锁前完成，识别只在替换数据的瞬间被阻塞
+        """
+        updated: dict[str, Optional[list[tuple[float, np.ndarray]]]] = {}
+        images: dict[str, np.ndarray] = {}
+        masks: dict[str, list[Optional[np.ndarray]]] = {}
+        for ename in names:
+            path = self.assets_dir / f"{ename}.png"
+            icon = read_icon(path) if path.exists() else None
+            if icon is None:
+                updated[ename] = None
+            else:
+                images[ename], alpha = icon
+                updated[ename] = self._scale_levels(images[ename])
+                masks[ename] = self._mask_levels(alpha)
+        name_map = self._read_name_map()
+
+        with self._lock:
+            for ename, levels in updated.items():
+                if levels is None:
+                    self.template_cache.pop(ename, None)
+                    self.template_pyramid.pop(ename, None)
+                    self.mask_pyramid.pop(ename, None)
+                    self.coarse_pyramid.pop(ename, None)
+                    continue
+                self.template_cache[ename] = images[ename]
+                self.template_pyramid[ename] = levels
+                self.mask_pyramid[ename] = masks[ename]
+                if self.coarse_to_fine:
+                    self.coarse_pyramid[ename] = self._coarse_levels(levels)
+            self.name_map = name_map
+            self._refresh_indexes()
+            if self.use_bank:
+                self._save_bank()
+
+    def _prepare_templates(self):
+        """模板加载完成后，生成只在内存中使用的辅助数据"""
+        self.coarse_pyramid = {}
+        if self.coarse_to_fine:
+            self._build_coarse_pyramid()
+        self._refresh_indexes()
+
+    def _refresh_indexes(self):
+        """重建依赖全部模板的索引，并清空结果缓存和位置跟踪"""
+        self.result_cache.clear()
+        self._last_hit = None
+        self._scale_estimate = None
+        self._build_descriptor_index()
+        if self.classify:
+            self._build_classifier()
+        if self.engine == "fft":
+            self._build_fft()
+
+    def _build_fft(self):
+        """将所有模板的所有缩放级别平铺，交给频域相关器"""
+        flat = []
+        self._fft_levels = {}
+        for ename, levels in self.template_pyramid.items():
+            self._fft_levels[ename] = list(range(len(flat), len(flat) + len(levels)))
+            flat.extend(img for _, img in levels)
+        self._fft = FFTCorrelator(flat)
+
+    def _build_descriptor_index(self):
+        """为所有模板计算颜色直方图，用于匹配前快速筛选候选"""
+        self.descriptor_names = list(self.template_pyramid)
+        # 按最小缩放比例换算像素数，保证缩小后的图标也能被截图直方图“容纳”
+        min_scale = AUTO_SCALE_RANGE[0] if self.auto_scale else min(self.scales)
+        hists = [_color_histogram(self.template_cache[ename]) * (min_scale ** 2)
+                 for ename in self.descriptor_names]
+        self.descriptor_index = np.stack(hists) if hists else None
+
+    def _canonical(self, img: np.ndarray) -> np.ndarray:
+        """缩放到 CLASSIFY_SIZE 见方并展平为 float32 向量"""
+        size = (CLASSIFY_SIZE, CLASSIFY_SIZE)
+        return cv2.resize(img, size, interpolation=cv2.INTER_AREA).reshape(-1).astype(np.float32)
+
+    def _build_classifier(self):
+        """
+        将全部模板（原始大小）缩放到统一尺寸，堆叠为矩阵
+        每行在掩码内减去均值、掩码外置零并归一化，分类时只需矩阵乘法；无掩码的模板掩码全为 1
+        """
+        names = list(self.template_pyramid)
+        if not names:
+            self._classify_templates = None
+            return
+        channels = 1 if self.mode != "color" else 3
+        rows, masks, sides, aspects = [], [], [], []
+        for ename in names:
+            template = self.template_cache[ename]
+            h, w = template.shape[:2]
+            sides.append(max(h, w))
+            aspects.append(w / h)
+            t = self._canonical(preprocess(template, self.mode))
+            m = np.ones_like(t)
+            native = [i for i, (scale, _) in enumerate(self.template_pyramid[ename]) if scale == 1.0]
+            level_mask = self._level_mask(ename, native[0]) if native else None
+            if level_mask is not None:
+                m = np.repeat(self._canonical(level_mask) >= 128, channels).astype(np.float32)
+            t = (t - t[m > 0].mean()) * m
+            rows.append(t / max(float(np.linalg.norm(t)), 1e-6))
+            masks.append(m)
+        self._classify_names = names
+        self._classify_templates = np.stack(rows)
+        self._classify_masks = np.stack(masks)
+        self._classify_counts = self._classify_masks.sum(axis=1)
+        self._classify_side = float(np.median(sides))
+        self._classify_aspect = float(np.median(aspects))
+
+    def _batch_ncc(self, queries: np.ndarray) -> np.ndarray:
+        """
+        (K, D) 的查询向量与全部模板的掩码归一化相关，返回 (K, N)
+        模板行已在掩码内零均值、单位范数，分子即 q·t；分母为查询在各模板掩码内的标准差项
+        """
+        sums = queries @ self._classify_masks.T
+        energy = (queries * queries) @ self._classify_masks.T - sums * sums / self._classify_counts
+        return (queries @ self._classify_templates.T) / np.sqrt(np.maximum(energy, 1e-6))
+
+    def _plausible_insets(self, image: np.ndarray) -> list[float]:
+        """
+        返回与截图大小相符的边框比例：图标按 s 倍缩放、四周留 f 比例的边框时，截图边长 = 模板边长 × s / (1 - f)
+        s 取模板缩放级别（或自动缩放的估计范围）的上下限，两端各放宽一个边框步长；宽高比不符时返回空列表
+        """
+        h, w = image.shape[:2]
+        aspect = w / h / self._classify_aspect
+        if max(aspect, 1 / aspect) > CLASSIFY_MAX_ASPECT:
+            return []
+        ratio = max(h, w) / self._classify_side
+        lo, hi = AUTO_SCALE_RANGE if self.auto_scale else (min(self.scales), max(self.scales))
+        slack = CLASSIFY_INSETS[0]
+        return [f for f in CLASSIFY_INSETS if 1 - hi / ratio - slack <= f <= 1 - lo / ratio + slack]
+
+    def _inset_windows(self, image: np.ndarray, insets: Sequence[float]) -> np.ndarray:
+        """
+        按给定的边框比例取出去掉边框后的所有子区域，返回 (K, D) 的查询矩阵
+        每种边框比例只缩放一次截图，子区域是缩放图上的滑动窗口视图
+        """
+        n = CLASSIFY_SIZE
+        queries = []
+        for inset in insets:
+            side = int(round(n / (1 - inset)))
+            resized = cv2.resize(image, (side, side), interpolation=cv2.INTER_AREA)
+            windows = np.lib.stride_tricks.sliding_window_view(resized, (n, n), axis=(0, 1))
+            windows = windows[::CLASSIFY_STRIDE, ::CLASSIFY_STRIDE]
+            if windows.ndim == 5:
+                windows = windows.transpose(0, 1, 3, 4, 2)  # (行, 列, 通道, 高, 宽) -> 按像素交错通道
+            queries.append(windows.reshape(-1, self._classify_templates.shape[1]))
+        return np.concatenate(queries).astype(np.float32)
+
+    def _classify(self, image: np.ndarray, threshold: Optional[float] = None,
+                  insets: bool = True) -> Optional[list[tuple[str, float]]]:
+        """
+        整图分类：返回重新打分的候选 [(英文名, 分数), ...]（按分数降序），分数为 TM_CCOEFF_NORMED
+        threshold 为 None 时只保证第一名，候选为前 CLASSIFY_RESCORE 名；
+        否则候选为所有可能达到 threshold 的模板（超过 CLASSIFY_RESCORE 个时返回 None），分数不低于 threshold 的部分与滑动窗口匹配的结果相同
+        先整张截图打分；不够确定且 insets 为 True 时，再对去掉不同比例边框的全部子区域一次性打分，每个模板取最高分
+        截图明显大于图标、或第一名（排序时或重新打分后）低于 CLASSIFY_MIN_SCORE 时返回 None，由调用方做滑动窗口匹配
+        """
+        if self._classify_templates is None or max(image.shape[:2]) > self._classify_side * CLASSIFY_MAX_RATIO:
+            return None
+        q = self._canonical(image)
+        if q.size != self._classify_templates.shape[1]:
+            return None
+        scores = self._batch_ncc(q[None])[0]
+        if insets and scores.max() < CLASSIFY_MIN_SCORE:
+            plausible = self._plausible_insets(image)
+            if plausible:
+                windows = self._inset_windows(image, plausible)
+                scores = np.maximum(scores, self._batch_ncc(windows).max(axis=0))
+        order = np.argsort(-scores, kind="stable")
+        if scores[order[0]] < CLASSIFY_MIN_SCORE:
+            return None
+        if threshold is None:
+            candidates = order[:CLASSIFY_RESCORE]
+        else:
+            candidates = [i for k, i in enumerate(order) if k == 0 or scores[i] >= threshold - CLASSIFY_SCORE_GAP]
+            if len(candidates) > CLASSIFY_RESCORE:
+                return None
+        ranked = [(self._classify_names[i], self._rescore(self._classify_names[i], image))
+                  for i in candidates]
+        ranked.sort(key=lambda r: r[1], reverse=True)
+        return ranked if ranked[0][1] >= CLASSIFY_MIN_SCORE else None
+
+    def _rescore(self, ename: str, image: np.ndarray) -> float:
+        """与滑动窗口匹配相同的打分（全部缩放级别取最高分）；模板无法匹配时为 -1"""
+        hit = self._score_template(ename, image, None)
+        return hit[0] if hit is not None else -1.0
+
+    def _shortlist(self, screenshot: np.ndarray) -> Optional[tuple[list[str], list[str]]]:
+        """
+        按颜色直方图的包含度给模板排序，返回 (前 k 个候选, 其余模板)
+        包含度 = 模板像素中颜色在截图中也足量出现的比例，截图较大时不会误伤
+        未启用筛选或模板数不超过 k 时返回 None
+        """
+        k = self.shortlist_k
+        if k is None or self.descriptor_index is None or k >= len(self.descriptor_names):
+            return None
+        names = self._rank_templates(screenshot)
+        return names[:k], names[k:]
+
+    def _rank_templates(self, screenshot: np.ndarray) -> list[str]:
+        """按颜色直方图包含度从高到低返回全部模板名"""
+        if self.descriptor_index is None:
+            return list(self.template_pyramid)
+        shot = _color_histogram(screenshot)
+        index = self.descriptor_index
+        containment = np.minimum(index, shot).sum(axis=1) / np.maximum(index.sum(axis=1), 1e-6)
+        order = np.argsort(-containment, kind="stable")
+        return [self.descriptor_names[i] for i in order]
+
+    def _detach_bank(self):
+        """
+        把仍引用模板库文件映射区的数组复制到内存，丢弃对映射的引用，
+        映射随之关闭，之后才能替换该文件（Windows 上被映射的文件不能被覆盖）
+        """
+        buf = self._bank_buffer
+        if buf is None:
+            return
+        self._bank_buffer = None
+
+        def own(arr: Optional[np.ndarray]) -> Optional[np.ndarray]:
+            return arr.copy() if arr is not None and np.may_share_memory(arr, buf) else arr
+
+        self.template_cache = {ename: own(img) for ename, img in self.template_cache.items()}
+        self.template_pyramid = {ename: [(scale, own(img)) for scale, img in levels]
+                                 for ename, levels in self.template_pyramid.items()}
+        self.mask_pyramid = {ename: [own(m) for m in masks] for ename, masks in self.mask_pyramid.items()}
+
+    def _save_bank(self):
+        """将当前模板编译写入模板库文件，目录只读时跳过"""
+        self._detach_bank()
+        bank = self._to_bank()
+        self.bank_key = bank.key
+        try:
+            save_bank(self.bank_path, bank)
+        except OSError:
+            pass
+
+    def _decode_templates(self):
+        """逐个解码 PNG 图标"""
+        self.template_cache = {}
+        self.name_map = {}
+
         # 加载名称映射
-        map_path = self.assets_dir / "name_map.json"
-        if map_path.exists():
-            with open(map_path, "r", encoding="utf-8") as f:
-                self.name_map = json.load(f)
+        self.name_map = self._read_name_map()
 
+        self._alpha = {}
         for img_path in self.assets_dir.glob("*.png"):
             if img_path.name == "name_map.json":
                 continue
             ename = img_path.stem  # 英文文件名
-            img = cv2.imread(str(img_path), cv2.IMREAD_COLOR)
-            if img is not None:
-                self.template_cache[ename] = img
+            icon = read_icon(img_path)
+            if icon is not None:
+                self.template_cache[ename], alpha = icon
+                if alpha is not None:
+                    self._alpha[ename] = alpha
 
         if not self.template_cache:
             raise ValueError(f"assets目录为空: {self.assets_dir}")
 
+    def _read_name_map(self) -> dict[str, str]:
+        map_path = self.assets_dir / "name_map.json"
+        if map_path.exists():
+            with open(map_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {}
+
+    def _level_sizes(self, w: int, h: int) -> list[tuple[float, tuple[int, int]]]:
+        """各缩放比例对应的 (比例, (宽, 高))，跳过缩放后为空的级别"""
+        sizes = []
+        for scale in self.scales:
+            size = (int(w * scale), int(h * scale))
+            if size[0] >= 1 and size[1] >= 1:
+                sizes.append((scale, size))
+        return sizes
+
+    def _scale_levels(self, template: np.ndarray) -> list[tuple[float, np.ndarray]]:
+        """生成单个模板所有缩放比例的图像（先缩放原图，再做预处理）"""
+        h, w = template.shape[:2]
+        levels = []
+        for scale, size in self._level_sizes(w, h):
+            img = template if size == (w, h) else cv2.resize(template, size)
+            levels.append((scale, preprocess(img, self.mode)))
+        return levels
+
+    def _mask_levels(self, alpha: Optional[np.ndarray]) -> list[Optional[np.ndarray]]:
+        """
+        生成与缩放级别对应的二值掩码
+        未启用掩码、没有透明通道或图标完全不透明时全部为 None（按普通匹配处理）
+        """
+        if alpha is None or not self.use_mask:
+            return []
+        mask = np.where(alpha >= MASK_ALPHA, 255, 0).astype(np.uint8)
+        h, w = mask.shape
+        levels = []
+        for _, size in self._level_sizes(w, h):
+            m = mask if size == (w, h) else cv2.resize(mask, size, interpolation=cv2.INTER_NEAREST)
+            levels.append(None if m.all() or not m.any() else m)
+        return levels
+
+    def _build_pyramid(self):
+        """为每个模板预先生成所有缩放比例的图像，避免每次识别重复 resize"""
+        self.template_pyramid = {}
+        self.mask_pyramid = {}
+        for ename, template in self.template_cache.items():
+            self.template_pyramid[ename] = self._scale_levels(template)
+            self.mask_pyramid[ename] = self._mask_levels(self._alpha.get(ename))
+        self._alpha = {}
+
+    def _pack_masks(self) -> dict[str, list[tuple[float, np.ndarray]]]:
+        """整理出需要写入模板库的掩码：英文名 -> [(缩放比例, 掩码), ...]"""
+        packed = {}
+        for ename, masks in self.mask_pyramid.items():
+            levels = self.template_pyramid[ename]
+            entries = [(levels[i][0], m) for i, m in enumerate(masks) if m is not None]
+            if entries:
+                packed[ename] = entries
+        return packed
+
+    def _expand_masks(self, packed: dict[str, list[tuple[float, np.ndarray]]]) -> dict[str, list[Optional[np.ndarray]]]:
+        """将模板库中的掩码还原为与 template_pyramid 对齐的列表"""
+        expanded = {}
+        for ename, entries in packed.items():
+            by_scale = dict(entries)
+            expanded[ename] = [by_scale.get(scale) for scale, _ in self.template_pyramid.get(ename, [])]
+        return expanded
+
+    def _level_mask(self, ename: str, i: int) -> Optional[np.ndarray]:
+        masks = self.mask_pyramid.get(ename)
+        return masks[i] if masks else None
+
+    def _coarse_levels(self, levels: list[tuple[float, np.ndarray]]) -> list[Optional[np.ndarray]]:
+        """生成单个模板各缩放级别对应的粗匹配模板"""
+        f = self.coarse_factor
+        coarse = []
+        for _, img in levels:
+            h, w = img.shape[:2]
+            size = (int(round(w * f)), int(round(h * f)))
+            if min(size) < COARSE_MIN_TEMPLATE:
+                coarse.append(None)
+            else:
+                coarse.append(cv2.resize(img, size, interpolation=cv2.INTER_AREA))
+        return coarse
+
+    def _build_coarse_pyramid(self):
+        """为每个缩放级别生成粗匹配用的缩小模板"""
+        for ename, levels in self.template_pyramid.items():
+            self.coarse_pyramid[ename] = self._coarse_levels(levels)
+
+    def _coarse_screenshot(self, screenshot: np.ndarray) -> Optional[np.ndarray]:
+        """截图足够大时返回缩小后的截图，否则返回 None（走全分辨率匹配）"""
+        if not self.coarse_to_fine or self.engine != "opencv" or min(screenshot.shape[:2]) < COARSE_MIN_SIDE:
+            return None
+        h, w = screenshot.shape[:2]
+        size = (int(round(w * self.coarse_factor)), int(round(h * self.coarse_factor)))
+        return cv2.resize(screenshot, size, interpolation=cv2.INTER_AREA)
+
+    def _refine(self, screenshot: np.ndarray, small: np.ndarray, template: np.ndarray,
+                coarse: np.ndarray, mask: Optional[np.ndarray] = None) -> tuple[float, tuple[int, int]]:
+        """粗匹配找出候选位置，再在候选位置附近的小窗口内做全分辨率匹配（掩码只用于精匹配）"""
+        f = self.coarse_factor
+        res = cv2.matchTemplate(small, coarse, cv2.TM_CCOEFF_NORMED)
+        ch, cw = coarse.shape[:2]
+        th, tw = template.shape[:2]
+        sh, sw = screenshot.shape[:2]
+        margin = int(np.ceil(2 / f))  # 粗匹配的定位误差约为 1/f 像素
+
+        best, best_loc = -1.0, (0, 0)
+        for cx, cy in _top_peaks(res, self.coarse_peaks, cw, ch):
+            x, y = int(cx / f), int(cy / f)
+            x0, y0 = max(0, x - margin), max(0, y - margin)
+            x1, y1 = min(sw, x + tw + margin), min(sh, y + th + margin)
+            window = screenshot[y0:y1, x0:x1]
+            if window.shape[0] < th or window.shape[1] < tw:
+                continue
+            max_val, max_loc = _correlate(window, template, mask)
+            if max_val > best:
+                best, best_loc = max_val, (x0 + max_loc[0], y0 + max_loc[1])
+        return best, best_loc
+
+    def _score_templates(self, names: list[str], screenshot: np.ndarray,
+                         small: Optional[np.ndarray]) -> dict[str, Hit]:
+        """按所选引擎计算一组模板的最佳匹配，跳过比截图大的模板"""
+        hits = {}
+        # 截图太大、模板频谱放不进缓存时，fft 引擎改用 matchTemplate
+        if self.engine == "fft" and self._fft.fits(*screenshot.shape[:2]):
+            self._check_cancelled()
+            indices = [i for ename in names for i in self._fft_levels[ename]]
+            with metrics.span("match.fft", templates=len(names)):
+                level_hits = self._fft.max_scores(screenshot, indices)
+            for ename in names:
+                values = [level_hits[i] for i in self._fft_levels[ename]]
+                try:
+                    # 模板大于截图的级别交给 matchTemplate 处理（与 opencv 引擎行为一致）
+                    for k, value in enumerate(values):
+                        if value is None:
+                            res = cv2.matchTemplate(screenshot, self.template_pyramid[ename][k][1],
+                                                    cv2.TM_CCOEFF_NORMED)
+                            _, max_val, _, max_loc = cv2.minMaxLoc(res)
+                            values[k] = (max_val, max_loc)
+                except cv2.error:
+                    continue
+                hits[ename] = _best_hit(values)
+            return hits
+
+        if self._pool is not None:
+            return self._score_parallel(names, screenshot, small)
+
+        for ename in names:
+            self._check_cancelled()
+            hit = self._score_template(ename, screenshot, small)
+            if hit is not None:
+                hits[ename] = hit
+        return hits
+
+    def _score_parallel(self, names: list[str], screenshot: np.ndarray,
+                        small: Optional[np.ndarray]) -> dict[str, Hit]:
+        """将 (模板, 缩放级别) 任务分发到线程池，汇总每个模板的最佳匹配"""
+        score_level = metrics.propagate(self._score_level)
+        futures = {
+            ename: [self._pool.submit(score_level, ename, i, screenshot, small)
+                    for i in range(len(self.template_pyramid[ename]))]
+            for ename in names
+        }
+        hits = {}
+        try:
+            for ename, jobs in futures.items():
+                self._check_cancelled()
+                try:
+                    hits[ename] = _best_hit([job.result() for job in jobs])
+                except cv2.error:
+                    continue
+        except MatchCancelled:
+            for jobs in futures.values():
+                for job in jobs:
+                    job.cancel()
+            raise
+        return hits
+
+    def _score_level(self, ename: str, i: int, screenshot: np.ndarray,
+                     small: Optional[np.ndarray]) -> tuple[float, tuple[int, int]]:
+        """计算模板在第 i 个缩放级别下的最高匹配分及位置，尺寸不合适时抛出 cv2.error"""
+        scale, resized = self.template_pyramid[ename][i]
+        coarse_levels = self.coarse_pyramid.get(ename)
+        mask = self._level_mask(ename, i)
+        with metrics.span("match.level", f"{scale:.2f}", template=ename):
+            if small is not None and coarse_levels[i] is not None:
+                return self._refine(screenshot, small, resized, coarse_levels[i], mask)
+            # 模板匹配
+            return _correlate(screenshot, resized, mask)
+
+    def _score_template(self, ename: str, screenshot: np.ndarray,
+                        small: Optional[np.ndarray]) -> Optional[Hit]:
+        """计算单个模板在所有缩放级别下的最佳匹配，模板比截图大时返回 None"""
+        try:
+            # 尝试多种缩放比例找最佳匹配
+            with metrics.span("match.template", ename):
+                return _best_hit([self._score_level(ename, i, screenshot, small)
+                                  for i in range(len(self.template_pyramid[ename]))])
+        except cv2.error:
+            return None
+
+    def _track_search(self, screenshot: np.ndarray) -> Optional[tuple[str, float]]:
+        """
+        在上次命中位置附近、以上次的缩放级别匹配上次的模板
+        分数达到 track_min_score 时更新位置并返回 (英文名, 分数)，否则返回 None
+        """
+        if self._last_hit is None:
+            return None
+        ename, i, (x, y) = self._last_hit
+        levels = self.template_pyramid.get(ename)
+        if not levels or i >= len(levels):
+            return None
+
+        template = levels[i][1]
+        th, tw = template.shape[:2]
+        r = self.track_radius
+        x0, y0 = max(0, x - r), max(0, y - r)
+        window = screenshot[y0:y + th + r, x0:x + tw + r]
+        if window.shape[0] < th or window.shape[1] < tw:
+            return None
+        try:
+            max_val, max_loc = _correlate(window, template, self._level_mask(ename, i))
+        except cv2.error:
+            return None
+        if max_val < self.track_min_score:
+            return None
+        self._last_hit = (ename, i, (x0 + max_loc[0], y0 + max_loc[1]))
+        return ename, max_val
+
+    def _remember(self, hits: dict[str, Hit], threshold: float):
+        """记录本次完整搜索的第一名，供下次识别优先在原位置查找"""
+        if not self.track:
+            return
+        if not hits:
+            self._last_hit = None
+            return
+        ename = max(hits, key=lambda n: hits[n][0])
+        score, i, loc = hits[ename]
+        self._last_hit = (ename, i, loc) if score >= threshold else None
+
+    def warm_up(self):
+        """
+        用一张空白截图对一个模板跑一次匹配，提前完成 OpenCV（及 fft 引擎频谱）的首次调用开销
+        不写入结果缓存，也不改变位置追踪记录
+        """
+        if not self.template_pyramid:
+            return
+        ename = next(iter(self.template_pyramid))
+        side = max(t.shape[0] for _, t in self.template_pyramid[ename]) * 2
+        dummy = preprocess(np.zeros((side, side, 3), dtype=np.uint8), self.mode)
+        with self._lock:
+            self._score_templates([ename], dummy, self._coarse_screenshot(dummy))
+
+    def _check_cancelled(self):
+        if self._should_cancel is not None and self._should_cancel():
+            raise MatchCancelled()
+
+    def reset_tracking(self):
+        """清除上次命中的位置记录，下次识别做完整搜索"""
+        self._last_hit = None
+
+    def reset_scale(self):
+        """丢弃缓存的界面缩放估计（如游戏内调整了界面缩放），下次识别重新估计"""
+        self._scale_estimate = None
+
+    def estimate_scale(self, screenshot: np.ndarray) -> Optional[float]:
+        """
+        估计截图中图标相对图标库的缩放比例（游戏界面缩放、高 DPI 显示器）
+        不使用也不更新缓存的估计；所有模板都比截图大时返回 None
+        """
+        with self._lock:
+            estimate = self._estimate_scale(screenshot, preprocess(screenshot, self.mode))
+        return estimate[0] if estimate else None
+
+    def _probe(self, ename: str, scale: float, image: np.ndarray) -> tuple[float, tuple[int, int]]:
+        """将模板缩放到 scale 后与图像匹配，模板比图像大时分数为 -1"""
+        template = self.template_cache[ename]
+        h, w = template.shape[:2]
+        size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+        if size[0] > image.shape[1] or size[1] > image.shape[0]:
+            return -1.0, (0, 0)
+        resized = preprocess(cv2.resize(template, size), self.mode)
+        mask = self._level_mask(ename, 0)
+        if mask is not None:
+            mask = cv2.resize(mask, size, interpolation=cv2.INTER_NEAREST)
+            if mask.all() or not mask.any():
+                mask = None
+        return _correlate(image, resized, mask)
+
+    def _estimate_scale(self, screenshot: np.ndarray, image: np.ndarray) -> Optional[tuple[float, float]]:
+        """
+        返回 (缩放比例, 该比例下的匹配分)
+        1. 粗搜：颜色最接近的 AUTO_SCALE_PROBES 个模板，在 AUTO_SCALE_RANGE 内按 AUTO_SCALE_STEP 取比例，
+           大截图先缩小 AUTO_SCALE_GRID_FACTOR 倍
+        2. 细化：最佳模板在最佳比例两侧各一个步长内做黄金分割搜索，只在粗搜命中位置附近的小窗口内匹配
+        """
+        probes = self._rank_templates(screenshot)[:AUTO_SCALE_PROBES]
+        if not probes:
+            return None
+        lo, hi = AUTO_SCALE_RANGE
+        grid = np.arange(lo, hi + AUTO_SCALE_STEP / 2, AUTO_SCALE_STEP)
+
+        f = 1.0
+        grid_image = image
+        if min(image.shape[:2]) >= COARSE_MIN_SIDE:
+            f = AUTO_SCALE_GRID_FACTOR
+            grid_image = cv2.resize(image, None, fx=f, fy=f, interpolation=cv2.INTER_AREA)
+
+        best = (-1.0, 1.0, probes[0], (0, 0))  # (分数, 比例, 模板, 位置)
+        for ename in probes:
+            self._check_cancelled()
+            for scale in grid:
+                score, loc = self._probe(ename, float(scale) * f, grid_image)
+                if score > best[0]:
+                    best = (score, float(scale), ename, loc)
+        score, scale, ename, loc = best
+        if score < 0:
+            return None
+        x, y = int(loc[0] / f), int(loc[1] / f)
+
+        # 细化窗口覆盖粗搜位置上、最大细化比例下的模板，并留出定位误差
+        h, w = self.template_cache[ename].shape[:2]
+        a, b = max(lo, scale - AUTO_SCALE_STEP), min(hi, scale + AUTO_SCALE_STEP)
+        margin = int(np.ceil(max(w, h) * AUTO_SCALE_STEP + 2 / f)) + 2
+        x0, y0 = max(0, x - margin), max(0, y - margin)
+        window = image[y0:y + int(h * b) + margin, x0:x + int(w * b) + margin]
+
+        seen: dict[float, float] = {}  # 比例 -> 全分辨率匹配分
+
+        def score_at(s: float) -> float:
+            seen[s] = self._probe(ename, s, window)[0]
+            return seen[s]
+
+        score_at(scale)
+        c, d = b - _GOLDEN * (b - a), a + _GOLDEN * (b - a)
+        fc, fd = score_at(c), score_at(d)
+        for _ in range(AUTO_SCALE_REFINE):
+            if fc >= fd:
+                b, d, fd = d, c, fc
+                c = b - _GOLDEN * (b - a)
+                fc = score_at(c)
+            else:
+                a, c, fc = c, d, fd
+                d = a + _GOLDEN * (b - a)
+                fd = score_at(d)
+        scale = max(seen, key=seen.get)
+        return round(scale, 3), seen[scale]
+
+    def _apply_scale(self, screenshot: np.ndarray, image: np.ndarray) -> tuple[float, np.ndarray, bool]:
+        """
+        将预处理后的截图按界面缩放比例还原到图标原始大小，返回 (缩放比例, 还原后的截图, 是否沿用了缓存的估计)
+        同一分辨率沿用缓存的估计；估计变化时清除位置跟踪（坐标基准随之改变）
+        """
+        shape = image.shape[:2]
+        reused = self._scale_estimate is not None and self._scale_estimate[0] == shape
+        if reused:
+            scale = self._scale_estimate[1]
+        else:
+            with metrics.span("match.scale"):
+                estimate = self._estimate_scale(screenshot, image)
+            scale = estimate[0] if estimate else 1.0
+            if estimate and estimate[1] >= AUTO_SCALE_MIN_SCORE:
+                self._scale_estimate = (shape, scale, estimate[1])
+            self._last_hit = None
+        if abs(scale - 1.0) < 1e-3:
+            return 1.0, image, reused
+        h, w = shape
+        size = (max(1, int(round(w / scale))), max(1, int(round(h / scale))))
+        interpolation = cv2.INTER_AREA if scale > 1 else cv2.INTER_LINEAR
+        return scale, cv2.resize(image, size, interpolation=interpolation), reused
+
+    def _scale_outdated(self, reused: bool, best: float) -> bool:
+        """
+        沿用的缩放估计下最高分明显变差时返回 True 并丢弃该估计，调用方应当场重新识别一次
+        新估计下的结果不再检查，每次识别最多重新估计一次
+        """
+        if not reused or self._scale_estimate is None:
+            return False
+        if best >= AUTO_SCALE_MIN_SCORE and best >= self._scale_estimate[2] - AUTO_SCALE_DROP:
+            return False
+        metrics.count("scale_reestimates")
+        self.reset_scale()
+        return True
+
     def _to_chinese(self, ename: str) -> str:
         """英文名转中文名"""
         return self.name_map.get(ename, ename)
 
-    def match(self, screenshot: np.ndarray, threshold: float = 0.6) -> list[tuple[str, float]]:
+    def _cache_key(self, method: str, screenshot: np.ndarray, threshold: float) -> tuple:
+        """结果缓存键：截图指纹 + 阈值 + 影响结果的匹配参数"""
+        return (method, fingerprint(screenshot), threshold, self.engine, self.mode, self.use_mask,
+                self.auto_scale, self.scales,
+                self.coarse_to_fine, self.coarse_factor, self.coarse_peaks,
+                self.shortlist_k, self.shortlist_margin, self.certain_score,
+                self.certain_margin, self.bound_slack, self.track, self.classify)
+
+    def cache_info(self) -> dict[str, int]:
+        """返回结果缓存的命中/未命中次数"""
+        return self.result_cache.info()
+
+    def memory_bytes(self) -> int:
+        """模板及其派生数据（缩放级别、掩码、粗匹配模板、索引）占用的字节数估计"""
+        arrays = list(self.template_cache.values())
+        arrays += [img for levels in self.template_pyramid.values() for _, img in levels]
+        arrays += [m for masks in self.mask_pyramid.values() for m in masks if m is not None]
+        arrays += [c for levels in self.coarse_pyramid.values() for c in levels if c is not None]
+        arrays += [a for a in (self.descriptor_index, self._classify_templates, self._classify_masks)
+                   if a is not None]
+        return sum(a.nbytes for a in arrays)
+
+    def match(self, screenshot: np.ndarray, threshold: float = 0.6,
+              should_cancel: Optional[Callable[[], bool]] = None) -> list[tuple[str, float]]:
         """
         将截图与所有参考图进行模板匹配
 
         Args:
             screenshot: 用户截图（OpenCV图像）
             threshold: 匹配置信度阈值，默认0.6
+            should_cancel: 可选的取消检查函数，每个模板匹配前调用，返回 True 时抛出 MatchCancelled
 
         Returns:
             按置信度排序的结果列表 [(门派中文名, 置信度), ...]
+            启用 track 且在上次位置附近命中时，只返回该结果
+            相同截图、阈值和参数的结果直接从缓存返回
         """
-        results = []
+        with metrics.span("match", engine=self.engine):
+            key = self._cache_key("match", screenshot, threshold)
+            cached = self.result_cache.get(key)
+            if cached is not None:
+                metrics.count("match_cache_hits")
+                return list(cached)
+            with self._lock:
+                self._should_cancel = should_cancel
+                try:
+                    results = self._match(screenshot, threshold)
+                finally:
+                    self._should_cancel = None
+                self.result_cache.put(key, tuple(results))
+            return results
 
-        for ename, template in self.template_cache.items():
-            try:
-                # 尝试多种缩放比例找最佳匹配
-                best_score = 0
-                for scale in [0.8, 0.9, 1.0, 1.1, 1.2]:
-                    h, w = template.shape[:2]
-                    resized = cv2.resize(template, (int(w * scale), int(h * scale)))
+    def _match(self, screenshot: np.ndarray, threshold: float) -> list[tuple[str, float]]:
+        # 截图每次识别只预处理一次；颜色直方图筛选仍使用原图
+        with metrics.span("match.prepare"):
+            image = preprocess(screenshot, self.mode)
 
-                    # 模板匹配
-                    res = cv2.matchTemplate(screenshot, resized, cv2.TM_CCOEFF_NORMED)
-                    _, max_val, _, _ = cv2.minMaxLoc(res)
+        # 紧贴图标的小截图直接整图分类
+        if self.classify:
+            with metrics.span("match.classify"):
+                ranked = self._classify(image, threshold)
+            if ranked is not None and ranked[0][1] >= threshold:
+                return [(self._to_chinese(ename), round(score, 3)) for ename, score in ranked if score >= threshold]
 
-                    if max_val > best_score:
-                        best_score = max_val
+        reused = False
+        if self.auto_scale:
+            _, image, reused = self._apply_scale(screenshot, image)
 
-                if best_score >= threshold:
-                    cname = self._to_chinese(ename)
-                    results.append((cname, round(best_score, 3)))
+        if self.track:
+            with metrics.span("match.track"):
+                tracked = self._track_search(image)
+            if tracked is not None and tracked[1] >= threshold:
+                if self._scale_outdated(reused, tracked[1]):
+                    return self._match(screenshot, threshold)
+                return [(self._to_chinese(tracked[0]), round(tracked[1], 3))]
 
-            except cv2.error:
-                continue
+        with metrics.span("match.prepare"):
+            small = self._coarse_screenshot(image)
+            shortlist = self._shortlist(screenshot)
+        candidates, rest = shortlist if shortlist else (list(self.template_pyramid), [])
+
+        hits = self._score_templates(candidates, image, small)
+
+        # 候选中没有足够确定的结果，退回到完整匹配
+        if rest and max((h[0] for h in hits.values()), default=0) < threshold + self.shortlist_margin:
+            hits.update(self._score_templates(rest, image, small))
+
+        if self._scale_outdated(reused, max((h[0] for h in hits.values()), default=0.0)):
+            return self._match(screenshot, threshold)
+
+        self._remember(hits, threshold)
+        results = [(self._to_chinese(ename), round(score, 3))
+                   for ename, (score, _, _) in hits.items() if score >= threshold]
+        if self.auto_scale and not results:
+            self.reset_scale()  # 沿用的估计可能已过时（界面缩放被调整），下次重新估计
 
         # 按置信度降序排列
         results.sort(key=lambda x: x[1], reverse=True)
         return results
 
-    def match_best(self, screenshot: np.ndarray, threshold: float = 0.6) -> Optional[tuple[str, float]]:
-        """返回置信度最高的匹配结果"""
-        results = self.match(screenshot, threshold)
-        return results[0] if results else None
+    def match_best(self, screenshot: np.ndarray, threshold: float = 0.6,
+                   should_cancel: Optional[Callable[[], bool]] = None) -> Optional[tuple[str, float]]:
+        """
+        返回置信度最高的匹配结果（should_cancel 的含义同 match）
+        只关心第一名，因此按颜色相似度从高到低依次匹配，并提前结束：
+        - 某模板已测级别的最高分 + bound_slack 追不上当前第一时，跳过它剩下的缩放级别
+        - 第一名达到 certain_score 且领先第二名 certain_margin 时，不再匹配其余模板
+        """
+        with metrics.span("match_best", engine=self.engine):
+            key = self._cache_key("best", screenshot, threshold)
+            cached = self.result_cache.get(key)
+            if cached is not None:
+                metrics.count("match_cache_hits")
+                return cached or None
+            with self._lock:
+                self._should_cancel = should_cancel
+                try:
+                    result = self._match_best(screenshot, threshold)
+                finally:
+                    self._should_cancel = None
+                self.result_cache.put(key, result or ())
+            return result
+
+    def _match_best(self, screenshot: np.ndarray, threshold: float) -> Optional[tuple[str, float]]:
+        if self.engine != "opencv":
+            results = self._match(screenshot, threshold)
+            return results[0] if results else None
+
+        image = preprocess(screenshot, self.mode)
+        if self.classify:
+            # 提前结束的逐个匹配本身已经很快，这里只试整图打分
+            ranked = self._classify(image, insets=False)  # 只需第一名
+            if ranked is not None and ranked[0][1] >= threshold:
+                return self._to_chinese(ranked[0][0]), round(ranked[0][1], 3)
+        reused = False
+        if self.auto_scale:
+            _, image, reused = self._apply_scale(screenshot, image)
+        if self.track:
+            tracked = self._track_search(image)
+            if tracked is not None and tracked[1] >= threshold:
+                if self._scale_outdated(reused, tracked[1]):
+                    return self._match_best(screenshot, threshold)
+                return self._to_chinese(tracked[0]), round(tracked[1], 3)
+
+        small = self._coarse_screenshot(image)
+        best_name, best_hit, runner_up = None, (0.0, 0, (0, 0)), 0.0
+
+        for ename in self._rank_templates(screenshot):
+            self._check_cancelled()
+            levels = self.template_pyramid[ename]
+            # 从最接近原始大小的级别向两侧展开
+            order = sorted(range(len(levels)), key=lambda i: abs(levels[i][0] - 1.0))
+            hit = (0.0, 0, (0, 0))
+            try:
+                for i in order:
+                    score, loc = self._score_level(ename, i, image, small)
+                    if score > hit[0]:
+                        hit = (score, i, loc)
+                    if hit[0] + self.bound_slack < best_hit[0]:
+                        break
+            except cv2.error:
+                continue
+
+            if hit[0] > best_hit[0]:
+                best_name, runner_up, best_hit = ename, best_hit[0], hit
+            elif hit[0] > runner_up:
+                runner_up = hit[0]
+
+            if best_hit[0] >= self.certain_score and best_hit[0] - runner_up >= self.certain_margin:
+                break
+
+        if self._scale_outdated(reused, best_hit[0]):
+            return self._match_best(screenshot, threshold)
+
+        self._remember({best_name: best_hit} if best_name else {}, threshold)
+        if best_name is None or best_hit[0] < threshold:
+            if self.auto_scale:
+                self.reset_scale()
+            return None
+        return self._to_chinese(best_name), round(best_hit[0], 3)
+
+    def detect(self, screenshot: np.ndarray, threshold: float = 0.8,
+               iou_threshold: float = 0.3) -> list[Detection]:
+        """
+        找出截图中所有置信度不低于 threshold 的图标实例（如整个团队面板）
+
+        每个模板的每个缩放级别在响应图上提取全部局部峰值，
+        再在所有模板、所有缩放级别的候选框之间做非极大值抑制，同一位置只保留得分最高的门派
+
+        Args:
+            screenshot: 用户截图（OpenCV图像）
+            threshold: 置信度阈值，默认0.8
+            iou_threshold: 候选框重叠度（IoU）超过该值时只保留得分高的
+
+        Returns:
+            按置信度降序的 [(门派中文名, 置信度, x, y, 缩放比例), ...]，x、y 为图标左上角坐标
+        """
+        with metrics.span("detect", engine=self.engine):
+            key = self._cache_key("detect", screenshot, threshold) + (iou_threshold,)
+            cached = self.result_cache.get(key)
+            if cached is not None:
+                metrics.count("match_cache_hits")
+                return list(cached)
+            with self._lock:
+                results = self._detect(screenshot, threshold, iou_threshold)
+                self.result_cache.put(key, tuple(results))
+            return results
+
+    def _detect(self, screenshot: np.ndarray, threshold: float,
+                iou_threshold: float) -> list[Detection]:
+        image = preprocess(screenshot, self.mode)
+        factor, reused = 1.0, False
+        if self.auto_scale:
+            factor, image, reused = self._apply_scale(screenshot, image)
+        # fft 引擎只计算每个模板的最大值，多目标检测统一走 matchTemplate
+        small = None
+        if self.coarse_to_fine and min(image.shape[:2]) >= COARSE_MIN_SIDE:
+            h, w = image.shape[:2]
+            size = (int(round(w * self.coarse_factor)), int(round(h * self.coarse_factor)))
+            small = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+        jobs = [(ename, i) for ename, levels in self.template_pyramid.items() for i in range(len(levels))]
+        if self._pool is not None:
+            detect_level = metrics.propagate(self._detect_level)
+            futures = [self._pool.submit(detect_level, ename, i, image, small, threshold)
+                       for ename, i in jobs]
+            level_results = [f.result() for f in futures]
+        else:
+            level_results = [self._detect_level(ename, i, image, small, threshold) for ename, i in jobs]
+
+        candidates = [c for found in level_results for c in found]
+        # 只有达到阈值的候选会被保留，没有候选时按 0 分处理
+        if self._scale_outdated(reused, max((c[1] for c in candidates), default=0.0)):
+            return self._detect(screenshot, threshold, iou_threshold)
+        if not candidates:
+            return []
+        boxes = np.array([c[2:6] for c in candidates], dtype=np.float32)
+        scores = np.array([c[1] for c in candidates], dtype=np.float32)
+        detections = []
+        for k in nms(boxes, scores, iou_threshold):
+            ename, score, x, y, _, _, scale = candidates[k]
+            # 自动缩放时坐标换算回原截图
+            detections.append((self._to_chinese(ename), round(score, 3), int(round(x * factor)),
+                               int(round(y * factor)), round(scale * factor, 3)))
+        return detections
+
+    def _detect_level(self, ename: str, i: int, image: np.ndarray, small: Optional[np.ndarray],
+                      threshold: float) -> list[tuple[str, float, int, int, int, int, float]]:
+        """
+        单个模板单个缩放级别的全部候选 [(英文名, 分数, x, y, 宽, 高, 缩放比例), ...]
+        大截图先在缩小图上以放宽的阈值找候选，再在候选附近全分辨率确认
+        """
+        self._check_cancelled()
+        scale, template = self.template_pyramid[ename][i]
+        mask = self._level_mask(ename, i)
+        th, tw = template.shape[:2]
+        sh, sw = image.shape[:2]
+        if th > sh or tw > sw:
+            return []
+
+        found = []
+        with metrics.span("detect.level", f"{scale:.2f}", template=ename):
+            coarse_levels = self.coarse_pyramid.get(ename)
+            coarse = coarse_levels[i] if small is not None and coarse_levels else None
+            if coarse is None:
+                xs, ys, scores = find_peaks(_response(image, template, mask), threshold,
+                                            tw, th, DETECT_MAX_PEAKS)
+                for x, y, score in zip(xs, ys, scores):
+                    found.append((ename, float(score), int(x), int(y), tw, th, scale))
+                return found
+
+            f = self.coarse_factor
+            ch, cw = coarse.shape[:2]
+            xs, ys, _ = find_peaks(cv2.matchTemplate(small, coarse, cv2.TM_CCOEFF_NORMED),
+                                   threshold - DETECT_COARSE_SLACK, cw, ch, DETECT_MAX_PEAKS)
+            margin = int(np.ceil(2 / f))
+            for cx, cy in zip(xs, ys):
+                x, y = int(cx / f), int(cy / f)
+                x0, y0 = max(0, x - margin), max(0, y - margin)
+                window = image[y0:min(sh, y + th + margin), x0:min(sw, x + tw + margin)]
+                if window.shape[0] < th or window.shape[1] < tw:
+                    continue
+                score, loc = _correlate(window, template, mask)
+                if score >= threshold:
+                    found.append((ename, float(score), x0 + loc[0], y0 + loc[1], tw, th, scale))
+        return found
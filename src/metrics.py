@@ -0,0 +1,238 @@
+"""
+耗时统计模块
+可选开启的分段计时：命名区段（span）按名称汇总为直方图，每次识别的区段明细组成一条 trace
+未开启时 span() 直接返回空对象，几乎没有开销
+
+导出:
+- trace: 每次识别一行 JSON（JSONL 文件）
+- 汇总: Prometheus 文本格式的直方图与计数器文件
+"""
+import contextvars
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+# 直方图分桶上界（秒）
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar(
+    "current_trace", default=None)
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+
+
+class Trace:
+    """一次识别的区段明细"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.total_ms = 0.0
+        self.spans: list[dict] = []
+
+    def add(self, name: str, ms: float, label: Optional[str], detail: dict):
+        entry = {"span": name, "ms": round(ms, 3)}
+        if label is not None:
+            entry["label"] = label
+        entry.update(detail)
+        self.spans.append(entry)  # list.append 是原子操作，线程池中的区段可直接追加
+
+    def stage_ms(self, name: str) -> float:
+        """某个区段名的累计耗时（毫秒）"""
+        return sum(s["ms"] for s in self.spans if s["span"] == name)
+
+    def to_dict(self) -> dict:
+        return {"trace": self.name, "time": round(self.started_at, 3),
+                "total_ms": round(self.total_ms, 3), "spans": self.spans}
+
+
+class _Span:
+    __slots__ = ("metrics", "name", "label", "detail", "t0")
+
+    def __init__(self, metrics: "Metrics", name: str, label: Optional[str], detail: dict):
+        self.metrics = metrics
+        self.name = name
+        self.label = label
+        self.detail = detail
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.t0
+        self.metrics.observe(self.name, elapsed, self.label)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(self.name, elapsed * 1000, self.label, self.detail)
+        return False
+
+
+class _TraceScope:
+    def __init__(self, metrics: "Metrics", name: str):
+        self.metrics = metrics
+        self.trace = Trace(name)
+
+    def __enter__(self) -> Trace:
+        self._token = _current_trace.set(self.trace)
+        return self.trace
+
+    def __exit__(self, *exc):
+        _current_trace.reset(self._token)
+        self.trace.total_ms = (time.perf_counter() - self.trace._t0) * 1000
+        self.metrics.finish(self.trace)
+        return False
+
+
+class Metrics:
+    """
+    区段计时汇总器
+    - span(name, label=None, **detail): 计时区段，按 (name, label) 汇总到直方图，detail 只写入 trace
+    - trace(name): 一次识别的范围，结束时写出 trace 行并刷新 Prometheus 文件
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.trace_path: Optional[Path] = None
+        self.prom_path: Optional[Path] = None
+        self.last_trace: Optional[Trace] = None
+        self._histograms: dict[tuple[str, Optional[str]], Histogram] = {}
+        self._counters: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def enable(self, trace_path: Optional[Path] = None, prom_path: Optional[Path] = None):
+        self.trace_path = Path(trace_path) if trace_path else None
+        self.prom_path = Path(prom_path) if prom_path else None
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def span(self, name: str, label: Optional[str] = None, **detail):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, label, detail)
+
+    def trace(self, name: str):
+        """开启时返回 trace 范围（with 得到 Trace 对象），否则返回空对象（with 得到 None）"""
+        if not self.enabled:
+            return _NULL_TRACE
+        return _TraceScope(self, name)
+
+    def propagate(self, fn: Callable) -> Callable:
+        """让提交到线程池的函数继续记录到调用方当前的 trace 中"""
+        trace = _current_trace.get() if self.enabled else None
+        if trace is None:
+            return fn
+
+        def run(*args, **kwargs):
+            token = _current_trace.set(trace)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _current_trace.reset(token)
+        return run
+
+    def count(self, name: str, n: int = 1):
+        if self.enabled:
+            with self._lock:
+                self._counters[name] = self._counters.get(name, 0) + n
+
+    def observe(self, name: str, seconds: float, label: Optional[str] = None):
+        with self._lock:
+            hist = self._histograms.get((name, label))
+            if hist is None:
+                hist = self._histograms[(name, label)] = Histogram()
+            hist.observe(seconds)
+
+    def finish(self, trace: Trace):
+        """trace 结束：记录总耗时，追加 trace 行，刷新汇总文件"""
+        self.last_trace = trace
+        self.observe(trace.name, trace.total_ms / 1000)
+        self.count(f"{trace.name}_total")
+        try:
+            if self.trace_path:
+                line = json.dumps(trace.to_dict(), ensure_ascii=False)
+                with self._lock, open(self.trace_path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+            if self.prom_path:
+                self.write_prometheus(self.prom_path)
+        except OSError as e:
+            print(f"耗时统计写入失败: {e}")
+
+    def flush(self):
+        """立即刷新 Prometheus 汇总文件（退出前调用）"""
+        if self.enabled and self.prom_path:
+            try:
+                self.write_prometheus(self.prom_path)
+            except OSError as e:
+                print(f"耗时统计写入失败: {e}")
+
+    def render_prometheus(self) -> str:
+        """生成 Prometheus 文本格式的汇总"""
+        with self._lock:
+            histograms = {k: (list(h.counts), h.count, h.total) for k, h in self._histograms.items()}
+            counters = dict(self._counters)
+
+        lines = ["# HELP jx3_span_seconds 各区段耗时（秒）", "# TYPE jx3_span_seconds histogram"]
+        for (name, label), (counts, count, total) in sorted(histograms.items(),
+                                                            key=lambda kv: (kv[0][0], kv[0][1] or "")):
+            labels = f'span="{name}"' + (f',label="{label}"' if label is not None else "")
+            cumulative = 0
+            for bound, n in zip(BUCKETS, counts):
+                cumulative += n
+                lines.append(f'jx3_span_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'jx3_span_seconds_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f"jx3_span_seconds_sum{{{labels}}} {total:.6f}")
+            lines.append(f"jx3_span_seconds_count{{{labels}}} {count}")
+        for name, value in sorted(counters.items()):
+            lines.append(f"# TYPE jx3_{name} counter")
+            lines.append(f"jx3_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: Path):
+        path = Path(path)
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_text(self.render_prometheus(), encoding="utf-8")
+        tmp_path.replace(path)
+
+
+class _NullTrace:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TRACE = _NullTrace()
+
+# 全局实例，由入口根据命令行参数开启
+metrics = Metrics()
@@ -0,0 +1,227 @@
+"""
+常驻识别服务模块
+保持已预热的匹配器，通过本地 HTTP 接口接收截图（PNG/BMP 编码或原始像素数组），
+识别线程每次取出队列中已在等待的全部请求，其中内容相同的截图只识别一次，队列满时直接拒绝以形成背压；
+请求可用 bank 参数选择图标库，未加载的图标库在第一次被请求时加载
+"""
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+import cv2
+import numpy as np
+
+from .banks import BANKS, MatcherPool
+from .cache import fingerprint
+from .metrics import metrics
+
+
+class ServiceBusy(Exception):
+    """请求队列已满"""
+
+
+class _Request:
+    def __init__(self, img: np.ndarray, threshold: float, top_k: int, bank: Optional[str]):
+        self.img = img
+        self.threshold = threshold
+        self.top_k = top_k
+        self.bank = bank
+        self.enqueued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.result: Optional[dict] = None
+
+
+class RecognitionService:
+    """
+    请求处理器
+    单个后台线程从有界队列取请求：阻塞等待第一个，再顺带取出此时已在排队的请求（最多 max_batch 个，不额外等待），
+    其中截图、阈值和图标库都相同的请求只识别一次；不同截图的匹配之间没有可共享的计算，逐个进行
+    """
+
+    def __init__(self, pool: MatcherPool, max_queue: int = 64, max_batch: int = 16):
+        self.pool = pool
+        self.max_batch = max(1, max_batch)
+        self._queue: queue.Queue[_Request] = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+    def start(self):
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="recognizer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def submit(self, img: np.ndarray, threshold: float = 0.5, top_k: int = 5,
+               timeout: float = 30, bank: Optional[str] = None) -> dict:
+        """提交一张截图并等待结果（bank 为空时使用默认图标库），队列已满时抛出 ServiceBusy"""
+        req = _Request(img, threshold, top_k, bank)
+        try:
+            self._queue.put_nowait(req)
+        except queue.Full:
+            raise ServiceBusy("识别队列已满")
+        if not req.done.wait(timeout):
+            raise TimeoutError("识别超时")
+        return req.result
+
+    def _collect(self) -> list[_Request]:
+        """阻塞等待第一个请求，再取出已在队列中的请求，不为凑批等待"""
+        try:
+            batch = [self._queue.get(timeout=0.2)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while self._running:
+            batch = self._collect()
+            if not batch:
+                continue
+            started = time.perf_counter()
+            # 同时排队的请求中，相同截图 + 相同阈值 + 相同图标库只识别一次
+            computed: dict[tuple[str, float, Optional[str]], tuple[list, float]] = {}
+            for req in batch:
+                key = (fingerprint(req.img), req.threshold, req.bank)
+                try:
+                    if key not in computed:
+                        t0 = time.perf_counter()
+                        with metrics.trace("serve"):
+                            results = self.pool.match(req.img, threshold=req.threshold, bank=req.bank)
+                        computed[key] = (results, time.perf_counter() - t0)
+                    results, match_time = computed[key]
+                    req.result = {
+                        "results": [[name, score] for name, score in results[:req.top_k]],
+                        "queue_ms": round((started - req.enqueued_at) * 1000, 2),
+                        "match_ms": round(match_time * 1000, 2),
+                        "batch_size": len(batch),
+                    }
+                except Exception as e:
+                    req.result = {"error": str(e)}
+                req.result["total_ms"] = round((time.perf_counter() - req.enqueued_at) * 1000, 2)
+                req.done.set()
+
+
+def decode_body(body: bytes, content_type: str, params: dict[str, str]) -> np.ndarray:
+    """
+    解析请求体中的图片
+    - image/png、image/bmp 等：编码后的图片文件
+    - application/octet-stream：原始 BGR/BGRA/灰度像素，需通过 shape=高x宽[x通道] 参数给出尺寸
+    """
+    if content_type.startswith("application/octet-stream"):
+        if "shape" not in params:
+            raise ValueError("原始像素数据需要 shape 参数，如 shape=48x48x3")
+        shape = tuple(int(v) for v in params["shape"].lower().split("x"))
+        if len(shape) not in (2, 3) or min(shape) <= 0:
+            raise ValueError(f"shape 应为 高x宽 或 高x宽x通道: {params['shape']}")
+        if len(shape) == 3 and shape[2] not in (1, 3, 4):
+            raise ValueError(f"不支持 {shape[2]} 通道的像素数据，应为 1、3 或 4 通道")
+        img = np.frombuffer(body, dtype=np.uint8)
+        if img.size != int(np.prod(shape)):
+            raise ValueError(f"数据长度 {img.size} 与 shape {shape} 不符")
+        img = img.reshape(shape)
+        if img.ndim == 3 and img.shape[2] == 4:
+            img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
+        elif img.ndim == 2 or img.shape[2] == 1:
+            img = cv2.cvtColor(img.reshape(shape[:2]), cv2.COLOR_GRAY2BGR)
+        return img
+
+    img = cv2.imdecode(np.frombuffer(body, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("无法解码图片")
+    return img
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "JX3Detector"
+
+    def _send_json(self, status: int, payload: dict, headers: Optional[dict] = None):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/health":
+            # 只报告已加载的图标库，不触发加载或淘汰
+            pool = self.server.service.pool
+            try:
+                self._send_json(200, {"status": "ok", "default_bank": pool.default_bank,
+                                      "banks": pool.loaded(),
+                                      "memory_mb": round(pool.memory_bytes() / (1024 * 1024), 2)})
+            except Exception as e:
+                self._send_json(500, {"status": "error", "error": str(e)})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/match":
+            self._send_json(404, {"error": "not found"})
+            return
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            img = decode_body(self.rfile.read(length), self.headers.get("Content-Type", ""), params)
+            threshold = float(params.get("threshold", 0.5))
+            top_k = int(params.get("top_k", 5))
+            bank = params.get("bank")
+            if bank is not None and bank not in BANKS:
+                raise ValueError(f"未知的图标库: {bank}，可选: {', '.join(BANKS)}")
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+
+        try:
+            result = self.server.service.submit(img, threshold, top_k, bank=bank)
+        except ServiceBusy as e:
+            self._send_json(503, {"error": str(e)}, {"Retry-After": "1"})
+            return
+        except TimeoutError as e:
+            self._send_json(504, {"error": str(e)})
+            return
+        self._send_json(500 if "error" in result else 200, result)
+
+    def log_message(self, format, *args):
+        pass  # 不逐条打印访问日志
+
+
+def make_server(service: RecognitionService, host: str = "127.0.0.1",
+                port: int = 8765) -> ThreadingHTTPServer:
+    """创建 HTTP 服务（尚未开始监听循环）"""
+    httpd = ThreadingHTTPServer((host, port), _Handler)
+    httpd.daemon_threads = True
+    httpd.service = service
+    return httpd
+
+
+def serve(pool: MatcherPool, host: str = "127.0.0.1", port: int = 8765, **options):
+    """启动识别服务并阻塞运行，Ctrl+C 退出"""
+    service = RecognitionService(pool, **options)
+    service.start()
+    httpd = make_server(service, host, port)
+    print(f"✅ 识别服务已启动: http://{host}:{httpd.server_address[1]}/match")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 退出")
+    finally:
+        httpd.server_close()
+        service.stop()
@@ -0,0 +1,342 @@
+"""
+连续帧识别模块
+从可替换的帧来源（屏幕区域、视频文件、图片目录）持续取帧，
+只把关注区域（ROI）内画面有变化的帧送去识别：
+- 变化检测：ROI（裁剪到画面范围内）缩小为灰度缩略图，与上一次送出识别的帧逐格比较
+- 读帧与识别分处两个线程，中间只有一个帧的槽位；识别跟不上时丢弃较旧的帧，不排队
+"""
+import abc
+import json
+import queue
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Iterator, Optional, TextIO
+
+import cv2
+import numpy as np
+
+from .matcher import IconMatcher
+from .metrics import metrics
+
+# 变化检测缩略图边长与默认阈值（缩略图单格灰度差，0~255）
+THUMB_SIZE = 32
+DEFAULT_DIFF_THRESHOLD = 12.0
+
+Region = tuple[int, int, int, int]  # (x, y, 宽, 高)
+
+
+class Frame:
+    def __init__(self, index: int, timestamp: float, image: np.ndarray):
+        self.index = index
+        self.timestamp = timestamp  # 帧在来源中的时间（秒）
+        self.image = image
+        self.captured = time.perf_counter()
+
+
+class FrameSource(abc.ABC):
+    """帧来源基类，frames() 逐个产出 Frame，来源耗尽时结束"""
+
+    # 预先知道的画面尺寸 (宽, 高)，用于在取帧前检查 ROI；未知时为 None
+    size: Optional[tuple[int, int]] = None
+
+    @abc.abstractmethod
+    def frames(self) -> Iterator[Frame]:
+        """逐个产出帧"""
+
+    def close(self):
+        pass
+
+
+class VideoSource(FrameSource):
+    """
+    视频文件
+    realtime 为 True 时按视频帧率取帧（模拟实时画面），否则尽快读取
+    """
+
+    def __init__(self, path: Path, realtime: bool = True):
+        self.path = Path(path)
+        self.realtime = realtime
+        self._cap = cv2.VideoCapture(str(self.path))
+        if not self._cap.isOpened():
+            raise ValueError(f"无法打开视频: {self.path}")
+        self.fps = self._cap.get(cv2.CAP_PROP_FPS) or 30.0
+        w, h = int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        if w > 0 and h > 0:
+            self.size = (w, h)
+
+    def frames(self) -> Iterator[Frame]:
+        start = time.perf_counter()
+        index = 0
+        while True:
+            ok, image = self._cap.read()
+            if not ok:
+                return
+            timestamp = index / self.fps
+            if self.realtime:
+                delay = start + timestamp - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            yield Frame(index, timestamp, image)
+            index += 1
+
+    def close(self):
+        self._cap.release()
+
+
+class DirectorySource(FrameSource):
+    """图片目录（按文件名排序），fps 不为空时按该帧率取帧"""
+
+    def __init__(self, path: Path, fps: Optional[float] = None):
+        from .batch import iter_image_paths
+
+        self.paths = list(iter_image_paths([str(path)]))
+        self.fps = fps
+
+    def frames(self) -> Iterator[Frame]:
+        start = time.perf_counter()
+        for index, path in enumerate(self.paths):
+            timestamp = index / self.fps if self.fps else time.perf_counter() - start
+            if self.fps:
+                delay = start + timestamp - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            # 用 imdecode 读取，兼容 Windows 下的中文路径
+            image = cv2.imdecode(np.fromfile(str(path), dtype=np.uint8), cv2.IMREAD_COLOR)
+            if image is not None:
+                yield Frame(index, timestamp, image)
+
+
+class ScreenSource(FrameSource):
+    """屏幕区域截图（PIL.ImageGrab），region 为空时截取整个主屏幕"""
+
+    def __init__(self, region: Optional[Region] = None, fps: float = 10.0):
+        from PIL import ImageGrab
+
+        self._grab = ImageGrab.grab
+        self.region = region
+        self.fps = fps
+        if region:
+            self.size = region[2:]
+
+    def frames(self) -> Iterator[Frame]:
+        bbox = None
+        if self.region:
+            x, y, w, h = self.region
+            bbox = (x, y, x + w, y + h)
+        interval = 1.0 / self.fps
+        start = time.perf_counter()
+        index = 0
+        while True:
+            due = start + index * interval
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            rgb = np.asarray(self._grab(bbox=bbox).convert("RGB"))
+            yield Frame(index, time.perf_counter() - start, cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR))
+            index += 1
+
+
+def open_source(spec: str, fps: Optional[float] = None, realtime: bool = True) -> FrameSource:
+    """
+    由命令行参数创建帧来源
+    - "screen" 或 "screen:x,y,宽,高": 屏幕（区域）
+    - 目录: 目录中的图片
+    - 其他: 视频文件
+    """
+    if spec == "screen" or spec.startswith("screen:"):
+        region = parse_region(spec.split(":", 1)[1]) if ":" in spec else None
+        return ScreenSource(region, fps or 10.0)
+    path = Path(spec)
+    if path.is_dir():
+        return DirectorySource(path, fps)
+    return VideoSource(path, realtime)
+
+
+def parse_region(text: str) -> Region:
+    """解析 "x,y,宽,高" 格式的区域"""
+    try:
+        x, y, w, h = (int(v) for v in text.split(","))
+    except ValueError:
+        raise ValueError(f"区域格式应为 x,y,宽,高: {text}") from None
+    if w <= 0 or h <= 0:
+        raise ValueError(f"区域宽高必须为正数: {text}")
+    return x, y, w, h
+
+
+class ChangeDetector:
+    """
+    ROI 画面变化检测
+    ROI 缩小为 THUMB_SIZE 见方的灰度缩略图（每格为区域平均，对噪声和压缩伪影不敏感），
+    任意一格与上一次判定为变化的帧相差超过阈值即为变化，只占 ROI 一小块的图标出现也能检测到；
+    缓慢的渐变累积到阈值后同样会被判定为变化
+    """
+
+    def __init__(self, roi: Optional[Region] = None, threshold: float = DEFAULT_DIFF_THRESHOLD):
+        self.roi = roi
+        self.threshold = threshold
+        self._last: Optional[np.ndarray] = None
+
+    def region(self, width: int, height: int) -> Optional[Region]:
+        """ROI 裁剪到 width×height 画面内的 (x, y, 宽, 高)；未设置 ROI 时为整个画面，与画面不重叠时为 None"""
+        if self.roi is None:
+            return (0, 0, width, height) if width > 0 and height > 0 else None
+        x, y, w, h = self.roi
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(width, x + w), min(height, y + h)
+        if x1 <= x0 or y1 <= y0:
+            return None
+        return x0, y0, x1 - x0, y1 - y0
+
+    def validate(self, width: int, height: int):
+        """ROI 与 width×height 的画面完全不重叠时抛出 ValueError"""
+        if self.roi is not None and self.region(width, height) is None:
+            x, y, w, h = self.roi
+            raise ValueError(f"关注区域 {x},{y},{w},{h} 不在 {width}x{height} 的画面内")
+
+    def crop(self, image: np.ndarray) -> Optional[np.ndarray]:
+        """取出画面中的 ROI（超出画面的部分被裁掉），与画面不重叠时返回 None"""
+        region = self.region(image.shape[1], image.shape[0])
+        if region is None:
+            return None
+        x, y, w, h = region
+        return image[y:y + h, x:x + w]
+
+    def changed(self, image: np.ndarray) -> bool:
+        """ROI 画面是否变化；ROI 不在这一帧画面内时视为未变化"""
+        region = self.crop(image)
+        if region is None:
+            return False
+        if region.ndim == 3:
+            region = cv2.cvtColor(region, cv2.COLOR_BGR2GRAY)
+        thumb = cv2.resize(region, (THUMB_SIZE, THUMB_SIZE), interpolation=cv2.INTER_AREA)
+        if self._last is not None and cv2.norm(thumb, self._last, cv2.NORM_INF) < self.threshold:
+            return False
+        self._last = thumb
+        return True
+
+    def reset(self):
+        self._last = None
+
+
+class FrameStream:
+    """
+    连续帧识别
+    读帧线程做变化检测，有变化的帧放入单帧槽位；识别线程从槽位取帧识别，
+    槽位中尚未开始识别的旧帧会被新帧替换（计为丢弃），识别耗时不会让帧堆积
+    ROI 与画面（来源给出的尺寸或第一帧）完全不重叠时抛出 ValueError
+    """
+
+    def __init__(self, matcher: IconMatcher, source: FrameSource,
+                 on_result: Callable[[dict], None], threshold: float = 0.5,
+                 roi: Optional[Region] = None, diff_threshold: float = DEFAULT_DIFF_THRESHOLD,
+                 detect: bool = False, top_k: int = 5):
+        self.matcher = matcher
+        self.source = source
+        self.on_result = on_result
+        self.threshold = threshold
+        self.detector = ChangeDetector(roi, diff_threshold)
+        if source.size is not None:
+            self.detector.validate(*source.size)
+        self.detect = detect
+        self.top_k = top_k
+        self.stats = {"frames": 0, "unchanged": 0, "dropped": 0, "recognized": 0}
+        self._slot: queue.Queue[Optional[Frame]] = queue.Queue(maxsize=1)
+        self._stop = threading.Event()
+
+    def run(self) -> dict:
+        """阻塞运行到来源耗尽或 stop() 被调用，返回帧计数统计"""
+        consumer = threading.Thread(target=self._recognize_loop, name="stream-recognizer", daemon=True)
+        consumer.start()
+        try:
+            for frame in self.source.frames():
+                if self._stop.is_set():
+                    break
+                self._offer(frame)
+        finally:
+            self.source.close()
+            self._slot.put(None)  # 来源结束：等槽位中的最后一帧被取走后再放入结束标记
+            consumer.join()
+        return dict(self.stats)
+
+    def stop(self):
+        self._stop.set()
+
+    def _offer(self, frame: Frame):
+        if self.stats["frames"] == 0:
+            self.detector.validate(frame.image.shape[1], frame.image.shape[0])
+        self.stats["frames"] += 1
+        metrics.count("stream_frames")
+        with metrics.span("stream.diff"):
+            changed = self.detector.changed(frame.image)
+        if not changed:
+            self.stats["unchanged"] += 1
+            metrics.count("stream_unchanged")
+            return
+        self._put_latest(frame)
+
+    def _put_latest(self, frame: Frame):
+        """放入槽位，槽位中尚未被取走的旧帧被替换丢弃"""
+        while True:
+            try:
+                self._slot.put_nowait(frame)
+                return
+            except queue.Full:
+                try:
+                    self._slot.get_nowait()
+                except queue.Empty:
+                    continue  # 旧帧刚被识别线程取走
+                self.stats["dropped"] += 1
+                metrics.count("stream_dropped")
+
+    def _recognize_loop(self):
+        while True:
+            frame = self._slot.get()
+            if frame is None:
+                return
+            started = time.perf_counter()
+            record = {"frame": frame.index, "time": round(frame.timestamp, 3)}
+            try:
+                with metrics.trace("stream"):
+                    image = self.detector.crop(frame.image)
+                    if self.detect:
+                        detections = self.matcher.detect(image, threshold=self.threshold)
+                        # 坐标换算回整帧
+                        ox, oy = self.detector.region(frame.image.shape[1], frame.image.shape[0])[:2]
+                        record["detections"] = [[name, score, x + ox, y + oy, scale]
+                                                for name, score, x, y, scale in detections]
+                    else:
+                        results = self.matcher.match(image, threshold=self.threshold)
+                        record["results"] = [[name, score] for name, score in results[:self.top_k]]
+            except Exception as e:
+                record["error"] = str(e)
+            finished = time.perf_counter()
+            record["queue_ms"] = round((started - frame.captured) * 1000, 2)
+            record["match_ms"] = round((finished - started) * 1000, 2)
+            self.stats["recognized"] += 1
+            self.on_result(record)
+
+
+def run_stream(matcher: IconMatcher, source: FrameSource, out: TextIO,
+               log: TextIO = sys.stderr, **kwargs) -> dict:
+    """
+    连续帧识别入口：每个识别过的帧写一行 JSON 到 out，结束时把帧计数写入 log
+    kwargs 传给 FrameStream
+    """
+    def write(record: dict):
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+
+    try:
+        stream = FrameStream(matcher, source, write, **kwargs)
+    except ValueError:
+        source.close()
+        raise
+    try:
+        stats = stream.run()
+    except KeyboardInterrupt:
+        stats = dict(stream.stats)
+    print(f"\n📊 共 {stats['frames']} 帧，画面未变化 {stats['unchanged']} 帧，"
+          f"识别不及丢弃 {stats['dropped']} 帧，识别 {stats['recognized']} 帧", file=log)
+    return stats
@@ -0,0 +1,78 @@
+"""
+图标目录监视模块
+轮询 assets/ 中 PNG 与名称映射的修改时间，发现变化时只热更新变化的模板
+（轮询实现，不依赖额外的文件系统事件库）
+"""
+import threading
+from pathlib import Path
+from typing import Callable, Optional
+
+from .matcher import IconMatcher
+
+
+def snapshot(assets_dir: Path) -> dict[str, tuple[int, int]]:
+    """返回 {文件名: (mtime_ns, 大小)}，包含全部 PNG 与 name_map.json"""
+    files = list(Path(assets_dir).glob("*.png"))
+    map_path = Path(assets_dir) / "name_map.json"
+    if map_path.exists():
+        files.append(map_path)
+    result = {}
+    for path in files:
+        try:
+            st = path.stat()
+        except OSError:
+            continue  # 扫描过程中被删除
+        result[path.name] = (st.st_mtime_ns, st.st_size)
+    return result
+
+
+class AssetWatcher:
+    def __init__(self, matcher: IconMatcher, interval: float = 2.0,
+                 on_reload: Optional[Callable[[list[str]], None]] = None):
+        """
+        Args:
+            matcher: 需要热更新的匹配器
+            interval: 轮询间隔（秒）
+            on_reload: 热更新完成后的回调，参数为变化的模板英文名列表
+        """
+        self.matcher = matcher
+        self.interval = interval
+        self.on_reload = on_reload
+        self._state = snapshot(matcher.assets_dir)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="asset-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+
+    def check(self) -> list[str]:
+        """对比上次扫描结果，热更新变化的模板，返回变化的英文名列表"""
+        current = snapshot(self.matcher.assets_dir)
+        changed = {name for name in current.keys() | self._state.keys()
+                    if current.get(name) != self._state.get(name)}
+        if not changed:
+            return []
+        self._state = current
+
+        names = sorted(Path(name).stem for name in changed if name.endswith(".png"))
+        # 只有名称映射变化时也需要刷新（reload_entries 会重新读取映射）
+        self.matcher.reload_entries(names)
+        if self.on_reload:
+            self.on_reload(names)
+        return names
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"图标热更新失败: {e}")
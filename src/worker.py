@@ -0,0 +1,122 @@
+"""
+后台识别模块
+界面线程只提交截图和取回结果，识别在单独的线程中进行：
+- 待识别的截图只保留最新一张，连续按键时旧截图直接丢弃
+- 有新截图到来时，正在进行的旧识别会被取消
+- 只需要第一名时（best_only）改用提前结束的 IconMatcher.match_best
+"""
+import queue
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+from .matcher import IconMatcher, MatchCancelled
+from .metrics import metrics
+
+
+class RecognitionResult:
+    def __init__(self, generation: int, results: list[tuple[str, float]],
+                 queue_ms: float, match_ms: float, error: Optional[str] = None):
+        self.generation = generation
+        self.results = results
+        self.queue_ms = queue_ms
+        self.match_ms = match_ms
+        self.error = error
+
+
+class RecognitionWorker:
+    def __init__(self, matcher: IconMatcher, threshold: float = 0.5, best_only: bool = False):
+        """
+        Args:
+            matcher: 匹配器
+            threshold: 匹配置信度阈值
+            best_only: 只识别置信度最高的一个结果（match_best），结果列表最多一项
+        """
+        self.matcher = matcher
+        self.threshold = threshold
+        self.best_only = best_only
+        self._cond = threading.Condition()
+        self._pending: Optional[tuple[int, np.ndarray, float]] = None  # (编号, 截图, 提交时间)
+        self._generation = 0
+        self._results: queue.Queue[RecognitionResult] = queue.Queue()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="gui-recognizer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._generation += 1  # 让正在进行的识别尽快结束
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def submit(self, img: np.ndarray) -> int:
+        """提交截图（可在任意线程调用），替换尚未开始的旧截图，返回本次提交的编号"""
+        with self._cond:
+            self._generation += 1
+            self._pending = (self._generation, img, time.perf_counter())
+            self._cond.notify()
+            return self._generation
+
+    def cancel(self):
+        """放弃尚未开始和正在进行的识别"""
+        with self._cond:
+            self._generation += 1
+            self._pending = None
+
+    def is_current(self, generation: int) -> bool:
+        return generation == self._generation
+
+    def poll(self) -> Optional[RecognitionResult]:
+        """取出最新一次提交的结果（非阻塞），过期结果直接丢弃"""
+        latest = None
+        while True:
+            try:
+                result = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if self.is_current(result.generation):
+                latest = result
+        return latest
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and self._pending is None:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                generation, img, submitted = self._pending
+                self._pending = None
+
+            started = time.perf_counter()
+            should_cancel = lambda: not self.is_current(generation)
+            try:
+                with metrics.trace("recognize"):
+                    if self.best_only:
+                        best = self.matcher.match_best(img, threshold=self.threshold, should_cancel=should_cancel)
+                        results = [best] if best is not None else []
+                    else:
+                        results = self.matcher.match(img, threshold=self.threshold, should_cancel=should_cancel)
+            except MatchCancelled:
+                metrics.count("recognize_cancelled")
+                continue
+            except Exception as e:
+                results, error = [], str(e)
+            else:
+                error = None
+            self._results.put(RecognitionResult(
+                generation, results,
+                queue_ms=(started - submitted) * 1000,
+                match_ms=(time.perf_counter() - started) * 1000,
+                error=error,
+            ))
@@ -0,0 +1,68 @@
+"""
+测试公共夹具：用随机图形合成一套图标库，不依赖网络和真实的 assets/
+"""
+import json
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+ICON_COUNT = 12
+ICON_SIZE = 48
+
+
+def make_icons(count: int = ICON_COUNT, size: int = ICON_SIZE, seed: int = 0) -> dict[str, np.ndarray]:
+    """生成 count 个互不相同的 BGR 图标：纯色底上随机叠加几个彩色圆"""
+    rng = np.random.default_rng(seed)
+    icons = {}
+    for i in range(count):
+        img = np.empty((size, size, 3), np.uint8)
+        img[:] = rng.integers(0, 256, 3)
+        for _ in range(6):
+            color = tuple(int(c) for c in rng.integers(0, 256, 3))
+            center = (int(rng.integers(5, size - 5)), int(rng.integers(5, size - 5)))
+            cv2.circle(img, center, int(rng.integers(3, size // 4)), color, -1)
+        icons[f"icon{i}"] = img
+    return icons
+
+
+def write_assets(directory: Path, icons: dict[str, np.ndarray]) -> Path:
+    """把图标写成 PNG，并生成 name_map.json（icon3 -> 图标3）"""
+    directory.mkdir(parents=True, exist_ok=True)
+    for ename, img in icons.items():
+        cv2.imwrite(str(directory / f"{ename}.png"), img)
+    name_map = {ename: ename.replace("icon", "图标") for ename in icons}
+    (directory / "name_map.json").write_text(json.dumps(name_map, ensure_ascii=False), encoding="utf-8")
+    return directory
+
+
+def paste(background: np.ndarray, icon: np.ndarray, x: int, y: int, scale: float = 1.0) -> np.ndarray:
+    """把（缩放后的）图标贴到背景的 (x, y) 处，返回新图像"""
+    if scale != 1.0:
+        icon = cv2.resize(icon, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    img = background.copy()
+    h, w = icon.shape[:2]
+    img[y:y + h, x:x + w] = icon
+    return img
+
+
+def noise_background(h: int, w: int, seed: int = 0) -> np.ndarray:
+    """模糊噪声背景，避免大片平坦区域"""
+    rng = np.random.default_rng(seed)
+    img = (rng.random((h, w, 3)) * 60 + 60).astype(np.uint8)
+    return cv2.GaussianBlur(img, (0, 0), 3)
+
+
+@pytest.fixture(scope="session")
+def icons() -> dict[str, np.ndarray]:
+    return make_icons()
+
+
+@pytest.fixture
+def assets_dir(tmp_path: Path, icons: dict[str, np.ndarray]) -> Path:
+    """每个测试独立的图标目录（匹配器会在其中写入模板库文件）"""
+    return write_assets(tmp_path / "assets", icons)
@@ -0,0 +1,134 @@
+"""共享内存模板库：发布、挂载、只读零拷贝视图、引用计数与进程池中的实际使用"""
+import io
+import json
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+import pytest
+
+from src.arena import TemplateArena
+from src.batch import run_batch
+from src.matcher import IconMatcher
+
+from conftest import noise_background, paste
+
+
+@pytest.fixture
+def published(assets_dir):
+    """主进程加载模板并发布到共享内存，测试结束时释放（已释放时无副作用）"""
+    matcher = IconMatcher(assets_dir, cache_size=0)
+    arena = matcher.publish_arena()
+    matcher.close()
+    yield arena
+    arena.release()
+
+
+def _segment_exists(name: str) -> bool:
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return False
+    shm.close()
+    return True
+
+
+def test_publish_attach_release(published, assets_dir, icons):
+    attached = TemplateArena.attach(published.name)
+    bank = attached.bank()
+    assert attached.size == published.size
+    assert bank.name_map == published.bank().name_map
+    assert set(bank.pyramid) == set(icons)
+    assert attached.bank() is bank  # 多次调用返回同一个对象
+
+    attached.release()
+    with pytest.raises(ValueError):
+        attached.bank()
+    # 挂载方 release 只解除自己的映射，共享内存仍在，可以再次挂载
+    assert _segment_exists(published.name)
+    with TemplateArena.attach(published.name) as again:
+        assert set(again.bank().pyramid) == set(icons)
+
+
+def test_attached_views_are_read_only_and_zero_copy(published, assets_dir, icons):
+    matcher = IconMatcher(assets_dir, cache_size=0, arena=published.name)
+    try:
+        buffer = np.ndarray((matcher._arena.size,), np.uint8, buffer=matcher._arena._shm.buf)
+        for ename, levels in matcher.template_pyramid.items():
+            for _, template in levels:
+                assert not template.flags.writeable
+                assert np.shares_memory(template, buffer)
+            assert np.shares_memory(matcher.template_cache[ename], buffer)
+        with pytest.raises(ValueError):
+            matcher.template_pyramid["icon0"][0][1][0, 0] = 0
+
+        # 直接使用共享内存上的模板识别，结果与自行加载的匹配器相同
+        shot = paste(noise_background(120, 160, 1), icons["icon4"], 60, 40)
+        local = IconMatcher(assets_dir, cache_size=0)
+        assert matcher.match(shot, threshold=0.6) == local.match(shot, threshold=0.6)
+        local.close()
+    finally:
+        matcher.close()
+    assert matcher._arena is None
+
+
+def test_config_mismatch_raises(published, assets_dir):
+    with pytest.raises(ValueError):
+        IconMatcher(assets_dir, cache_size=0, mode="gray", arena=published.name)
+    with pytest.raises(ValueError):
+        IconMatcher(assets_dir, cache_size=0, scales=(1.0,), arena=published.name)
+    # 失败的挂载已释放，发布方不受影响
+    assert _segment_exists(published.name)
+
+
+def test_segment_unlinked_after_owner_last_release(published):
+    name = published.name
+    published.acquire()
+    published.release()
+    assert _segment_exists(name)  # 还剩一个引用
+
+    published.release()
+    assert not _segment_exists(name)
+    with pytest.raises(ValueError):
+        published.bank()
+    with pytest.raises(ValueError):
+        published.acquire()
+    published.release()  # 重复释放无副作用
+
+
+def test_attached_matcher_outlives_owner(published, assets_dir, icons):
+    """创建者删除共享内存后，已挂载的进程仍可使用到自己 release"""
+    matcher = IconMatcher(assets_dir, cache_size=0, arena=published.name)
+    published.release()
+    assert not _segment_exists(published.name)
+    shot = paste(noise_background(120, 160, 2), icons["icon7"], 30, 50)
+    assert matcher.match(shot, threshold=0.6)[0][0] == "图标7"
+    matcher.close()
+
+
+def test_run_batch_workers_attach_arena(assets_dir, icons, tmp_path, monkeypatch):
+    """真实的进程池：工作进程挂载主进程发布的共享内存识别，结束后共享内存被删除"""
+    shots = tmp_path / "shots"
+    shots.mkdir()
+    expected = {}
+    for i, ename in enumerate(["icon1", "icon5", "icon9"]):
+        path = shots / f"shot{i}.png"
+        cv2.imwrite(str(path), paste(noise_background(120, 160, i), icons[ename], 20 + 30 * i, 30))
+        expected[str(path)] = ename.replace("icon", "图标")
+
+    names = []
+    publish = TemplateArena.publish
+
+    def spy_publish(bank):
+        arena = publish(bank)
+        names.append(arena.name)
+        return arena
+
+    monkeypatch.setattr(TemplateArena, "publish", spy_publish)
+    out = io.StringIO()
+    summary = run_batch([str(shots)], assets_dir, out, workers=2, threshold=0.6, log=io.StringIO())
+
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert summary["count"] == 3 and summary["errors"] == 0
+    assert {r["path"]: r["results"][0][0] for r in records} == expected
+    assert len(names) == 1 and not _segment_exists(names[0])
@@ -0,0 +1,53 @@
+"""自动估计界面缩放：同一分辨率下缩放改变后，沿用的估计要被丢弃"""
+import numpy as np
+import pytest
+
+from src.matcher import IconMatcher
+
+from conftest import noise_background, paste
+
+SHOT_W, SHOT_H = 360, 240
+PANEL = ["icon1", "icon4", "icon7", "icon10"]
+
+
+def panel(icons, scale: float) -> tuple[list[tuple[str, int, int]], np.ndarray]:
+    """同一分辨率的截图里按 scale 排一行图标，返回 ([(中文名, x, y), ...], 截图)"""
+    shot = noise_background(SHOT_H, SHOT_W, 3)
+    placed = []
+    for k, ename in enumerate(PANEL):
+        x, y = 30 + k * 80, 90
+        shot = paste(shot, icons[ename], x, y, scale)
+        placed.append((ename.replace("icon", "图标"), x, y))
+    return placed, shot
+
+
+@pytest.fixture
+def matcher(assets_dir):
+    m = IconMatcher(assets_dir, auto_scale=True, cache_size=0)
+    yield m
+    m.close()
+
+
+def _found(detections, placed) -> int:
+    hits = {(name, x, y) for name, _, x, y, _ in detections}
+    return sum(any(n == name and abs(x - px) <= 2 and abs(y - py) <= 2 for n, x, y in hits)
+               for name, px, py in placed)
+
+
+def test_detect_reestimates_after_ui_scale_change(matcher, icons):
+    placed, shot = panel(icons, 1.0)
+    assert _found(matcher.detect(shot), placed) == len(PANEL)
+
+    placed, shot = panel(icons, 0.9)
+    detections = matcher.detect(shot)
+    assert _found(detections, placed) == len(PANEL)
+    assert all(abs(scale - 0.9) < 0.03 for _, _, _, _, scale in detections)
+
+
+def test_match_best_reestimates_after_ui_scale_change(matcher, icons):
+    shot = paste(noise_background(SHOT_H, SHOT_W, 4), icons["icon2"], 150, 90)
+    assert matcher.match_best(shot)[0] == "图标2"
+
+    shot = paste(noise_background(SHOT_H, SHOT_W, 4), icons["icon7"], 150, 90, 0.9)
+    name, score = matcher.match_best(shot)
+    assert name == "图标7" and score > 0.9
@@ -0,0 +1,119 @@
+"""多图标库：延迟加载、并发加载与按内存预算淘汰"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.banks import MatcherPool
+
+
+class FakeMatcher:
+    def __init__(self, directory, size: int):
+        self.directory = directory
+        self.size = size
+        self.closed = False
+
+    def memory_bytes(self) -> int:
+        return self.size
+
+    def close(self):
+        self.closed = True
+
+
+class SlowFactory:
+    """classic 库的加载会阻塞到 release 被设置，用来观察加载期间池的行为"""
+
+    def __init__(self, size: int = 1024, fail: bool = False):
+        self.size = size
+        self.fail = fail
+        self.calls: list[str] = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, directory):
+        self.calls.append(directory.name)
+        if directory.name == "classic":
+            self.started.set()
+            assert self.release.wait(10)
+            if self.fail:
+                raise OSError("模板库损坏")
+        return FakeMatcher(directory, self.size)
+
+
+def test_cold_load_does_not_block_loaded_bank(tmp_path):
+    factory = SlowFactory()
+    pool = MatcherPool(tmp_path, factory)
+    std = pool.get("std")
+    with ThreadPoolExecutor(1) as executor:
+        loading = executor.submit(pool.get, "classic")
+        assert factory.started.wait(10)
+
+        assert pool.get("std") is std  # classic 仍在加载
+        assert pool.loaded() == ["std"]
+
+        factory.release.set()
+        assert loading.result(10).directory.name == "classic"
+    assert pool.loaded() == ["std", "classic"]
+
+
+def test_concurrent_gets_load_once(tmp_path):
+    factory = SlowFactory()
+    pool = MatcherPool(tmp_path, factory)
+    with ThreadPoolExecutor(4) as executor:
+        futures = [executor.submit(pool.get, "classic") for _ in range(4)]
+        assert factory.started.wait(10)
+        factory.release.set()
+        matchers = {id(f.result(10)) for f in futures}
+    assert len(matchers) == 1
+    assert factory.calls == ["classic"]
+
+
+def test_failed_load_is_retried(tmp_path):
+    factory = SlowFactory(fail=True)
+    factory.release.set()
+    pool = MatcherPool(tmp_path, factory)
+    with pytest.raises(OSError):
+        pool.get("classic")
+    assert pool.loaded() == []
+
+    factory.fail = False
+    assert pool.get("classic").directory.name == "classic"
+    assert factory.calls == ["classic", "classic"]
+
+
+def test_evicts_least_recently_used(tmp_path):
+    factory = SlowFactory(size=600 * 1024)
+    factory.release.set()
+    pool = MatcherPool(tmp_path, factory, memory_budget_mb=1)
+    std = pool.get("std")
+    skill = pool.get("skill")
+    assert pool.loaded() == ["skill"] and std.closed and not skill.closed
+
+    with pytest.raises(KeyError):
+        pool.get("nope")
+
+
+def test_close_waits_for_running_match(assets_dir, icons):
+    """被淘汰的匹配器在正在进行的识别结束后才关闭"""
+    from src.matcher import IconMatcher
+
+    matcher = IconMatcher(assets_dir, cache_size=0, max_workers=2)
+    started, release = threading.Event(), threading.Event()
+
+    def should_cancel():
+        started.set()
+        assert release.wait(10)
+        return False
+
+    with ThreadPoolExecutor(2) as executor:
+        matching = executor.submit(matcher.match, icons["icon2"], 0.6, should_cancel)
+        assert started.wait(10)
+        closing = executor.submit(matcher.close)
+        time.sleep(0.2)
+        assert not closing.done()  # 识别还在进行，close 等待中
+
+        release.set()
+        assert matching.result(10)[0][0] == "图标2"
+        closing.result(10)
+    assert matcher._pool is None
@@ -0,0 +1,74 @@
+"""整图分类快速路径：返回的分数与滑动窗口匹配一致"""
+import cv2
+import numpy as np
+import pytest
+
+from src.matcher import IconMatcher, preprocess
+
+from conftest import noise_background, paste
+
+
+@pytest.fixture
+def matchers(assets_dir):
+    fast = IconMatcher(assets_dir, cache_size=0)
+    slow = IconMatcher(assets_dir, cache_size=0, classify=False)
+    yield fast, slow
+    fast.close()
+    slow.close()
+
+
+def crop(icon: np.ndarray, margin: int) -> np.ndarray:
+    """紧贴图标、四周留 margin 像素背景的截图"""
+    shot = paste(noise_background(120, 120, 5), icon, 36, 36)
+    h, w = icon.shape[:2]
+    return shot[36 - margin:36 + h + margin, 36 - margin:36 + w + margin]
+
+
+def reference_score(matcher: IconMatcher, ename: str, shot: np.ndarray) -> float:
+    """直接用 TM_CCOEFF_NORMED 计算的最高分（只算放得下的缩放级别）"""
+    image = preprocess(shot, matcher.mode)
+    return max(float(cv2.matchTemplate(image, t, cv2.TM_CCOEFF_NORMED).max())
+               for _, t in matcher.template_pyramid[ename]
+               if t.shape[0] <= image.shape[0] and t.shape[1] <= image.shape[1])
+
+
+@pytest.mark.parametrize("margin", [0, 3, 8])
+def test_classify_returns_true_ncc(matchers, icons, margin):
+    fast, _ = matchers
+    shot = crop(icons["icon3"], margin)
+
+    assert fast._classify(preprocess(shot, fast.mode)) is not None  # 确实走了快速路径
+    name, score = fast.match_best(shot)
+    assert name == "图标3"
+    assert score == pytest.approx(reference_score(fast, "icon3", shot), abs=1e-3)
+    assert fast.match(shot)[0] == (name, score)
+
+
+def test_classify_matches_sliding_window(matchers, icons):
+    """所有缩放级别都放得下时，与关闭快速路径的结果一致"""
+    fast, slow = matchers
+    shot = crop(icons["icon3"], 8)
+    (fast_name, fast_score), (slow_name, slow_score) = fast.match_best(shot), slow.match_best(shot)
+    assert fast_name == slow_name
+    assert fast_score == pytest.approx(slow_score, abs=1e-3)
+
+
+@pytest.mark.parametrize("margin", [0, 3, 8])
+@pytest.mark.parametrize("threshold", [0.0, 0.15, 0.3, 0.6])
+def test_classify_returns_full_list(matchers, icons, margin, threshold):
+    """match() 的完整列表（不只第一名）与关闭快速路径时一致"""
+    fast, slow = matchers
+    for ename in ("icon0", "icon3", "icon7", "icon10"):
+        shot = crop(icons[ename], margin)
+        expected, actual = slow.match(shot, threshold), fast.match(shot, threshold)
+        # 同分模板的先后顺序不作要求
+        assert sorted(actual, key=lambda r: (-r[1], r[0])) == sorted(expected, key=lambda r: (-r[1], r[0]))
+
+
+def test_insets_skipped_for_mismatched_aspect(matchers, icons, monkeypatch):
+    fast, _ = matchers
+    calls = []
+    monkeypatch.setattr(fast, "_inset_windows", lambda *args: calls.append(args))
+    wide = noise_background(40, 70, 6)
+    assert fast._classify(preprocess(wide, fast.mode)) is None
+    assert calls == []
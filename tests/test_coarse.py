@@ -0,0 +1,52 @@
+"""由粗到精搜索与全分辨率穷举搜索的结果一致性"""
+import numpy as np
+import pytest
+
+from src.matcher import IconMatcher
+
+from conftest import noise_background, paste
+
+# 由粗到精的最高分与穷举搜索的差距上限
+SCORE_TOLERANCE = 0.02
+
+
+@pytest.fixture
+def matchers(assets_dir):
+    exhaustive = IconMatcher(assets_dir, cache_size=0, classify=False)
+    coarse = IconMatcher(assets_dir, cache_size=0, classify=False, coarse_to_fine=True)
+    yield exhaustive, coarse
+    exhaustive.close()
+    coarse.close()
+
+
+@pytest.mark.parametrize("seed, scale", [(0, 0.8), (1, 1.0), (2, 1.2), (3, 1.0)])
+def test_coarse_to_fine_matches_exhaustive(matchers, icons, seed, scale):
+    exhaustive, coarse = matchers
+    rng = np.random.default_rng(seed)
+    names = sorted(icons)
+    ename = names[rng.integers(len(names))]
+    shot = paste(noise_background(400, 640, seed), icons[ename],
+                 int(rng.integers(0, 580)), int(rng.integers(0, 340)), scale)
+
+    expected = exhaustive.match(shot, threshold=0.5)
+    actual = coarse.match(shot, threshold=0.5)
+
+    assert expected[0][0] == exhaustive.name_map[ename]
+    assert actual[0][0] == expected[0][0]
+    assert abs(actual[0][1] - expected[0][1]) <= SCORE_TOLERANCE
+
+
+def test_coarse_to_fine_never_exceeds_exhaustive(matchers, icons):
+    """精匹配只在穷举搜索的子窗口内进行，每个模板的分数都不会更高"""
+    exhaustive, coarse = matchers
+    shot = paste(noise_background(400, 640, 7), icons["icon4"], 333, 222)
+    expected = dict(exhaustive.match(shot, threshold=0.0))
+    for name, score in coarse.match(shot, threshold=0.0):
+        assert score <= expected[name] + 1e-3
+
+
+def test_small_screenshot_skips_coarse_pass(matchers, icons):
+    """短边小于 COARSE_MIN_SIDE 的截图直接全分辨率匹配，结果与穷举完全相同"""
+    exhaustive, coarse = matchers
+    shot = paste(noise_background(120, 160, 5), icons["icon2"], 40, 30)
+    assert coarse.match(shot, threshold=0.3) == exhaustive.match(shot, threshold=0.3)
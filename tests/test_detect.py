@@ -0,0 +1,99 @@
+"""多目标检测：峰值提取、非极大值抑制，以及整块面板在全分辨率和由粗到精两条路径上的检测结果"""
+import numpy as np
+import pytest
+
+from src.detection import find_peaks, nms
+from src.matcher import COARSE_MIN_SIDE, IconMatcher
+
+from conftest import ICON_SIZE, make_icons, noise_background, paste, write_assets
+
+PANEL_ICONS = 25
+PANEL_STEP = ICON_SIZE + 12  # 相邻图标之间留出间隔，每个图标只对应一个峰值
+
+
+def test_find_peaks_returns_local_maxima_sorted():
+    res = np.zeros((60, 80), np.float32)
+    res[10, 12] = 0.9
+    res[11, 13] = 0.85  # 同一峰附近的次高点，不是局部最大值
+    res[40, 60] = 0.95
+    res[50, 5] = 0.5  # 低于阈值
+    xs, ys, scores = find_peaks(res, 0.7, 10, 10)
+    assert list(zip(xs, ys)) == [(60, 40), (12, 10)]
+    assert scores.tolist() == pytest.approx([0.95, 0.9])
+
+
+def test_find_peaks_below_threshold_and_limit():
+    res = np.zeros((40, 40), np.float32)
+    assert [len(a) for a in find_peaks(res + 0.3, 0.5, 4, 4)] == [0, 0, 0]
+
+    res[::8, ::8] = np.linspace(0.6, 0.99, 25, dtype=np.float32).reshape(5, 5)
+    xs, ys, scores = find_peaks(res, 0.5, 4, 4, limit=3)
+    assert len(scores) == 3
+    assert scores.tolist() == pytest.approx([0.99, 0.99 - 0.39 / 24, 0.99 - 0.78 / 24])
+    assert (xs[0], ys[0]) == (32, 32)
+
+
+def test_nms_keeps_best_of_overlapping_boxes():
+    boxes = np.array([[0, 0, 10, 10], [1, 1, 10, 10], [30, 30, 10, 10], [2, 0, 10, 10]], np.float32)
+    scores = np.array([0.8, 0.9, 0.7, 0.85], np.float32)
+    assert nms(boxes, scores, 0.3) == [1, 2]
+    # 阈值足够高时重叠框都保留
+    assert nms(boxes, scores, 0.95) == [1, 3, 0, 2]
+    assert nms(np.empty((0, 4), np.float32), np.empty(0, np.float32), 0.3) == []
+
+
+@pytest.fixture(scope="module")
+def panel_icons() -> dict[str, np.ndarray]:
+    return make_icons(PANEL_ICONS, seed=3)
+
+
+@pytest.fixture(scope="module")
+def panel(panel_icons):
+    """5×5 的图标面板，每个位置带一点随机偏移；返回 (截图, {(中文名, x, y)})"""
+    rng = np.random.default_rng(0)
+    side = 5 * PANEL_STEP + 16
+    assert side >= COARSE_MIN_SIDE  # 保证由粗到精的路径被使用
+    shot = noise_background(side, side, 11)
+    placed = set()
+    for k, ename in enumerate(sorted(panel_icons)):
+        x = 8 + (k % 5) * PANEL_STEP + int(rng.integers(0, 8))
+        y = 8 + (k // 5) * PANEL_STEP + int(rng.integers(0, 8))
+        shot = paste(shot, panel_icons[ename], x, y)
+        placed.add((ename.replace("icon", "图标"), x, y))
+    return shot, placed
+
+
+@pytest.mark.parametrize("coarse_to_fine", [False, True])
+def test_detect_finds_every_panel_icon_once(tmp_path, panel_icons, panel, coarse_to_fine):
+    shot, placed = panel
+    matcher = IconMatcher(write_assets(tmp_path / "assets", panel_icons), cache_size=0,
+                          coarse_to_fine=coarse_to_fine)
+    try:
+        detections = matcher.detect(shot, threshold=0.8)
+    finally:
+        matcher.close()
+    assert len(detections) == PANEL_ICONS
+    assert {(name, x, y) for name, _, x, y, _ in detections} == placed
+    assert all(score >= 0.99 and scale == 1.0 for _, score, _, _, scale in detections)
+    assert [d[1] for d in detections] == sorted((d[1] for d in detections), reverse=True)
+
+
+@pytest.mark.parametrize("coarse_to_fine", [False, True])
+def test_detect_overlapping_match_of_another_icon_is_suppressed(tmp_path, icons, coarse_to_fine):
+    """与已放置图标相似的另一个图标在同一位置也超过阈值，只保留得分更高的那个"""
+    original = icons["icon3"]
+    lookalike = original.copy()
+    lookalike[:12, :12] = 255 - lookalike[:12, :12]  # 只改一角，整体仍高度相关
+    assets = write_assets(tmp_path / "assets", {"icon3": original, "icon20": lookalike,
+                                                 "icon5": icons["icon5"]})
+    shot = paste(noise_background(COARSE_MIN_SIDE, COARSE_MIN_SIDE + 64, 4), original, 150, 90)
+
+    matcher = IconMatcher(assets, cache_size=0, coarse_to_fine=coarse_to_fine)
+    try:
+        # 两个模板在该位置都超过阈值
+        scores = dict(matcher.match(shot, threshold=0.6))
+        assert scores["图标3"] > scores["图标20"] >= 0.6
+        detections = matcher.detect(shot, threshold=0.6)
+    finally:
+        matcher.close()
+    assert [(name, x, y) for name, _, x, y, _ in detections] == [("图标3", 150, 90)]
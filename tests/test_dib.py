@@ -0,0 +1,207 @@
+"""DIB 解码：按字节构造的各种信息头、位深和行序"""
+import struct
+
+import cv2
+import numpy as np
+import pytest
+
+from src.dib import (BI_BITFIELDS, BI_PNG, BI_RGB, BI_RLE8, _pixel_view, decode_dib,
+                     parse_header)
+
+W, H = 13, 7  # 宽度不是 4 的倍数，各位深都有行填充
+
+
+@pytest.fixture(scope="module")
+def image() -> np.ndarray:
+    return np.random.default_rng(0).integers(0, 256, (H, W, 3), dtype=np.uint8)
+
+
+def info_header(width: int, height: int, bits: int, compression: int = BI_RGB,
+                size: int = 40, image_size: int = 0, colors_used: int = 0,
+                masks: tuple[int, ...] = ()) -> bytes:
+    """BITMAPINFOHEADER 及其扩展版本；size > 40 时 masks 写在信息头内部（V2 之后的布局）"""
+    head = struct.pack("<IiiHHIIiiII", size, width, height, 1, bits, compression,
+                       image_size, 2835, 2835, colors_used, 0)
+    if size > 40:
+        head += struct.pack(f"<{len(masks)}I", *masks)
+        head += bytes(size - len(head))
+    return head
+
+
+def core_header(width: int, height: int, bits: int) -> bytes:
+    return struct.pack("<IHHHH", 12, width, height, 1, bits)
+
+
+def pixel_rows(rows: np.ndarray, bottom_up: bool) -> bytes:
+    """(高, 每行字节数) 的行数据补齐到 4 字节对齐，按需倒序排列"""
+    stride = (rows.shape[1] + 3) // 4 * 4
+    padded = np.zeros((rows.shape[0], stride), np.uint8)
+    padded[:, :rows.shape[1]] = rows
+    padded[:, rows.shape[1]:] = 0xAB  # 填充字节写入非零值，解码结果不应受影响
+    return (padded[::-1] if bottom_up else padded).tobytes()
+
+
+def height_of(bottom_up: bool) -> int:
+    return H if bottom_up else -H
+
+
+def as_rgb565(image: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """返回 (16 位像素, 按 565 位域扩展回 8 位后的期望 BGR)"""
+    b, g, r = (image[..., i].astype(np.uint16) for i in range(3))
+    value = ((r >> 3) << 11) | ((g >> 2) << 5) | (b >> 3)
+    expand = lambda v, bits: ((v.astype(np.uint32) * 255 + ((1 << bits) - 1) // 2) // ((1 << bits) - 1))
+    expected = np.dstack([expand(b >> 3, 5), expand(g >> 2, 6), expand(r >> 3, 5)]).astype(np.uint8)
+    return value, expected
+
+
+@pytest.mark.parametrize("bottom_up", [True, False])
+def test_24bit(image, bottom_up):
+    data = info_header(W, height_of(bottom_up), 24) + pixel_rows(image.reshape(H, -1), bottom_up)
+    out = decode_dib(data)
+    assert out.dtype == np.uint8 and out.flags["C_CONTIGUOUS"]
+    assert (out == image).all()
+
+
+@pytest.mark.parametrize("bottom_up", [True, False])
+def test_32bit_rgb(image, bottom_up):
+    bgrx = np.dstack([image, np.full((H, W), 0x55, np.uint8)])
+    data = info_header(W, height_of(bottom_up), 32) + pixel_rows(bgrx.reshape(H, -1), bottom_up)
+    out = decode_dib(data)
+    assert out.flags["C_CONTIGUOUS"]
+    assert (out == image).all()
+
+
+@pytest.mark.parametrize("bottom_up", [True, False])
+def test_v5_bitfields(image, bottom_up):
+    bgra = np.dstack([image, np.full((H, W), 0xFF, np.uint8)])
+    header = info_header(W, height_of(bottom_up), 32, BI_BITFIELDS, size=124,
+                         masks=(0xFF0000, 0xFF00, 0xFF, 0xFF000000))
+    assert (decode_dib(header + pixel_rows(bgra.reshape(H, -1), bottom_up)) == image).all()
+
+
+def test_v5_bitfields_with_repeated_masks(image):
+    """部分程序在 V5 信息头之后又写了一份掩码"""
+    bgra = np.dstack([image, np.zeros((H, W), np.uint8)])
+    masks = (0xFF0000, 0xFF00, 0xFF)
+    header = info_header(W, H, 32, BI_BITFIELDS, size=124, masks=masks + (0,))
+    data = header + struct.pack("<III", *masks) + pixel_rows(bgra.reshape(H, -1), True)
+    assert (decode_dib(data) == image).all()
+
+
+def test_v5_bitfields_rgbx_order(image):
+    rgbx = np.dstack([image[..., ::-1], np.zeros((H, W), np.uint8)])
+    header = info_header(W, -H, 32, BI_BITFIELDS, size=124, masks=(0xFF, 0xFF00, 0xFF0000, 0))
+    assert (decode_dib(header + pixel_rows(rgbx.reshape(H, -1), False)) == image).all()
+
+
+@pytest.mark.parametrize("bottom_up", [True, False])
+def test_40byte_bitfields_565(image, bottom_up):
+    value, expected = as_rgb565(image)
+    header = info_header(W, height_of(bottom_up), 16, BI_BITFIELDS)
+    masks = struct.pack("<III", 0xF800, 0x07E0, 0x001F)
+    data = header + masks + pixel_rows(value.astype("<u2").view(np.uint8).reshape(H, -1), bottom_up)
+    assert (decode_dib(data) == expected).all()
+
+
+def test_16bit_rgb_defaults_to_555(image):
+    b, g, r = (image[..., i].astype(np.uint16) >> 3 for i in range(3))
+    value = (r << 10) | (g << 5) | b
+    data = info_header(W, H, 16) + pixel_rows(value.astype("<u2").view(np.uint8).reshape(H, -1), True)
+    out = decode_dib(data).astype(int)
+    assert np.abs(out - image.astype(int)).max() <= 8
+
+
+def _palette(count: int, seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).integers(0, 256, (count, 3), dtype=np.uint8)
+
+
+def _rgbquads(palette: np.ndarray) -> bytes:
+    return np.hstack([palette, np.zeros((len(palette), 1), np.uint8)]).tobytes()
+
+
+@pytest.mark.parametrize("bottom_up", [True, False])
+def test_8bit_palette(bottom_up):
+    palette = _palette(200, 1)
+    indices = np.random.default_rng(2).integers(0, 200, (H, W), dtype=np.uint8)
+    data = (info_header(W, height_of(bottom_up), 8, colors_used=200) + _rgbquads(palette)
+            + pixel_rows(indices, bottom_up))
+    out = decode_dib(data)
+    assert out.flags["C_CONTIGUOUS"]
+    assert (out == palette[indices]).all()
+
+
+@pytest.mark.parametrize("bottom_up", [True, False])
+def test_4bit_palette(bottom_up):
+    palette = _palette(16, 3)
+    indices = np.random.default_rng(4).integers(0, 16, (H, W), dtype=np.uint8)
+    padded = np.hstack([indices, np.zeros((H, 1), np.uint8)])  # 奇数宽度补一个半字节
+    packed = (padded[:, 0::2] << 4) | padded[:, 1::2]
+    data = info_header(W, height_of(bottom_up), 4) + _rgbquads(palette) + pixel_rows(packed, bottom_up)
+    assert (decode_dib(data) == palette[indices]).all()
+
+
+@pytest.mark.parametrize("bottom_up", [True, False])
+def test_1bit_palette(bottom_up):
+    palette = np.array([[10, 20, 30], [200, 210, 220]], np.uint8)
+    indices = np.random.default_rng(5).integers(0, 2, (H, W), dtype=np.uint8)
+    packed = np.packbits(indices, axis=1)
+    data = info_header(W, height_of(bottom_up), 1) + _rgbquads(palette) + pixel_rows(packed, bottom_up)
+    assert (decode_dib(data) == palette[indices]).all()
+
+
+def test_core_header_24bit(image):
+    data = core_header(W, H, 24) + pixel_rows(image.reshape(H, -1), True)
+    assert (decode_dib(data) == image).all()
+
+
+def test_core_header_8bit_rgbtriple_palette():
+    palette = _palette(256, 6)
+    indices = np.random.default_rng(7).integers(0, 256, (H, W), dtype=np.uint8)
+    data = core_header(W, H, 8) + palette.tobytes() + pixel_rows(indices, True)
+    assert (decode_dib(data) == palette[indices]).all()
+
+
+def test_direct_color_with_ignored_palette(image):
+    data = (info_header(W, H, 24, colors_used=2) + _rgbquads(_palette(2, 8))
+            + pixel_rows(image.reshape(H, -1), True))
+    assert (decode_dib(data) == image).all()
+
+
+def test_embedded_png(image):
+    ok, png = cv2.imencode(".png", image)
+    data = info_header(W, H, 0, BI_PNG, image_size=len(png)) + png.tobytes()
+    assert (decode_dib(data) == image).all()
+
+
+def test_pixel_view_does_not_copy(image):
+    data = info_header(W, H, 24) + pixel_rows(image.reshape(H, -1), True)
+    header, offset, _ = parse_header(data)
+    view = _pixel_view(data, header, offset, np.uint8, 3)
+    assert np.shares_memory(view, np.frombuffer(data, np.uint8))
+    assert (view == image).all()
+
+
+def _valid_24bit(image) -> bytes:
+    return info_header(W, H, 24) + pixel_rows(image.reshape(H, -1), True)
+
+
+@pytest.mark.parametrize("make", [
+    lambda img: b"",
+    lambda img: b"\x28\x00",  # 不足 4 字节
+    lambda img: struct.pack("<I", 20) + bytes(40),  # 未知的信息头长度
+    lambda img: _valid_24bit(img)[:30],  # 信息头被截断
+    lambda img: _valid_24bit(img)[:-1],  # 像素数据少一个字节
+    lambda img: info_header(0, H, 24) + bytes(64),  # 宽度为 0
+    lambda img: info_header(W, 0, 24),  # 高度为 0
+    lambda img: info_header(W, H, 16, BI_BITFIELDS) + b"\xff\xff",  # 位域掩码不完整
+    lambda img: info_header(W, H, 8, colors_used=16) + bytes(10),  # 调色板不完整
+    lambda img: info_header(W, H, 8, colors_used=2) + bytes(8) + pixel_rows(np.full((H, W), 5, np.uint8), True),
+    lambda img: info_header(W, H, 8, BI_RLE8) + bytes(1024 + 16 * H),  # RLE 不支持
+    lambda img: info_header(W, H, 12) + bytes(64 * H),  # 不支持的位深
+    lambda img: info_header(W, H, 0, BI_PNG) + b"\x89PNG not really",  # 内嵌 PNG 损坏
+], ids=["empty", "short", "header-size", "truncated-header", "truncated-pixels", "zero-width",
+        "zero-height", "truncated-masks", "truncated-palette", "palette-index", "rle", "bit-depth",
+        "bad-png"])
+def test_malformed(image, make):
+    with pytest.raises(ValueError):
+        decode_dib(make(image))
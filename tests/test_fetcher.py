@@ -0,0 +1,134 @@
+"""IconFetcher：对本地桩 HTTP 服务的下载、条件请求与重试"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+import pytest
+
+from src.fetcher import SYNC_FAILED, SYNC_UNCHANGED, SYNC_UPDATED, IconFetcher
+
+from conftest import make_icons
+
+CATALOGUE = [(101, "alpha", "甲"), (102, "beta", "乙"), (103, "gamma", "丙")]
+
+
+class StubCDN:
+    """图标 CDN 桩：按 /{id}.png 返回 PNG，支持 ETag 条件请求和按次数注入 500"""
+
+    def __init__(self):
+        icons = make_icons(len(CATALOGUE), seed=1)
+        self.bodies = {icon_id: cv2.imencode(".png", img)[1].tobytes()
+                       for (icon_id, _, _), img in zip(CATALOGUE, icons.values())}
+        self.failures: dict[int, int] = {}  # 图标ID -> 还要返回 500 的次数
+        self.log: list[tuple[str, int]] = []  # (路径, 状态码)
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                icon_id = int(self.path.rsplit("/", 1)[-1].split(".")[0])
+                etag = f'"v{icon_id}"'
+                if stub.failures.get(icon_id, 0) > 0:
+                    stub.failures[icon_id] -= 1
+                    self._reply(500)
+                elif icon_id not in stub.bodies:
+                    self._reply(404)
+                elif self.headers.get("If-None-Match") == etag:
+                    self._reply(304, headers={"ETag": etag})
+                else:
+                    self._reply(200, stub.bodies[icon_id], {"ETag": etag})
+
+            def _reply(self, status, body=b"", headers=None):
+                stub.log.append((self.path, status))
+                self.send_response(status)
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/icon"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def statuses(self) -> list[int]:
+        return [status for _, status in self.log]
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def cdn():
+    stub = StubCDN()
+    yield stub
+    stub.close()
+
+
+def _fetcher(directory, cdn: StubCDN) -> IconFetcher:
+    return IconFetcher(directory, base_url=cdn.url, rate=1000, backoff=0.01, catalogue=CATALOGUE)
+
+
+def test_downloads_from_base_url(tmp_path, cdn):
+    results = _fetcher(tmp_path, cdn).sync()
+
+    assert results == {ename: SYNC_UPDATED for _, ename, _ in CATALOGUE}
+    assert sorted(path for path, _ in cdn.log) == ["/icon/101.png", "/icon/102.png", "/icon/103.png"]
+    for icon_id, ename, _ in CATALOGUE:
+        assert (tmp_path / f"{ename}.png").read_bytes() == cdn.bodies[icon_id]
+    name_map = json.loads((tmp_path / "name_map.json").read_text(encoding="utf-8"))
+    assert name_map == {ename: cname for _, ename, cname in CATALOGUE}
+
+
+def test_refresh_uses_conditional_requests(tmp_path, cdn):
+    _fetcher(tmp_path, cdn).sync()
+    cdn.log.clear()
+
+    results = _fetcher(tmp_path, cdn).sync(refresh=True)
+
+    assert set(results.values()) == {SYNC_UNCHANGED}
+    assert cdn.statuses() == [304] * len(CATALOGUE)
+
+
+def test_sync_without_refresh_sends_nothing(tmp_path, cdn):
+    _fetcher(tmp_path, cdn).sync()
+    cdn.log.clear()
+    assert set(_fetcher(tmp_path, cdn).sync().values()) == {SYNC_UNCHANGED}
+    assert cdn.log == []
+
+
+def test_retries_after_server_error(tmp_path, cdn):
+    cdn.failures[102] = 2
+
+    results = _fetcher(tmp_path, cdn).sync()
+
+    assert results["beta"] == SYNC_UPDATED
+    beta = [status for path, status in cdn.log if path == "/icon/102.png"]
+    assert beta == [500, 500, 200]
+
+
+def test_gives_up_after_retries(tmp_path, cdn):
+    cdn.failures[103] = 10
+    fetcher = IconFetcher(tmp_path, base_url=cdn.url, rate=1000, backoff=0.01, retries=2,
+                          catalogue=CATALOGUE)
+
+    results = fetcher.sync()
+
+    assert results["gamma"] == SYNC_FAILED
+    assert [status for path, status in cdn.log if path == "/icon/103.png"] == [500] * 3
+    assert not (tmp_path / "gamma.png").exists()
+
+
+def test_rejects_non_image_body(tmp_path, cdn):
+    cdn.bodies[101] = np.zeros(200, np.uint8).tobytes()
+    results = _fetcher(tmp_path, cdn).sync()
+    assert results["alpha"] == SYNC_FAILED
+    assert not (tmp_path / "alpha.png").exists()
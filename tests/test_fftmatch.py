@@ -0,0 +1,100 @@
+"""fft 引擎与 opencv 引擎的结果一致性，以及大截图上的内存上限"""
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from src.fftmatch import FFTCorrelator
+from src.matcher import IconMatcher
+
+from conftest import noise_background, paste
+
+SCORE_TOLERANCE = 1e-3
+
+
+@pytest.fixture
+def engines(assets_dir):
+    # 关闭整图分类，两个引擎都做完整的滑动窗口匹配
+    opencv = IconMatcher(assets_dir, cache_size=0, classify=False)
+    fft = IconMatcher(assets_dir, cache_size=0, classify=False, engine="fft")
+    yield opencv, fft
+    opencv.close()
+    fft.close()
+
+
+def _ranking(results: list[tuple[str, float]]) -> list[str]:
+    """按分数降序、同分按名称排列（两个引擎对同分模板的先后顺序不作要求）"""
+    return [name for name, _ in sorted(results, key=lambda r: (-r[1], r[0]))]
+
+
+@pytest.mark.parametrize("seed, scale", [(0, 1.0), (1, 0.9), (2, 1.2)])
+def test_fft_matches_opencv(engines, icons, seed, scale):
+    opencv, fft = engines
+    rng = np.random.default_rng(seed)
+    names = sorted(icons)
+    ename = names[rng.integers(len(names))]
+    shot = paste(noise_background(160, 240, seed), icons[ename],
+                 int(rng.integers(0, 170)), int(rng.integers(0, 90)), scale)
+
+    expected = opencv.match(shot, threshold=-1.0)
+    actual = fft.match(shot, threshold=-1.0)
+
+    assert expected[0][0] == opencv.name_map[ename]
+    assert len(actual) == len(expected)
+    scores = dict(expected)
+    for name, score in actual:
+        assert score == pytest.approx(scores[name], abs=SCORE_TOLERANCE)
+    assert _ranking(actual) == _ranking(expected)
+
+
+def test_fft_screenshot_smaller_than_template(engines, icons):
+    """比部分缩放级别还小的截图：这些级别被跳过，两个引擎仍然一致"""
+    opencv, fft = engines
+    shot = paste(noise_background(50, 50, 3), icons["icon6"], 4, 4, 0.8)
+    expected = opencv.match(shot, threshold=-1.0)
+    actual = fft.match(shot, threshold=-1.0)
+    assert _ranking(actual) == _ranking(expected)
+    scores = dict(expected)
+    for name, score in actual:
+        assert score == pytest.approx(scores[name], abs=SCORE_TOLERANCE)
+
+
+def test_fft_falls_back_when_spectra_do_not_fit(engines, icons):
+    """模板频谱放不进缓存的截图改用 matchTemplate，结果不变，也不缓存频谱"""
+    opencv, fft = engines
+    fft._fft.cache_bytes = fft._fft.spectra_bytes(160, 240) - 1
+    shot = paste(noise_background(160, 240, 4), icons["icon9"], 100, 50)
+    expected = opencv.match(shot, threshold=-1.0)
+    actual = fft.match(shot, threshold=-1.0)
+    assert _ranking(actual) == _ranking(expected)
+    assert fft._fft._spectra == {}
+
+
+def test_fft_4k_frame_is_not_correlated_in_frequency_domain(engines):
+    _, fft = engines
+    assert not fft._fft.fits(2160, 3840)
+    with pytest.raises(ValueError):
+        fft._fft.max_scores(np.zeros((2160, 3840, 3), np.uint8), [0])
+
+
+def test_fft_memory_is_bounded_on_large_frame(icons):
+    """大截图上每批只占 batch_bytes 左右的工作内存，频谱按 complex64 缓存（与 numpy 版本无关）"""
+    templates = list(icons.values())
+    correlator = FFTCorrelator(templates, batch_bytes=16 * 1024 * 1024)
+    shot = paste(noise_background(720, 1280, 5), icons["icon5"], 900, 300)
+    assert correlator.fits(720, 1280)
+
+    first = correlator.max_scores(shot, list(range(len(templates))))
+    cached = sum(s.nbytes for spectra in correlator._spectra.values() for s in spectra)
+    assert cached == correlator.spectra_bytes(720, 1280)
+
+    tracemalloc.start()
+    try:
+        second = correlator.max_scores(shot, list(range(len(templates))))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert second == first
+    assert first[5][0] == pytest.approx(1.0, abs=1e-3) and first[5][1] == (900, 300)
+    # 截图频谱、窗口能量和一批工作内存之和，小于把全部模板频谱堆叠一份（约 130 MB，原实现还要再乘一次）
+    assert peak < correlator.spectra_bytes(720, 1280)
@@ -0,0 +1,85 @@
+"""入口：界面模式的后台加载线程"""
+import argparse
+import os
+
+import pytest
+
+import main
+
+
+class FakeGUI:
+    def __init__(self):
+        self.statuses: list[str] = []
+        self.matcher = None
+
+    def set_status(self, text: str):
+        self.statuses.append(text)
+
+    def attach_matcher(self, matcher):
+        self.matcher = matcher
+
+
+def _args(**overrides) -> argparse.Namespace:
+    args = dict(bank="std", engine="opencv", mode="color", mask=False, auto_scale=False, track=False,
+                coarse_to_fine=False, match_workers=1)
+    args.update(overrides)
+    return argparse.Namespace(**args)
+
+
+def test_load_matcher_reports_asset_check_failure(tmp_path, monkeypatch):
+    def fail(*args, **kwargs):
+        raise PermissionError("拒绝访问")
+
+    monkeypatch.setattr(main, "ensure_assets", fail)
+    gui, ready = FakeGUI(), []
+    main.load_matcher(gui, tmp_path, _args(), ready.append)
+
+    assert ready == [] and gui.matcher is None
+    assert gui.statuses[-1] == "状态: 图标库检查失败 - 拒绝访问"
+
+
+def test_load_matcher_reports_empty_assets(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "ensure_assets", lambda *args, **kwargs: None)
+    gui, ready = FakeGUI(), []
+    main.load_matcher(gui, tmp_path, _args(), ready.append)
+
+    assert ready == []
+    assert gui.statuses[-1].startswith("状态: 图标加载失败")
+
+
+def test_load_matcher_attaches_matcher(assets_dir, monkeypatch):
+    monkeypatch.setattr(main, "ensure_assets", lambda *args, **kwargs: None)
+    gui, ready = FakeGUI(), []
+    main.load_matcher(gui, assets_dir, _args(), ready.append)
+
+    assert ready == [gui.matcher] and gui.matcher is not None
+    gui.matcher.close()
+
+
+@pytest.mark.parametrize("workers, expected", [(1, 1), (4, 4), (0, None)])
+def test_matcher_options_pass_match_workers(workers, expected):
+    assert main.matcher_options(_args(match_workers=workers))["max_workers"] == expected
+
+
+def test_matcher_options_pass_coarse_to_fine(assets_dir):
+    options = main.matcher_options(_args(coarse_to_fine=True))
+    assert options["coarse_to_fine"] is True
+    from src.matcher import IconMatcher
+
+    matcher = IconMatcher(assets_dir, **options)
+    assert matcher.coarse_to_fine and matcher.coarse_pyramid
+    matcher.close()
+
+
+def test_load_matcher_configures_cv_threads(assets_dir, monkeypatch):
+    import src.matcher
+
+    calls = []
+    monkeypatch.setattr(src.matcher, "configure_cv_threads", calls.append)
+    monkeypatch.setattr(main, "ensure_assets", lambda *args, **kwargs: None)
+    gui = FakeGUI()
+    main.load_matcher(gui, assets_dir, _args(match_workers=0), lambda matcher: None)
+
+    assert calls == [None]
+    assert gui.matcher.max_workers == (os.cpu_count() or 1)
+    gui.matcher.close()
@@ -0,0 +1,74 @@
+"""图标清单：name_map.json 的合并写入"""
+import json
+import os
+import socket
+
+import cv2
+import pytest
+
+from src.fetcher import SYNC_FAILED, IconFetcher
+from src.manifest import Manifest
+
+from conftest import make_icons
+
+CATALOGUE = [(201, "alpha", "甲"), (202, "beta", "乙")]
+
+
+def _read_map(directory) -> dict:
+    return json.loads((directory / "name_map.json").read_text(encoding="utf-8"))
+
+
+def _write_map(directory, name_map: dict):
+    (directory / "name_map.json").write_text(json.dumps(name_map, ensure_ascii=False), encoding="utf-8")
+
+
+@pytest.fixture
+def unreachable_url() -> str:
+    """一个没有服务监听的本地地址"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    return f"http://127.0.0.1:{port}"
+
+
+def test_offline_sync_keeps_hand_edited_name_map(tmp_path, unreachable_url):
+    _write_map(tmp_path, {"custom": "自定义", "alpha": "手改的甲"})
+    fetcher = IconFetcher(tmp_path, base_url=unreachable_url, retries=0, timeout=1,
+                          catalogue=CATALOGUE)
+
+    assert set(fetcher.sync().values()) == {SYNC_FAILED}
+    fetcher.is_complete()
+
+    assert _read_map(tmp_path) == {"custom": "自定义", "alpha": "手改的甲"}
+
+
+def test_save_merges_ready_entries(tmp_path):
+    icon = make_icons(1)["icon0"]
+    cv2.imwrite(str(tmp_path / "beta.png"), icon)
+    _write_map(tmp_path, {"custom": "自定义", "beta": "旧名"})
+
+    manifest = Manifest(tmp_path, CATALOGUE)
+    manifest.adopt_local_files()
+    manifest.save()
+
+    # 清单中已就绪的 beta 被更新，未就绪的 alpha 不写入，其余条目保留
+    assert _read_map(tmp_path) == {"custom": "自定义", "beta": "乙"}
+
+
+def test_save_without_changes_does_not_touch_files(tmp_path):
+    cv2.imwrite(str(tmp_path / "alpha.png"), make_icons(1)["icon0"])
+    manifest = Manifest(tmp_path, CATALOGUE)
+    manifest.adopt_local_files()
+    manifest.save()
+    paths = [tmp_path / "name_map.json", tmp_path / "manifest.json"]
+    for path in paths:
+        os.utime(path, ns=(10 ** 9, 10 ** 9))  # 改写过的文件会得到当前时间
+
+    Manifest(tmp_path, CATALOGUE).save()
+
+    assert [p.stat().st_mtime_ns for p in paths] == [10 ** 9] * 2
+
+
+def test_save_does_not_create_empty_name_map(tmp_path):
+    Manifest(tmp_path, CATALOGUE).save()
+    assert not (tmp_path / "name_map.json").exists()
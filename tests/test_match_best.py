@@ -0,0 +1,76 @@
+"""match_best：与 match 的第一名一致，并在结果确定后提前结束"""
+import time
+
+import pytest
+
+from src.matcher import IconMatcher
+from src.worker import RecognitionWorker
+
+from conftest import noise_background, paste
+
+
+def _shot(icons, ename: str, seed: int):
+    return paste(noise_background(160, 240, seed), icons[ename], 30 + seed * 20, 40 + seed * 10)
+
+
+@pytest.fixture
+def matcher(assets_dir, monkeypatch):
+    m = IconMatcher(assets_dir, cache_size=0, classify=False)
+    m.scored = []  # 每次 _score_level 的模板名
+    score_level = m._score_level
+
+    def spy(ename, i, image, small):
+        m.scored.append(ename)
+        return score_level(ename, i, image, small)
+
+    monkeypatch.setattr(m, "_score_level", spy)
+    yield m
+    m.close()
+
+
+@pytest.mark.parametrize("ename, seed", [("icon1", 0), ("icon5", 1), ("icon8", 2), ("icon11", 3)])
+def test_match_best_agrees_with_match(matcher, icons, ename, seed):
+    shot = _shot(icons, ename, seed)
+    assert matcher.match_best(shot) == matcher.match(shot)[0]
+
+
+def test_match_best_stops_once_certain(matcher, icons):
+    shot = _shot(icons, "icon5", 1)
+    matcher.match_best(shot)
+    early = set(matcher.scored)
+
+    matcher.scored.clear()
+    matcher.certain_score = 1.01  # 永远达不到，必须匹配全部模板
+    matcher.match_best(shot)
+    assert set(matcher.scored) == set(matcher.template_pyramid)
+    assert "icon5" in early and len(early) < len(matcher.template_pyramid)
+
+
+def test_match_best_needs_margin(matcher, icons):
+    """第一名分数够高但领先不足 certain_margin 时继续匹配"""
+    shot = _shot(icons, "icon5", 1)
+    matcher.certain_margin = 1.5
+    matcher.match_best(shot)
+    assert set(matcher.scored) == set(matcher.template_pyramid)
+
+
+def test_worker_best_only_uses_match_best(assets_dir, icons):
+    matcher = IconMatcher(assets_dir, cache_size=0)
+    calls = []
+    match_best = matcher.match_best
+    matcher.match_best = lambda *args, **kwargs: calls.append(1) or match_best(*args, **kwargs)
+    worker = RecognitionWorker(matcher, best_only=True)
+    worker.start()
+    try:
+        generation = worker.submit(_shot(icons, "icon8", 2))
+        deadline = time.monotonic() + 30
+        result = None
+        while result is None and time.monotonic() < deadline:
+            result = worker.poll()
+            time.sleep(0.01)
+    finally:
+        worker.stop()
+        matcher.close()
+    assert result is not None and result.generation == generation
+    assert calls == [1]
+    assert len(result.results) == 1 and result.results[0][0] == "图标8"
@@ -0,0 +1,110 @@
+"""识别服务：请求体解析与 HTTP 接口"""
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import cv2
+import numpy as np
+import pytest
+
+from src.banks import MatcherPool
+from src.server import RecognitionService, decode_body, make_server
+
+RAW = "application/octet-stream"
+
+
+def test_decode_raw_pixels():
+    bgr = np.arange(2 * 3 * 3, dtype=np.uint8).reshape(2, 3, 3)
+    assert (decode_body(bgr.tobytes(), RAW, {"shape": "2x3x3"}) == bgr).all()
+
+    gray = np.arange(6, dtype=np.uint8).reshape(2, 3)
+    img = decode_body(gray.tobytes(), RAW, {"shape": "2x3"})
+    assert img.shape == (2, 3, 3) and (img[..., 1] == gray).all()
+
+    bgra = np.dstack([bgr, np.full((2, 3), 255, np.uint8)])
+    assert (decode_body(bgra.tobytes(), RAW, {"shape": "2x3x4"}) == bgr).all()
+
+
+@pytest.mark.parametrize("shape, size", [("2x3x2", 12), ("2x3x3x1", 18), ("0x3", 0), ("2x3", 5), ("2xa", 6)])
+def test_decode_rejects_bad_raw_shape(shape, size):
+    with pytest.raises(ValueError):
+        decode_body(bytes(size), RAW, {"shape": shape})
+
+
+def test_decode_encoded_image():
+    img = np.zeros((4, 5, 3), np.uint8)
+    img[1, 2] = (10, 20, 30)
+    ok, png = cv2.imencode(".png", img)
+    assert (decode_body(png.tobytes(), "image/png", {}) == img).all()
+    with pytest.raises(ValueError):
+        decode_body(b"not an image", "image/png", {})
+
+
+@pytest.fixture
+def server(assets_dir):
+    pool = MatcherPool(assets_dir)  # 默认图标库 std 即 assets 目录本身
+    service = RecognitionService(pool)
+    service.start()
+    httpd = make_server(service, port=0)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+    service.stop()
+    pool.close()
+
+
+def _post(url: str, body: bytes, content_type: str) -> tuple[int, dict]:
+    req = urllib.request.Request(url, data=body, headers={"Content-Type": content_type})
+    try:
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            return resp.status, json.loads(resp.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_http_match(server, icons):
+    icon = icons["icon3"]
+    status, payload = _post(f"{server}/match?top_k=1&shape=48x48x3", icon.tobytes(), RAW)
+    assert status == 200
+    assert payload["results"][0][0] == "图标3"
+
+
+def test_http_rejects_two_channel_pixels(server):
+    status, payload = _post(f"{server}/match?shape=48x48x2", bytes(48 * 48 * 2), RAW)
+    assert status == 400
+    assert "通道" in payload["error"]
+
+
+def test_http_rejects_unknown_bank(server, icons):
+    status, _ = _post(f"{server}/match?bank=nope&shape=48x48x3", icons["icon0"].tobytes(), RAW)
+    assert status == 400
+
+
+def _get(url: str) -> tuple[int, dict]:
+    try:
+        with urllib.request.urlopen(url, timeout=30) as resp:
+            return resp.status, json.loads(resp.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_health_does_not_load_banks(server, icons):
+    status, payload = _get(f"{server}/health")
+    assert status == 200
+    assert payload == {"status": "ok", "default_bank": "std", "banks": [], "memory_mb": 0.0}
+
+    _post(f"{server}/match?shape=48x48x3", icons["icon0"].tobytes(), RAW)
+    status, payload = _get(f"{server}/health")
+    assert payload["banks"] == ["std"] and payload["memory_mb"] > 0
+
+
+def test_health_reports_errors_as_json(server, monkeypatch):
+    def broken(self):
+        raise RuntimeError("图标库状态不可用")
+
+    monkeypatch.setattr(MatcherPool, "loaded", broken)
+    status, payload = _get(f"{server}/health")
+    assert status == 500
+    assert payload == {"status": "error", "error": "图标库状态不可用"}
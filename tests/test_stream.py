@@ -0,0 +1,100 @@
+"""连续帧识别：无显示器环境下的视频文件与图片目录来源"""
+import io
+
+import cv2
+import numpy as np
+import pytest
+
+from src.matcher import IconMatcher
+from src.stream import DirectorySource, FrameSource, FrameStream, VideoSource, run_stream
+
+from conftest import noise_background, paste
+
+FRAME_W, FRAME_H = 160, 120
+
+
+@pytest.fixture
+def matcher(assets_dir):
+    m = IconMatcher(assets_dir, cache_size=0)
+    yield m
+    m.close()
+
+
+def _frames(icons, count: int = 10, appear_at: int = 5) -> list[np.ndarray]:
+    """静止背景，第 appear_at 帧起在 (60, 40) 出现 icon3"""
+    background = noise_background(FRAME_H, FRAME_W, 1)
+    with_icon = paste(background, icons["icon3"], 60, 40)
+    return [background if i < appear_at else with_icon for i in range(count)]
+
+
+@pytest.fixture
+def video(tmp_path, icons):
+    path = tmp_path / "clip.avi"
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 30, (FRAME_W, FRAME_H))
+    if not writer.isOpened():
+        pytest.skip("当前 OpenCV 不支持写入 MJPG 视频")
+    for frame in _frames(icons):
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+@pytest.fixture
+def frame_dir(tmp_path, icons):
+    directory = tmp_path / "frames"
+    directory.mkdir()
+    for i, frame in enumerate(_frames(icons)):
+        cv2.imwrite(str(directory / f"{i:03d}.png"), frame)
+    return directory
+
+
+def _run(matcher, source, **kwargs) -> tuple[list[dict], dict]:
+    records = []
+    stats = FrameStream(matcher, source, records.append, **kwargs).run()
+    return records, stats
+
+
+def test_video_source_skips_unchanged_frames(matcher, video):
+    records, stats = _run(matcher, VideoSource(video, realtime=False))
+
+    assert stats["frames"] == 10
+    assert stats["unchanged"] == 8  # 只有第一帧和图标出现的那一帧有变化
+    assert stats["recognized"] + stats["dropped"] == 2
+    # 最后一个有变化的帧不会被替换，一定会被识别
+    assert records[-1]["frame"] == 5
+    assert records[-1]["results"][0][0] == "图标3"
+
+
+def test_directory_source_with_roi_and_detect(matcher, frame_dir):
+    records, stats = _run(matcher, DirectorySource(frame_dir), roi=(50, 30, 80, 70),
+                          detect=True, threshold=0.8)
+
+    assert stats["frames"] == 10 and stats["unchanged"] == 8
+    name, score, x, y, _ = records[-1]["detections"][0]
+    assert name == "图标3" and score > 0.95
+    assert (x, y) == (60, 40)  # 坐标换算回整帧
+
+
+def test_roi_partly_outside_frame_is_clipped(matcher, frame_dir):
+    records, _ = _run(matcher, DirectorySource(frame_dir), roi=(40, 20, 500, 500), detect=True)
+    name, _, x, y, _ = records[-1]["detections"][0]
+    assert (name, x, y) == ("图标3", 60, 40)
+
+
+def test_roi_outside_frame_is_rejected_on_first_frame(matcher, frame_dir):
+    with pytest.raises(ValueError, match="不在"):
+        _run(matcher, DirectorySource(frame_dir), roi=(1000, 1000, 50, 50))
+
+
+def test_roi_outside_reported_size_is_rejected_before_reading(matcher, video):
+    source = VideoSource(video, realtime=False)
+    assert source.size == (FRAME_W, FRAME_H)
+    out = io.StringIO()
+    with pytest.raises(ValueError):
+        run_stream(matcher, source, out, log=io.StringIO(), roi=(FRAME_W, 0, 10, 10))
+    assert out.getvalue() == ""
+
+
+def test_frame_source_is_abstract():
+    with pytest.raises(TypeError):
+        FrameSource()
@@ -0,0 +1,50 @@
+"""位置跟踪：同一位置再次截图时只在上次位置附近查找"""
+import pytest
+
+from src.matcher import IconMatcher
+
+from conftest import noise_background, paste
+
+
+@pytest.fixture
+def matcher(assets_dir, monkeypatch):
+    m = IconMatcher(assets_dir, track=True, cache_size=0)
+    m.tracked = []  # 每次 _track_search 的返回值
+    search = m._track_search
+
+    def spy(image):
+        result = search(image)
+        m.tracked.append(result)
+        return result
+
+    monkeypatch.setattr(m, "_track_search", spy)
+    yield m
+    m.close()
+
+
+def _shot(icons, x: int, y: int, seed: int):
+    return paste(noise_background(200, 320, seed), icons["icon6"], x, y)
+
+
+@pytest.mark.parametrize("method", ["match", "match_best"])
+def test_same_position_uses_track_search(matcher, icons, method):
+    recognize = getattr(matcher, method)
+    first = recognize(_shot(icons, 120, 70, 1))
+    assert matcher.tracked == [None]  # 第一次没有记录，做完整搜索
+
+    # 背景不同（结果缓存不会命中），图标位置不变
+    second = recognize(_shot(icons, 120, 70, 2))
+    assert matcher.tracked[-1] is not None and matcher.tracked[-1][0] == "icon6"
+    # match 跟踪命中时只返回该结果
+    assert second == (first if method == "match_best" else [first[0]])
+
+
+def test_moved_icon_falls_back_to_full_search(matcher, icons):
+    matcher.match_best(_shot(icons, 120, 70, 1))
+    result = matcher.match_best(_shot(icons, 20, 130, 3))
+
+    assert matcher.tracked[-1] is None  # 上次位置附近没有命中
+    assert result[0] == "图标6" and result[1] > 0.95
+    # 完整搜索后记录新位置，下一次又走跟踪
+    matcher.match_best(_shot(icons, 20, 130, 4))
+    assert matcher.tracked[-1] is not None